@@ -0,0 +1,97 @@
+"""
+Batched multi-query search versus one query at a time
+
+Indexes a synthetic paper, then answers the same queries with
+get_top_k_chunks in a loop and with get_top_k_chunks_batch at growing
+batch sizes. A share of the queries (--filtered) is restricted to a
+section, cycling through the paper's sections, so batches mix several
+filter groups. Reports queries/s and speedup per batch size, and checks
+that both paths return the same chunks, weights and distances.
+
+Usage:
+    python benchmarks/batch_search_benchmark.py --pages 50 --queries 1024 --batch-sizes 1 8 64 256
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.synthetic_pdf import synthetic_pdf, WORDS
+from src.embedding_utils import (
+    extract_text_from_pdf,
+    chunk_text_with_sections,
+    embed_chunks,
+    build_section_filters,
+    get_top_k_chunks,
+    get_top_k_chunks_batch,
+    get_available_sections
+)
+
+
+def synthetic_queries(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [' '.join(rng.choice(WORDS, size=rng.integers(3, 12))) + '?' for _ in range(n)]
+
+
+def same_results(expected, actual, tolerance=1e-5):
+    for (chunks_a, weights_a, distances_a), (chunks_b, weights_b, distances_b) in zip(expected, actual):
+        if [chunk['chunk_id'] for chunk in chunks_a] != [chunk['chunk_id'] for chunk in chunks_b]:
+            return False
+        if not np.allclose(weights_a, weights_b) or not np.allclose(distances_a, distances_b, atol=tolerance):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--queries', type=int, default=1024)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 16, 64, 256])
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--filtered', type=float, default=0.5, help="Share of queries with a section filter")
+    parser.add_argument('--storage', default='flat')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    text, _ = extract_text_from_pdf(synthetic_pdf(args.pages, seed=args.seed))
+    chunked_data = chunk_text_with_sections(text)
+    index, embeddings = embed_chunks(chunked_data, storage=args.storage)
+    rerank_vectors = embeddings if args.storage != 'flat' else None
+    section_filters = build_section_filters(chunked_data)
+    sections = get_available_sections(chunked_data)
+
+    queries = synthetic_queries(args.queries, seed=args.seed)
+    n_filtered = int(args.filtered * len(queries))
+    filters = [sections[i % len(sections)] if i < n_filtered else None for i in range(len(queries))]
+    print(f"{args.pages} pages, {len(chunked_data)} chunks, {len(queries)} queries "
+          f"({n_filtered} section-filtered), storage {args.storage}\n")
+
+    get_top_k_chunks(queries[0], chunked_data, index, k=args.k)  # warm-up
+    start = time.perf_counter()
+    expected = [
+        get_top_k_chunks(query, chunked_data, index, k=args.k, section_filter=section,
+                         section_filters=section_filters, rerank_vectors=rerank_vectors)
+        for query, section in zip(queries, filters)
+    ]
+    single_seconds = time.perf_counter() - start
+
+    print(f"{'batch':>6}{'queries/s':>12}{'speedup':>9}  same results")
+    print(f"{'loop':>6}{len(queries) / single_seconds:>12.1f}{1.0:>8.2f}x")
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        results = []
+        for i in range(0, len(queries), batch_size):
+            results.extend(get_top_k_chunks_batch(
+                queries[i:i + batch_size], chunked_data, index, k=args.k, section_filter=filters[i:i + batch_size],
+                section_filters=section_filters, rerank_vectors=rerank_vectors
+            ))
+        seconds = time.perf_counter() - start
+        print(f"{batch_size:>6}{len(queries) / seconds:>12.1f}{single_seconds / seconds:>8.2f}x"
+              f"  {same_results(expected, results)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Bulk embedding throughput versus worker count
+
+Chunks a set of synthetic papers and encodes every chunk:
+  - in-process, with the encoder's own batching (what embed_chunks does)
+  - on a BulkEncoder pool with each requested number of worker processes
+
+Pool start-up (spawning workers and loading one model each) is timed
+separately from encoding. For every run the benchmark reports chunks/s,
+speedup over the in-process baseline and the largest difference from the
+baseline embeddings. It also reports how much of each batch is padding
+when batches are cut in input order versus by length, measured in
+characters as a model-independent proxy for tokens.
+
+Usage:
+    python benchmarks/bulk_embedding_benchmark.py --papers 20 --pages 30 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+import faiss
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.synthetic_pdf import synthetic_pdf
+from src.bulk_embedding import BulkEncoder, length_batches, DEFAULT_BATCH_SIZE
+from src.embedding_utils import extract_text_from_pdf, chunk_text_with_sections
+from src.encoders import get_encoder, current_encoder_id
+
+
+def padding_fraction(texts, batches):
+    """Share of padded character slots when each batch is padded to its longest text"""
+    lengths = np.array([len(text) for text in texts])
+    padded = sum(len(batch) * lengths[batch].max() for batch in batches)
+    return 1.0 - lengths.sum() / padded
+
+
+def default_worker_counts():
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--papers', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=30, help="Pages per paper")
+    parser.add_argument('--workers', type=int, nargs='+', default=default_worker_counts())
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    texts = []
+    for seed in range(args.papers):
+        text, _ = extract_text_from_pdf(synthetic_pdf(args.pages, seed=seed), max_workers=1)
+        texts.extend(chunk_text_with_sections(text).texts())
+
+    input_order = [np.arange(i, min(i + args.batch_size, len(texts))) for i in range(0, len(texts), args.batch_size)]
+    print(f"{len(texts)} chunks from {args.papers} papers, encoder {current_encoder_id()}, {os.cpu_count()} cores")
+    print(f"Padding, batches in input order: {padding_fraction(texts, input_order):.1%}")
+    print(f"Padding, length-bucketed:        {padding_fraction(texts, length_batches(texts, args.batch_size)):.1%}\n")
+
+    encoder = get_encoder()
+    encoder.encode(texts[:args.batch_size])  # warm-up
+    start = time.perf_counter()
+    baseline = np.asarray(encoder.encode(texts), dtype='float32')
+    baseline_seconds = time.perf_counter() - start
+    faiss.normalize_L2(baseline)
+
+    print(f"{'workers':>8}{'start-up s':>12}{'encode s':>10}{'chunks/s':>11}{'speedup':>9}{'max diff':>10}")
+    print(f"{'-':>8}{'-':>12}{baseline_seconds:>10.2f}{len(texts) / baseline_seconds:>11.1f}{1.0:>8.2f}x{0.0:>10.1e}")
+    for workers in args.workers:
+        start = time.perf_counter()
+        with BulkEncoder(workers=workers, batch_size=args.batch_size) as bulk_encoder:
+            # Workers are spawned on demand; warm the pool with one batch per worker
+            bulk_encoder.encode(texts[:workers * args.batch_size])
+            startup_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            embeddings = bulk_encoder.encode(texts)
+            seconds = time.perf_counter() - start
+
+        max_diff = float(np.abs(embeddings - baseline).max())
+        print(f"{workers:>8}{startup_seconds:>12.2f}{seconds:>10.2f}{len(texts) / seconds:>11.1f}"
+              f"{baseline_seconds / seconds:>8.2f}x{max_diff:>10.1e}")
+
+
+if __name__ == '__main__':
+    main()
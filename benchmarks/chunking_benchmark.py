@@ -0,0 +1,103 @@
+"""
+Chunking benchmark: offset-based SpanSplitter vs langchain's splitter
+
+Extracts the text of synthetic papers of each requested size, detects
+sections, and chunks every section:
+  - the previous way: copy the section body, split it with langchain's
+    RecursiveCharacterTextSplitter and find each chunk string in the body to
+    recover its offset
+  - with SpanSplitter, which splits the extracted text in place by offsets
+
+Checks that both produce the same chunk spans and reports chunking
+throughput and the peak Python-heap memory of each (tracemalloc, measured in
+a separate untimed run). Needs langchain installed for the reference
+splitter (pip install -r requirements-dev.txt).
+
+Usage:
+    python benchmarks/chunking_benchmark.py --pages 50 300
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from benchmarks.synthetic_pdf import synthetic_pdf
+from src.embedding_utils import DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, detect_sections, make_splitter
+from src.pdf_extraction import extract_text_from_pdf
+
+
+def langchain_spans(text, sections, chunk_size, chunk_overlap):
+    """The previous split_section: copied bodies, chunk strings located by find()"""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=["\n\n", "\n", ". ", " ", ""])
+    spans = []
+    for section in sections:
+        body = text[section['start']:section['end']]
+        index = 0
+        previous_length = 0
+        for chunk in splitter.split_text(body):
+            index = body.find(chunk, max(0, index + previous_length - chunk_overlap))
+            previous_length = len(chunk)
+            spans.append((section['start'] + index, section['start'] + index + len(chunk)))
+    return spans
+
+
+def span_splitter_spans(text, sections, chunk_size, chunk_overlap):
+    splitter = make_splitter(chunk_size, chunk_overlap)
+    spans = []
+    for section in sections:
+        spans.extend(splitter.split_spans(text, section['start'], section['end']))
+    return spans
+
+
+def best_of(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[50, 300])
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--chunk-overlap', type=int, default=DEFAULT_CHUNK_OVERLAP)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6}{'chars':>11}{'chunks':>8}{'mode':>11}{'seconds':>10}{'MB/s':>8}{'peak MB':>10}{'speedup':>9}")
+    for pages in args.pages:
+        text, _ = extract_text_from_pdf(synthetic_pdf(pages, seed=args.seed))
+        sections = detect_sections(text)
+        runs = {}
+        for mode, fn in (('langchain', langchain_spans), ('spans', span_splitter_spans)):
+            run = lambda: fn(text, sections, args.chunk_size, args.chunk_overlap)
+            seconds, spans = best_of(run, args.repeats)
+            runs[mode] = (seconds, spans, peak_memory(run))
+
+        assert runs['langchain'][1] == runs['spans'][1], "SpanSplitter chunks differ from langchain's"
+        baseline = runs['langchain'][0]
+        for mode, (seconds, spans, peak) in runs.items():
+            print(f"{pages:>6}{len(text):>11}{len(spans):>8}{mode:>11}{seconds:>10.3f}"
+                  f"{len(text) / seconds / 1e6:>8.1f}{peak / 1024 ** 2:>10.1f}{baseline / seconds:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Recall-vs-latency sweep for the corpus-level ANN index
+
+Builds IVF and HNSW corpus indexes over synthetic clustered embeddings
+(shaped like MiniLM sentence vectors) and compares them with exact search,
+to help pick nprobe / efSearch.
+
+Usage:
+    python benchmarks/corpus_index_benchmark.py --papers 1000 --chunks-per-paper 100
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.corpus_index import CorpusIndex, recall_report
+
+
+def synthetic_embeddings(n, dimension, n_clusters, rng):
+    """Normalized vectors drawn around random topic centroids"""
+    centroids = rng.standard_normal((n_clusters, dimension)).astype('float32')
+    assignments = rng.integers(0, n_clusters, size=n)
+    vectors = centroids[assignments] + 0.6 * rng.standard_normal((n, dimension)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--papers', type=int, default=200)
+    parser.add_argument('--chunks-per-paper', type=int, default=100)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nlist', type=int, default=256)
+    parser.add_argument('--hnsw-m', type=int, default=32)
+    parser.add_argument('--output', help="Optional path to write the report as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.papers * args.chunks_per_paper
+    base = synthetic_embeddings(n + args.queries, args.dimension, max(n // 50, 10), rng)
+    base, queries = base[:n], base[n:]
+
+    report = []
+    for backend in ('flat', 'ivf', 'hnsw'):
+        corpus = CorpusIndex(args.dimension, backend=backend, nlist=args.nlist, hnsw_m=args.hnsw_m)
+        start = time.perf_counter()
+        for paper in range(args.papers):
+            rows = slice(paper * args.chunks_per_paper, (paper + 1) * args.chunks_per_paper)
+            chunks = [{'text': '', 'section': 'Results', 'section_start': 0}] * args.chunks_per_paper
+            corpus.add_paper(f"paper-{paper}", chunks, base[rows])
+        build_seconds = time.perf_counter() - start
+
+        for row in recall_report(corpus, base, queries, k=args.k):
+            row['build_seconds'] = build_seconds
+            report.append(row)
+
+    print(f"{n} vectors, {args.queries} queries, recall@{args.k}")
+    print(f"{'backend':<8}{'setting':<16}{'recall':>10}{'ms/query':>12}{'build s':>10}")
+    for row in report:
+        setting = f"{row['parameter']}={row['value']}" if row['parameter'] else "exact"
+        print(f"{row['backend']:<8}{setting:<16}{row['recall_at_k']:>10.4f}{row['latency_ms']:>12.4f}{row['build_seconds']:>10.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Startup and throughput comparison of embedding backends
+
+Reports:
+  - cold import time of src.embedding_utils (now lazy) versus import plus
+    model load (what every import used to cost)
+  - model load time and encode throughput per backend
+  - retrieval agreement of each backend with the full-precision torch
+    backend: top-k overlap and mean cosine between their embeddings
+
+Usage:
+    python benchmarks/encoder_benchmark.py --backends torch torch-int8 onnx-int8
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.encoders import ENCODER_BACKENDS, create_encoder
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+WORDS = ("the model data results method accuracy dataset training loss we propose novel network "
+         "performance baseline experiment evaluation protein gene expression cohort patients").split()
+
+
+def cold_import_seconds(statement, repeats):
+    """Best wall time of a fresh interpreter running `statement`"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=REPO_ROOT, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def synthetic_sentences(n, rng):
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 60))) for _ in range(n)]
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['torch', 'torch-int8', 'onnx-int8'],
+                        choices=sorted(ENCODER_BACKENDS))
+    parser.add_argument('--texts', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--import-repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    lazy = cold_import_seconds("import src.embedding_utils", args.import_repeats)
+    eager = cold_import_seconds(
+        "import src.embedding_utils as e; from src.encoders import get_encoder; get_encoder()", args.import_repeats
+    )
+    print(f"Cold import, lazy model:       {lazy:.2f}s")
+    print(f"Cold import + model load:      {eager:.2f}s\n")
+
+    rng = random.Random(0)
+    corpus = synthetic_sentences(args.texts, rng)
+    queries = synthetic_sentences(args.queries, rng)
+
+    reference = None
+    print(f"{'backend':<12}{'load s':>8}{'texts/s':>10}{'top-k overlap':>15}{'mean cosine':>13}")
+    for backend in args.backends:
+        try:
+            start = time.perf_counter()
+            encoder = create_encoder(backend)
+            load_seconds = time.perf_counter() - start
+        except Exception as e:
+            print(f"{backend:<12}  skipped ({type(e).__name__}: {e})")
+            continue
+
+        encoder.encode(corpus[:32])  # warm-up
+        start = time.perf_counter()
+        corpus_vectors = normalize(encoder.encode(corpus))
+        throughput = len(corpus) / (time.perf_counter() - start)
+        query_vectors = normalize(encoder.encode(queries))
+        top_k = np.argsort(-(query_vectors @ corpus_vectors.T), axis=1)[:, :args.k]
+
+        if reference is None:
+            reference = (corpus_vectors, top_k)
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(top_k, reference[1])])
+        cosine = float(np.mean(np.sum(corpus_vectors * reference[0], axis=1)))
+        print(f"{backend:<12}{load_seconds:>8.2f}{throughput:>10.1f}{overlap:>15.3f}{cosine:>13.4f}")
+
+    print("\nAgreement is measured against the first backend listed.")
+
+
+if __name__ == '__main__':
+    main()
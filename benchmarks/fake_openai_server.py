@@ -0,0 +1,191 @@
+"""
+Local fake OpenAI-compatible chat completion server
+
+Serves POST /v1/chat/completions with a canned answer, streamed (SSE) or
+not, with configurable latency, injected slow responses and injected rate
+limiting, so generation code can be exercised and benchmarked without
+network access or an API key.
+
+Usage:
+    python benchmarks/fake_openai_server.py --port 8001 --first-token-delay 0.2
+    export OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=test
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = ("According to the Methods section, the authors evaluate the proposed model "
+                  "on three public datasets and report consistent improvements over the baseline.")
+
+
+class FakeCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        try:
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. a cancelled hedged request
+            self.close_connection = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip('/').endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        config = self.server.config
+        tokens = [word + " " for word in config['answer'].split(" ")]
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in request.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "fake-model")
+        with self.server.lock:
+            self.server.requests_served += 1
+            request_number = self.server.requests_served
+
+        every = config['rate_limit_every']
+        if every and request_number % every == 0:
+            with self.server.lock:
+                self.server.rate_limited += 1
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                headers={"Retry-After": str(config['retry_after'])}
+            )
+            return
+
+        delay = config['first_token_delay']
+        slow_every = config['slow_every']
+        if slow_every and request_number % slow_every == 0:
+            # A straggler: the tail latency hedged requests are meant to cut
+            with self.server.lock:
+                self.server.slowed += 1
+            delay += config['slow_delay']
+        time.sleep(delay)
+
+        if not request.get("stream"):
+            time.sleep(config['token_delay'] * len(tokens))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": config['answer']},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens)
+                }
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send_event(delta, finish_reason=None):
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        self.close_connection = True
+        try:
+            send_event({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(config['token_delay'])
+                send_event({"content": token})
+            send_event({}, finish_reason="stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. a cancelled hedged request
+            pass
+
+
+def start_fake_server(host="127.0.0.1", port=0, answer=DEFAULT_ANSWER, first_token_delay=0.0, token_delay=0.0,
+                      rate_limit_every=0, retry_after=0.05, slow_every=0, slow_delay=1.0):
+    """
+    Start the fake server on a background thread
+
+    If rate_limit_every is N > 0, every Nth request is rejected with HTTP 429
+    and a Retry-After header of retry_after seconds. If slow_every is M > 0,
+    every Mth request waits slow_delay extra seconds before its first token.
+
+    Returns:
+        (server, base_url); pass base_url as OPENAI_BASE_URL and call
+        server.shutdown() when done
+    """
+    server = ThreadingHTTPServer((host, port), FakeCompletionHandler)
+    server.daemon_threads = True
+    server.config = {
+        'answer': answer,
+        'first_token_delay': first_token_delay,
+        'token_delay': token_delay,
+        'rate_limit_every': rate_limit_every,
+        'retry_after': retry_after,
+        'slow_every': slow_every,
+        'slow_delay': slow_delay,
+    }
+    server.lock = threading.Lock()
+    server.requests_served = 0
+    server.rate_limited = 0
+    server.slowed = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--answer', default=DEFAULT_ANSWER)
+    parser.add_argument('--first-token-delay', type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument('--token-delay', type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="Reject every Nth request with HTTP 429")
+    parser.add_argument('--retry-after', type=float, default=0.05, help="Retry-After seconds sent with 429s")
+    parser.add_argument('--slow-every', type=int, default=0, help="Delay every Nth request by --slow-delay")
+    parser.add_argument('--slow-delay', type=float, default=1.0, help="Extra seconds before a slowed request's first token")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(
+        args.host, args.port, args.answer, args.first_token_delay, args.token_delay,
+        rate_limit_every=args.rate_limit_every, retry_after=args.retry_after,
+        slow_every=args.slow_every, slow_delay=args.slow_delay
+    )
+    print(f"Fake OpenAI server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Tail latency of LLM requests with and without hedging
+
+Starts a fake OpenAI server that stalls every --slow-every-th request by
+--slow-delay seconds (and, with --secondary, a second server without
+stragglers to hedge to). The same streamed requests are then sent through
+ResilientBackend without hedging and with each --hedge-delays value.
+Reports p50/p95/p99 time to first text and total latency, how many
+requests were hedged and won by the hedge, the wasted (cancelled) calls
+and the calls each server received.
+
+Usage:
+    python benchmarks/llm_hedging_benchmark.py --requests 200 --slow-every 20 --slow-delay 1.0 --hedge-delays 0.1 0.2
+"""
+
+import argparse
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_openai_server import start_fake_server
+from src.llm_backends import OpenAIBackend, ResilientBackend
+
+MESSAGES = [{'role': 'user', 'content': 'What is the main contribution of this paper?'}]
+
+
+def run(backend, requests):
+    for _ in range(requests):
+        ''.join(backend.stream(MESSAGES, max_tokens=100))
+    return backend.stats.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--first-token-delay', type=float, default=0.05)
+    parser.add_argument('--slow-every', type=int, default=20)
+    parser.add_argument('--slow-delay', type=float, default=1.0)
+    parser.add_argument('--hedge-delays', type=float, nargs='+', default=[0.1, 0.2])
+    parser.add_argument('--deadline', type=float, default=10.0)
+    parser.add_argument('--secondary', action='store_true', help="Hedge to a second server instead of the same one")
+    args = parser.parse_args()
+
+    primary_server, primary_url = start_fake_server(
+        first_token_delay=args.first_token_delay, slow_every=args.slow_every, slow_delay=args.slow_delay)
+    secondary_server, secondary_url = start_fake_server(first_token_delay=args.first_token_delay)
+    primary = OpenAIBackend(base_url=primary_url, api_key='benchmark', name='primary')
+    hedge = OpenAIBackend(base_url=secondary_url, api_key='benchmark', name='secondary') if args.secondary else None
+
+    print(f"{args.requests} streamed requests, {args.first_token_delay * 1000:.0f} ms first token, "
+          f"every {args.slow_every}th request +{args.slow_delay * 1000:.0f} ms, "
+          f"hedging to {'a second server' if args.secondary else 'the same server'}\n")
+    print(f"{'hedge after':>12}{'first p50':>11}{'p95':>8}{'p99':>8}{'total p99':>11}"
+          f"{'hedged':>8}{'won':>6}{'wasted':>8}{'calls':>7}")
+    try:
+        for hedge_delay in [None] + args.hedge_delays:
+            served = primary_server.requests_served + secondary_server.requests_served
+            backend = ResilientBackend(primary, hedge=hedge, deadline=args.deadline, hedge_delay=hedge_delay)
+            stats = run(backend, args.requests)
+            calls = primary_server.requests_served + secondary_server.requests_served - served
+            label = 'off' if hedge_delay is None else f"{hedge_delay * 1000:.0f} ms"
+            first, total = stats['first_text_ms'], stats['total_ms']
+            print(f"{label:>12}{first['p50']:>9.0f}ms{first['p95']:>6.0f}ms{first['p99']:>6.0f}ms{total['p99']:>9.0f}ms"
+                  f"{stats['hedged']:>8}{stats['hedge_wins']:>6}{stats['wasted_calls']:>8}{calls:>7}")
+    finally:
+        primary_server.shutdown()
+        secondary_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+End-to-end pipeline benchmark
+
+Generates a synthetic scientific PDF and times every stage of the
+pipeline: text extraction, section detection, chunking, embedding and
+indexing, retrieval (with and without a section filter) and answer
+generation against the local fake OpenAI server, so no API key or network
+is needed.
+
+Each stage reports throughput, p50/p95/p99 latency over its samples and
+the peak Python-heap memory of one run (tracemalloc; allocations made
+inside FAISS or torch native code are not counted). Batch stages are
+sampled once per repeat, query stages once per query.
+
+The report can be written as JSON and compared against an earlier run;
+the process exits with status 1 if any stage's p50 latency regressed by
+more than --max-regression.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py --pages 50 300 --output run.json
+    python benchmarks/pipeline_benchmark.py --pages 50 300 --compare run.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_openai_server import start_fake_server
+from benchmarks.synthetic_pdf import synthetic_pdf, WORDS
+from src.embedding_utils import (
+    extract_text_from_pdf,
+    detect_sections,
+    chunk_text_with_sections,
+    embed_chunks,
+    build_section_filters,
+    get_top_k_chunks,
+    get_available_sections
+)
+from src.encoders import current_encoder_id
+from src.generator import generate_response, MODEL
+from src.llm_backends import OpenAIBackend, ResilientBackend, set_llm_backend
+
+STAGES = ['extract', 'detect_sections', 'chunk', 'embed', 'retrieve', 'retrieve_section', 'generate']
+
+
+def peak_memory_bytes(fn):
+    """Peak traced Python-heap allocation while running fn once"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def summarize(samples, items, unit, peak_bytes):
+    """Stage report from per-sample seconds; items is the work done per sample"""
+    samples = np.array(samples)
+    return {
+        'samples': len(samples),
+        'unit': unit,
+        'items_per_sample': items,
+        'throughput': items / samples.mean() if samples.mean() > 0 else float('inf'),
+        'p50_ms': 1000.0 * float(np.percentile(samples, 50)),
+        'p95_ms': 1000.0 * float(np.percentile(samples, 95)),
+        'p99_ms': 1000.0 * float(np.percentile(samples, 99)),
+        'peak_memory_mb': peak_bytes / 1024 ** 2,
+    }
+
+
+def bench_batch(fn, repeats, items, unit):
+    # The traced run doubles as a warm-up
+    peak = peak_memory_bytes(fn)
+    samples = [timed(fn)[0] for _ in range(repeats)]
+    return summarize(samples, items, unit, peak)
+
+
+def bench_per_call(fn, args_list, unit):
+    peak = peak_memory_bytes(lambda: fn(args_list[0]))
+    samples = [timed(lambda: fn(args))[0] for args in args_list]
+    return summarize(samples, 1, unit, peak)
+
+
+def synthetic_queries(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [' '.join(rng.choice(WORDS, size=rng.integers(3, 12))) + '?' for _ in range(n)]
+
+
+def run_document(pages, args, stages):
+    """Benchmark every requested stage on one synthetic document"""
+    pdf_bytes = synthetic_pdf(pages, seed=args.seed)
+    report = {'pages': pages, 'pdf_bytes': len(pdf_bytes), 'stages': {}}
+
+    text, _ = extract_text_from_pdf(pdf_bytes)
+    chunked_data = chunk_text_with_sections(text)
+    report['characters'] = len(text)
+    report['chunks'] = len(chunked_data)
+
+    if 'extract' in stages:
+        report['stages']['extract'] = bench_batch(
+            lambda: extract_text_from_pdf(pdf_bytes), args.repeats, pages, 'pages/s')
+    if 'detect_sections' in stages:
+        report['stages']['detect_sections'] = bench_batch(
+            lambda: detect_sections(text), args.repeats, len(text) / 1e6, 'MB/s')
+    if 'chunk' in stages:
+        report['stages']['chunk'] = bench_batch(
+            lambda: chunk_text_with_sections(text), args.repeats, len(chunked_data), 'chunks/s')
+
+    retrieval_stages = {'retrieve', 'retrieve_section', 'generate'} & set(stages)
+    if 'embed' not in stages and not retrieval_stages:
+        return report
+
+    index, _ = embed_chunks(chunked_data)
+    if 'embed' in stages:
+        report['stages']['embed'] = bench_batch(
+            lambda: embed_chunks(chunked_data), args.embed_repeats, len(chunked_data), 'chunks/s')
+
+    queries = synthetic_queries(args.queries, seed=args.seed)
+    section_filters = build_section_filters(chunked_data)
+    sections = get_available_sections(chunked_data)
+
+    if 'retrieve' in stages:
+        report['stages']['retrieve'] = bench_per_call(
+            lambda query: get_top_k_chunks(query, chunked_data, index, k=args.k), queries, 'queries/s')
+    if 'retrieve_section' in stages and sections:
+        # Cycle through the sections so every selector is exercised
+        report['stages']['retrieve_section'] = bench_per_call(
+            lambda item: get_top_k_chunks(item[0], chunked_data, index, k=args.k,
+                                          section_filter=item[1], section_filters=section_filters),
+            [(query, sections[i % len(sections)]) for i, query in enumerate(queries)],
+            'queries/s'
+        )
+    if 'generate' in stages:
+        retrieved = [get_top_k_chunks(query, chunked_data, index, k=args.k)
+                     for query in queries[:args.generations]]
+        report['stages']['generate'] = bench_per_call(
+            lambda item: generate_response(item[1][0], item[1][1], item[0]),
+            list(zip(queries, retrieved)),
+            'answers/s'
+        )
+    return report
+
+
+def compare(current, baseline, max_regression):
+    """Print p50 changes against a baseline report; return the regressed stages"""
+    baseline_docs = {doc['pages']: doc for doc in baseline['documents']}
+    regressions = []
+    print(f"\n{'pages':>6}  {'stage':<18}{'base p50 ms':>13}{'p50 ms':>10}{'change':>9}")
+    for doc in current['documents']:
+        base_doc = baseline_docs.get(doc['pages'])
+        if base_doc is None:
+            continue
+        for stage, result in doc['stages'].items():
+            base = base_doc['stages'].get(stage)
+            if base is None or base['p50_ms'] == 0:
+                continue
+            change = result['p50_ms'] / base['p50_ms'] - 1.0
+            flag = ''
+            if change > max_regression:
+                regressions.append((doc['pages'], stage))
+                flag = '  REGRESSION'
+            print(f"{doc['pages']:>6}  {stage:<18}{base['p50_ms']:>13.2f}{result['p50_ms']:>10.2f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[50, 300])
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--repeats', type=int, default=5, help="Samples per batch stage")
+    parser.add_argument('--embed-repeats', type=int, default=2, help="Samples for the embedding stage")
+    parser.add_argument('--queries', type=int, default=200, help="Samples per retrieval stage")
+    parser.add_argument('--generations', type=int, default=20, help="Samples for the generation stage")
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--llm-first-token-delay', type=float, default=0.05)
+    parser.add_argument('--llm-token-delay', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Path to write the report as JSON")
+    parser.add_argument('--compare', help="Baseline JSON report to check for regressions")
+    parser.add_argument('--max-regression', type=float, default=0.10,
+                        help="Allowed relative p50 slowdown per stage when comparing (default 10%%)")
+    args = parser.parse_args()
+
+    server = None
+    if 'generate' in args.stages:
+        server, base_url = start_fake_server(first_token_delay=args.llm_first_token_delay,
+                                             token_delay=args.llm_token_delay)
+        set_llm_backend(ResilientBackend(OpenAIBackend(MODEL, base_url=base_url, api_key="benchmark")))
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'encoder': current_encoder_id(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'documents': [],
+    }
+    try:
+        for pages in args.pages:
+            doc = run_document(pages, args, args.stages)
+            report['documents'].append(doc)
+            print(f"\n{pages} pages, {doc['characters']} characters, {doc['chunks']} chunks")
+            print(f"  {'stage':<18}{'throughput':>18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak MB':>9}")
+            for stage, result in doc['stages'].items():
+                throughput = f"{result['throughput']:.1f} {result['unit']}"
+                print(f"  {stage:<18}{throughput:>18}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                      f"{result['p99_ms']:>10.2f}{result['peak_memory_mb']:>9.1f}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed by more than {args.max_regression:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Section detection benchmark: single-pass compiled matcher vs per-line patterns
+
+Generates a large synthetic paper, checks that detect_sections() finds the
+same sections as the previous line-by-line implementation, and reports the
+speedup.
+
+Usage:
+    python benchmarks/section_detection_benchmark.py --lines 200000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.embedding_utils import SECTION_PATTERNS, detect_sections, section_text
+
+WORDS = ("the model data results method accuracy dataset training loss we propose "
+         "novel network performance baseline experiment evaluation").split()
+HEADERS = ["Abstract", "Introduction", "Related Work", "Methods", "Experimental Setup",
+           "Results", "Discussion", "Conclusion", "References", "Appendix"]
+
+
+def legacy_detect_sections(text):
+    """The previous implementation: every pattern on every line, content copied"""
+    lines = text.split('\n')
+    sections = []
+    current_section = {'name': 'Header', 'start_line': 0, 'content': ''}
+
+    for i, line in enumerate(lines):
+        line_lower = line.lower().strip()
+        is_section_header = False
+        for pattern in SECTION_PATTERNS:
+            if re.match(pattern, line_lower, re.IGNORECASE):
+                if current_section['content'].strip():
+                    sections.append(current_section)
+                current_section = {'name': line.strip().title(), 'start_line': i, 'content': ''}
+                is_section_header = True
+                break
+        if not is_section_header:
+            current_section['content'] += line + '\n'
+
+    if current_section['content'].strip():
+        sections.append(current_section)
+    return sections
+
+
+def synthetic_paper(n_lines, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n_lines):
+        if i % 400 == 0:
+            lines.append(f"  {rng.choice(HEADERS).upper()}  ")
+        elif i % 50 == 0:
+            lines.append("")
+        else:
+            lines.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 16))))
+    return '\n'.join(lines)
+
+
+def best_of(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, nargs='+', default=[10000, 50000, 200000])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'lines':>10}{'chars':>12}{'sections':>10}{'legacy s':>12}{'single-pass s':>15}{'speedup':>10}")
+    for n_lines in args.lines:
+        text = synthetic_paper(n_lines)
+        legacy_time, legacy = best_of(lambda: legacy_detect_sections(text), args.repeats)
+        new_time, sections = best_of(lambda: detect_sections(text), args.repeats)
+
+        # The span-based detector must find the same sections with the same bodies
+        assert [(s['name'], s['start_line']) for s in legacy] == [(s['name'], s['start_line']) for s in sections]
+        assert all(old['content'].strip() == section_text(text, new).strip() for old, new in zip(legacy, sections))
+
+        print(f"{n_lines:>10}{len(text):>12}{len(sections):>10}{legacy_time:>12.4f}{new_time:>15.4f}{legacy_time / new_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Memory-per-chunk and recall report for the index storage modes
+
+For each storage mode of build_index() this reports the serialized index
+size per chunk (codes plus any codebooks) and recall@k against exact flat
+search, with and without exact reranking of k * rerank_factor candidates.
+
+Usage:
+    python benchmarks/storage_modes_benchmark.py --chunks 500 5000 50000
+"""
+
+import argparse
+import json
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import faiss
+from src.embedding_utils import STORAGE_MODES, build_index, rerank_exact
+
+
+def synthetic_embeddings(n, dimension, rng):
+    """Normalized vectors drawn around random topic centroids"""
+    centroids = rng.standard_normal((max(n // 50, 10), dimension)).astype('float32')
+    vectors = centroids[rng.integers(0, len(centroids), size=n)]
+    vectors = vectors + 0.6 * rng.standard_normal((n, dimension)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall(found, truth):
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, nargs='+', default=[500, 5000, 50000])
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--rerank-factor', type=int, default=4)
+    parser.add_argument('--output', help="Optional path to write the report as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    report = []
+    print(f"{'chunks':>8}  {'mode':<6}{'bytes/chunk':>13}{'recall@k':>10}{'+rerank':>10}")
+    for n in args.chunks:
+        vectors = synthetic_embeddings(n + args.queries, args.dimension, rng)
+        embeddings, queries = vectors[:n], vectors[n:]
+        truth = build_index(embeddings, 'flat').search(queries, args.k)[1]
+
+        for mode in STORAGE_MODES:
+            index = build_index(embeddings, mode)
+            bytes_per_chunk = faiss.serialize_index(index).size / n
+            found = index.search(queries, args.k)[1]
+
+            candidates = index.search(queries, args.k * args.rerank_factor)[1]
+            reranked = [rerank_exact(q[None, :], c, embeddings, args.k)[1] for q, c in zip(queries, candidates)]
+
+            row = {
+                'chunks': n,
+                'mode': mode,
+                'bytes_per_chunk': bytes_per_chunk,
+                'recall_at_k': recall(found, truth),
+                'recall_at_k_reranked': recall(reranked, truth),
+            }
+            report.append(row)
+            print(f"{n:>8}  {mode:<6}{bytes_per_chunk:>13.1f}{row['recall_at_k']:>10.3f}{row['recall_at_k_reranked']:>10.3f}")
+
+    print("\nReranking reads full-precision rows from the memory-mapped index cache,"
+          " so it adds no per-session memory.")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
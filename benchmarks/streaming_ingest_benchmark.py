@@ -0,0 +1,68 @@
+"""
+Streaming background ingest versus batch ingest
+
+For synthetic papers of each requested size, ingests the PDF:
+  - with ingest_pdf, where nothing is searchable until every page has been
+    extracted, chunked and embedded
+  - with StreamingIngest, where pages flow through section detection,
+    chunking and embedding and chunks become searchable as they land
+
+Reports the time until the first chunk can be searched, the total ingest
+time and the peak Python-heap memory of each run (tracemalloc; FAISS and
+torch native allocations are not counted, and tracing slows both runs
+down alike), and checks that both produce the same chunks.
+
+Usage:
+    python benchmarks/streaming_ingest_benchmark.py --pages 50 300
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.synthetic_pdf import synthetic_pdf
+from src.encoders import get_encoder, current_encoder_id
+from src.ingest import ingest_pdf
+from src.streaming_ingest import StreamingIngest
+
+
+def batch_run(pdf_bytes):
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        document = ingest_pdf(pdf_bytes)
+        seconds = time.perf_counter() - start
+        return document, seconds, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def streaming_run(pdf_bytes):
+    ingest = StreamingIngest(pdf_bytes, trace_memory=True).start()
+    return ingest.wait(), ingest.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[50, 300])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    get_encoder().encode(['warm-up'])
+    print(f"encoder {current_encoder_id()}\n")
+    print(f"{'pages':>6}{'mode':>11}{'first chunk s':>15}{'total s':>10}{'peak MB':>10}  same chunks")
+    for pages in args.pages:
+        pdf_bytes = synthetic_pdf(pages, seed=args.seed)
+        batch, batch_seconds, batch_peak = batch_run(pdf_bytes)
+        streamed, stats = streaming_run(pdf_bytes)
+        same = list(batch['chunked_data']) == list(streamed['chunked_data'])
+        print(f"{pages:>6}{'batch':>11}{batch_seconds:>15.2f}{batch_seconds:>10.2f}{batch_peak / 1024 ** 2:>10.1f}")
+        print(f"{pages:>6}{'streaming':>11}{stats['time_to_first_chunk_seconds']:>15.2f}{stats['total_seconds']:>10.2f}"
+              f"{stats['peak_memory_bytes'] / 1024 ** 2:>10.1f}  {same}")
+
+
+if __name__ == '__main__':
+    main()
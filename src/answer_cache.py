@@ -0,0 +1,250 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+
+
+def make_answer_key(document_hash, retrieved_chunks):
+    """
+    Cache bucket for a query: the document plus its retrieved chunk ids
+
+    Chunk order is kept because rank decides the PRIMARY/SECONDARY/SUPPORTING
+    labels in the prompt.
+    """
+    return (document_hash, tuple(chunk['chunk_id'] for chunk in retrieved_chunks))
+
+
+def normalize_query(query):
+    """Query text as matched by exact lookups: lowercased, whitespace collapsed"""
+    return ' '.join(query.lower().split()) if query is not None else None
+
+
+class _Entry:
+    __slots__ = ('entry_id', 'key', 'embedding', 'answer', 'created_at', 'generation_seconds', 'query')
+
+    def __init__(self, entry_id, key, embedding, answer, created_at, generation_seconds, query=None):
+        self.entry_id = entry_id
+        self.key = key
+        self.embedding = embedding  # None when the query was never encoded
+        self.answer = answer
+        self.created_at = created_at
+        self.generation_seconds = generation_seconds
+        self.query = query  # normalize_query() text
+
+
+class SqliteAnswerStore:
+    """Persistent answer store backed by a SQLite file"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " entry_id TEXT PRIMARY KEY,"
+                " bucket TEXT NOT NULL,"
+                " embedding BLOB NOT NULL,"
+                " answer TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " generation_seconds REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS answers_bucket ON answers (bucket)")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(answers)")]
+            if 'query' not in columns:
+                self._conn.execute("ALTER TABLE answers ADD COLUMN query TEXT")
+
+    @staticmethod
+    def _bucket(key):
+        return json.dumps([key[0], list(key[1])])
+
+    def put(self, entry):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers"
+                " (entry_id, bucket, embedding, answer, created_at, generation_seconds, query)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                # An empty blob stands for a query that was never encoded
+                (entry.entry_id, self._bucket(entry.key),
+                 entry.embedding.tobytes() if entry.embedding is not None else b'',
+                 entry.answer, entry.created_at, entry.generation_seconds, entry.query)
+            )
+
+    def get_bucket(self, key, min_created_at):
+        """All entries for a bucket created after min_created_at"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT entry_id, embedding, answer, created_at, generation_seconds, query"
+                " FROM answers WHERE bucket = ? AND created_at >= ?",
+                (self._bucket(key), min_created_at)
+            ).fetchall()
+        return [
+            _Entry(entry_id, key, np.frombuffer(embedding, dtype='float32') if embedding else None,
+                   answer, created_at, generation_seconds, query)
+            for entry_id, embedding, answer, created_at, generation_seconds, query in rows
+        ]
+
+    def delete_expired(self, min_created_at):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (min_created_at,))
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache in front of the LLM call, matching near-duplicate questions
+
+    Entries are bucketed by document hash and retrieved chunk ids (see
+    make_answer_key).
+    Within a bucket a cached answer is reused when the cosine similarity
+    between the normalized query embeddings reaches similarity_threshold.
+    Queries answered without an embedding (e.g. when hybrid search skipped
+    the dense stage) are matched on their exact normalized text instead. The in-memory
+    tier is LRU-bounded by max_entries; entries older than ttl_seconds are
+    never served. An optional store (e.g. SqliteAnswerStore) persists answers
+    across restarts and is consulted on in-memory misses.
+
+    Args:
+        similarity_threshold: Minimum query-embedding cosine similarity for a hit
+        max_entries: Maximum entries held in memory
+        ttl_seconds: Entry lifetime (None to disable expiry)
+        store: Optional persistent backend
+    """
+
+    def __init__(self, similarity_threshold=0.95, max_entries=1024, ttl_seconds=24 * 3600, store=None):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._hits = 0
+        self._misses = 0
+        self._latency_saved = 0.0
+
+    def _min_created_at(self):
+        return time.time() - self.ttl_seconds if self.ttl_seconds is not None else float('-inf')
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        bucket = self._buckets[entry.key]
+        bucket.remove(entry_id)
+        if not bucket:
+            del self._buckets[entry.key]
+
+    def _insert(self, entry):
+        self._entries[entry.entry_id] = entry
+        self._buckets.setdefault(entry.key, []).append(entry.entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    @staticmethod
+    def _best_match(entries, query_embedding, query=None):
+        if query_embedding is None:
+            # Exact text match, counted as a perfect similarity
+            for entry in entries:
+                if entry.query is not None and entry.query == query:
+                    return entry, 1.0
+            return None, -1.0
+        entries = [entry for entry in entries if entry.embedding is not None]
+        if not entries:
+            return None, -1.0
+        similarities = np.stack([entry.embedding for entry in entries]) @ query_embedding
+        best = int(np.argmax(similarities))
+        return entries[best], float(similarities[best])
+
+    def lookup(self, key, query_embedding, query=None):
+        """
+        Find a cached answer for a query
+
+        Args:
+            key: Bucket from make_answer_key()
+            query_embedding: Normalized query embedding (e.g. from embed_query),
+                or None to match the query text exactly instead
+            query: Query text, required when query_embedding is None
+
+        Returns:
+            The cached answer text, or None on a miss
+        """
+        if query_embedding is not None:
+            query_embedding = np.asarray(query_embedding, dtype='float32').reshape(-1)
+        query = normalize_query(query)
+        min_created_at = self._min_created_at()
+
+        with self._lock:
+            entries = []
+            for entry_id in list(self._buckets.get(key, ())):
+                entry = self._entries[entry_id]
+                if entry.created_at < min_created_at:
+                    self._remove(entry_id)
+                else:
+                    entries.append(entry)
+            entry, similarity = self._best_match(entries, query_embedding, query)
+
+        if similarity < self.similarity_threshold and self.store is not None:
+            stored, stored_similarity = self._best_match(
+                self.store.get_bucket(key, min_created_at), query_embedding, query)
+            if stored_similarity >= self.similarity_threshold:
+                entry, similarity = stored, stored_similarity
+
+        with self._lock:
+            if similarity >= self.similarity_threshold:
+                # A concurrent put() or lookup() may have evicted the match
+                # since it was chosen; it was still fresh then, so put it back
+                if entry.entry_id in self._entries:
+                    self._entries.move_to_end(entry.entry_id)
+                else:
+                    self._insert(entry)
+                self._hits += 1
+                self._latency_saved += entry.generation_seconds
+                return entry.answer
+            self._misses += 1
+            return None
+
+    def put(self, key, query_embedding, answer, generation_seconds=0.0, query=None):
+        """
+        Store a freshly generated answer and how long it took to produce
+
+        query_embedding may be None when the query was not encoded; the
+        entry is then only found by exact lookups on its query text.
+        """
+        if query_embedding is not None:
+            query_embedding = np.asarray(query_embedding, dtype='float32').reshape(-1).copy()
+        entry = _Entry(
+            uuid.uuid4().hex,
+            key,
+            query_embedding,
+            answer,
+            time.time(),
+            generation_seconds,
+            normalize_query(query)
+        )
+        with self._lock:
+            self._insert(entry)
+        if self.store is not None:
+            self.store.put(entry)
+
+    def purge_expired(self):
+        """Drop expired entries from memory and the persistent store"""
+        min_created_at = self._min_created_at()
+        with self._lock:
+            for entry_id in [e.entry_id for e in self._entries.values() if e.created_at < min_created_at]:
+                self._remove(entry_id)
+        if self.store is not None:
+            self.store.delete_expired(min_created_at)
+
+    def stats(self):
+        """Hit rate and total generation time avoided"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'lookups': lookups,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'latency_saved_seconds': self._latency_saved,
+            }
@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import faiss
+import numpy as np
+
+from src.chunk_store import as_chunk_store
+from src.embedding_utils import create_index, build_index, embed_chunks
+from src.encoders import ENCODER_BACKENDS, create_encoder, current_encoder_config, current_encoder_id, encoder_id
+from src.telemetry import telemetry
+
+# Texts per encode call in a worker; every batch holds texts of similar length
+DEFAULT_BATCH_SIZE = int(os.getenv("RAG_BULK_BATCH_SIZE", "64"))
+
+# Batches per worker in one window (see BulkEncoder)
+WINDOW_BATCHES_PER_WORKER = 4
+
+# Per-worker encoder, loaded once by the pool initializer
+_worker_encoder = None
+
+
+def _init_worker(backend, model_name, threads):
+    global _worker_encoder
+    # The pool provides the parallelism; keep each worker's intra-op threads
+    # to its share of the cores so workers do not oversubscribe them
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_encoder = create_encoder(backend, model_name)
+
+
+def _encode_batch(texts, batch_size):
+    embeddings = np.asarray(_worker_encoder.encode(texts, batch_size=batch_size), dtype='float32')
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def length_batches(texts, batch_size):
+    """
+    Split text positions into batches of similar length, longest first
+
+    Sorting by length keeps padding inside a batch small; starting with the
+    longest batches lets short ones fill in at the end of a run.
+    """
+    order = np.argsort([-len(text) for text in texts], kind='stable')
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+class BulkEncoder:
+    """
+    Length-bucketed text encoding on a pool of worker processes
+
+    Each worker loads its own copy of the model. Texts are cut into windows
+    of consecutive positions; within a window they are sorted into
+    length-bucketed batches spread over the pool. Windows are yielded in
+    order as soon as all of their batches are done, while the pool keeps
+    encoding later windows, so results can be consumed (e.g. added to an
+    index) before the whole run finishes.
+
+    Workers are started with the spawn method: forking a process that
+    already runs torch threads can deadlock. Start-up costs a model load per
+    worker, so the pool only pays off for large ingests; keep one
+    BulkEncoder open across documents and close() it when done.
+
+    Args:
+        workers: Worker processes (default: one per core)
+        batch_size: Texts per encode call
+        window_size: Texts per window (default: enough batches to keep
+            every worker busy several times over)
+        backend, model_name: Encoder to load in the workers (see
+            src/encoders.py); default to the active encoder's, so chunks are
+            embedded with the model that encodes queries and keys the cache
+    """
+
+    def __init__(self, workers=None, batch_size=DEFAULT_BATCH_SIZE, window_size=None,
+                 backend=None, model_name=None):
+        active_backend, active_model_name = current_encoder_config()
+        backend = backend or active_backend
+        model_name = model_name or active_model_name
+        if backend not in ENCODER_BACKENDS:
+            raise ValueError(f"Workers cannot load encoder backend '{backend}', expected one of {sorted(ENCODER_BACKENDS)}")
+        self.encoder_id = encoder_id(backend, model_name)
+        cores = os.cpu_count() or 1
+        self.workers = workers or cores
+        self.batch_size = batch_size
+        self.window_size = window_size or WINDOW_BATCHES_PER_WORKER * self.workers * batch_size
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(backend, model_name, max(1, cores // self.workers))
+        )
+
+    def iter_windows(self, texts):
+        """
+        Encode texts, yielding (start, embeddings) per window in order
+
+        embeddings are the normalized float32 rows of texts[start:start + len(embeddings)].
+        """
+        texts = list(texts)
+        windows = []
+        for start in range(0, len(texts), self.window_size):
+            window = texts[start:start + self.window_size]
+            batches = [
+                (positions, self._pool.submit(_encode_batch, [window[i] for i in positions], self.batch_size))
+                for positions in length_batches(window, self.batch_size)
+            ]
+            windows.append((start, len(window), batches))
+
+        try:
+            for start, size, batches in windows:
+                embeddings = None
+                for positions, future in batches:
+                    batch = future.result()
+                    if embeddings is None:
+                        embeddings = np.empty((size, batch.shape[1]), dtype='float32')
+                    embeddings[positions] = batch
+                yield start, embeddings
+        finally:
+            # Drop queued work if the consumer stopped early or a batch failed
+            for _, _, batches in windows:
+                for _, future in batches:
+                    future.cancel()
+
+    def encode(self, texts):
+        """Normalized float32 embeddings of texts, in input order"""
+        windows = [embeddings for _, embeddings in self.iter_windows(texts)]
+        if not windows:
+            return np.zeros((0, 0), dtype='float32')
+        return np.concatenate(windows)
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+@telemetry.traced('embed_chunks_bulk')
+def embed_chunks_bulk(chunked_data, bulk_encoder, storage='flat'):
+    """
+    embed_chunks on a BulkEncoder's process pool
+
+    Storage modes that need no training ('flat', 'fp16') are filled window
+    by window while later windows are still encoding; 'int8' and 'pq' are
+    trained on the complete set once encoding finishes. Returns the same
+    (index, embeddings) pair as embed_chunks, with chunk positions as index
+    positions. Raises ValueError if bulk_encoder's model is not the active
+    encoder's.
+    """
+    if bulk_encoder.encoder_id != current_encoder_id():
+        raise ValueError(f"BulkEncoder embeds with {bulk_encoder.encoder_id}, "
+                         f"but queries and cache keys use {current_encoder_id()}")
+    texts = as_chunk_store(chunked_data).texts()
+    if not texts:
+        # Nothing to encode (e.g. a scanned PDF without a text layer)
+        return embed_chunks(chunked_data, storage=storage)
+
+    embeddings = None
+    index = None
+    with telemetry.span('encode_chunks', chunks=len(texts), workers=bulk_encoder.workers):
+        for start, window in bulk_encoder.iter_windows(texts):
+            if embeddings is None:
+                embeddings = np.empty((len(texts), window.shape[1]), dtype='float32')
+                index = create_index(window.shape[1], storage)
+            embeddings[start:start + len(window)] = window
+            if index.is_trained:
+                index.add(window)
+
+    if not index.is_trained:
+        with telemetry.span('build_index', storage=storage):
+            index = build_index(embeddings, storage=storage)
+
+    telemetry.increment('chunks_indexed_total', len(texts), storage=storage)
+    return index, embeddings
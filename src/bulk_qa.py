@@ -0,0 +1,211 @@
+"""
+Asynchronous bulk question answering over many papers
+
+Runs (paper, question) pairs through retrieval and generation. Retrieval
+is batched per paper, LLM calls run concurrently under a limit through the
+LLM backend (deadlines, rate-limit-aware retries and optional hedging; see
+src/llm_backends.py), and results stream out as JSONL as they finish.
+
+Usage:
+    python -m src.bulk_qa --papers papers/*.pdf --questions questions.txt --output results.jsonl
+    python -m src.bulk_qa --pairs pairs.jsonl --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from src.embedding_utils import get_top_k_chunks_batch
+from src.generator import build_messages, format_sources, TEMPERATURE, MAX_TOKENS
+from src.llm_backends import create_llm_backend, get_llm_backend
+from src.bulk_embedding import BulkEncoder
+from src.index_cache import IndexCache
+from src.ingest import ingest_pdf
+
+
+def retrieve_batch(document, questions, k=5):
+    """
+    Retrieve top-k chunks for many questions against one paper
+
+    Encodes all questions in a single call and runs a single FAISS search
+    (see get_top_k_chunks_batch).
+
+    Returns:
+        List of (retrieved_chunks, weights, distances), one per question
+    """
+    return get_top_k_chunks_batch(
+        questions, document['chunked_data'], document['index'], k=k,
+        section_filters=document['section_filters']
+    )
+
+
+async def run_bulk_qa(pairs, output, concurrency=8, k=5, show_sources=False,
+                      index_cache=None, backend=None, bulk_encoder=None):
+    """
+    Answer (paper, question) pairs, writing one JSON line per pair as it completes
+
+    Papers are ingested and retrieved one at a time in a worker thread while
+    LLM calls for already-retrieved questions run concurrently, at most
+    `concurrency` at once, each on its own thread of a pool that size.
+
+    Args:
+        pairs: Iterable of (paper_path, question)
+        output: Text stream the JSONL results are written to
+        concurrency: Maximum number of in-flight LLM calls
+        k: Chunks retrieved per question
+        show_sources: Append the "Sources Used" block to each answer
+        index_cache: Optional IndexCache for ingested papers
+        backend: LLMBackend to generate with (default: get_llm_backend())
+        bulk_encoder: Optional BulkEncoder that embeds papers on a process pool
+
+    Returns:
+        Summary dict with item, error, retry and hedge counts and wall time
+    """
+    backend = backend or get_llm_backend()
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    llm_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bulk-qa-llm')
+    summary = {'items': 0, 'errors': 0, 'retries': 0, 'hedged': 0}
+    start = time.perf_counter()
+
+    questions_by_paper = {}
+    for paper, question in pairs:
+        questions_by_paper.setdefault(paper, []).append(question)
+
+    def emit(record):
+        summary['items'] += 1
+        if record.get('error'):
+            summary['errors'] += 1
+        output.write(json.dumps(record) + '\n')
+        output.flush()
+
+    async def answer(paper, question, retrieved, ingest_seconds, retrieval_seconds):
+        record = {
+            'paper': paper,
+            'question': question,
+            'ingest_seconds': ingest_seconds,
+            'retrieval_seconds': retrieval_seconds,
+        }
+        request_stats = {}
+        enqueued_at = started_at = finished_at = time.perf_counter()
+        try:
+            retrieved_chunks, weights, distances = retrieved
+            context_report = {}
+            messages, section_info = build_messages(retrieved_chunks, weights, question, context_report=context_report)
+            record['sections'] = [info['section'] for info in section_info]
+            record['context_tokens'] = context_report['tokens']
+            record['context_tokens_saved'] = context_report['tokens_saved']
+
+            enqueued_at = time.perf_counter()
+            async with semaphore:
+                started_at = time.perf_counter()
+                try:
+                    text = await loop.run_in_executor(llm_executor, partial(
+                        backend.complete, messages, stats=request_stats, temperature=TEMPERATURE, max_tokens=MAX_TOKENS
+                    ))
+                    if show_sources:
+                        text += format_sources(section_info)
+                    record['answer'] = text
+                finally:
+                    finished_at = time.perf_counter()
+        except Exception as e:
+            # One failed item must not take the rest of the run down with it
+            record['error'] = f"{type(e).__name__}: {e}"
+
+        record['retries'] = request_stats.get('retries', 0)
+        record['hedged'] = request_stats.get('hedged', False)
+        summary['retries'] += record['retries']
+        summary['hedged'] += record['hedged']
+
+        record['queue_seconds'] = started_at - enqueued_at
+        record['generation_seconds'] = finished_at - started_at
+        # What the caller waited for this item, from ingest to its answer
+        record['latency_seconds'] = (ingest_seconds + retrieval_seconds + record['queue_seconds']
+                                     + record['generation_seconds'])
+        emit(record)
+
+    tasks = []
+    for paper, questions in questions_by_paper.items():
+        try:
+            ingest_start = time.perf_counter()
+            document = await asyncio.to_thread(ingest_pdf, paper, index_cache, bulk_encoder=bulk_encoder)
+            retrieval_start = time.perf_counter()
+            retrieved = await asyncio.to_thread(retrieve_batch, document, questions, k)
+            retrieval_end = time.perf_counter()
+        except Exception as e:
+            for question in questions:
+                emit({'paper': paper, 'question': question, 'error': f"{type(e).__name__}: {e}"})
+            continue
+
+        # Amortize the per-paper ingest and batched retrieval over its questions
+        ingest_seconds = (retrieval_start - ingest_start) / len(questions)
+        retrieval_seconds = (retrieval_end - retrieval_start) / len(questions)
+        for question, result in zip(questions, retrieved):
+            tasks.append(asyncio.create_task(answer(paper, question, result, ingest_seconds, retrieval_seconds)))
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        llm_executor.shutdown(wait=False)
+    summary['wall_seconds'] = time.perf_counter() - start
+    return summary
+
+
+def _load_pairs(args):
+    if args.pairs:
+        with open(args.pairs, 'r', encoding='utf-8') as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        return [(item['paper'], item['question']) for item in items]
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        questions = [line.strip() for line in f if line.strip()]
+    return [(paper, question) for paper in args.papers for question in questions]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', help="JSONL file of {\"paper\": path, \"question\": text}")
+    parser.add_argument('--papers', nargs='+', help="PDF paths, each asked every question in --questions")
+    parser.add_argument('--questions', help="Text file with one question per line")
+    parser.add_argument('--output', help="JSONL output path (default: stdout)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--max-retries', type=int, default=5,
+                        help="Retries per LLM call for rate limits and transient errors")
+    parser.add_argument('--show-sources', action='store_true')
+    parser.add_argument('--no-cache', action='store_true', help="Do not use the on-disk index cache")
+    parser.add_argument('--embed-workers', type=int, default=0,
+                        help="Embed papers on this many worker processes (default: in-process)")
+    args = parser.parse_args()
+
+    if not args.pairs and not (args.papers and args.questions):
+        parser.error("provide --pairs, or --papers together with --questions")
+
+    pairs = _load_pairs(args)
+    index_cache = None if args.no_cache else IndexCache()
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    bulk_encoder = BulkEncoder(workers=args.embed_workers) if args.embed_workers > 0 else None
+    backend = create_llm_backend(max_retries=args.max_retries)
+    try:
+        summary = asyncio.run(run_bulk_qa(
+            pairs, output,
+            concurrency=args.concurrency,
+            k=args.k,
+            show_sources=args.show_sources,
+            index_cache=index_cache,
+            backend=backend,
+            bulk_encoder=bulk_encoder
+        ))
+    finally:
+        if bulk_encoder is not None:
+            bulk_encoder.close()
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
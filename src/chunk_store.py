@@ -0,0 +1,202 @@
+import operator
+import numpy as np
+
+# Arrays written by ChunkStore.save(); the text buffer is stored as UTF-8 bytes
+_COLUMNS = ('chunk_ids', 'section_ids', 'section_starts', 'starts', 'ends', 'pages')
+
+
+class ChunkStore:
+    """
+    Columnar store of one document's chunks
+
+    Chunk texts are [start, end) character spans of a single shared text
+    buffer (the extracted document text), so the overlap between
+    consecutive chunks is held once. Section names are interned to integer
+    ids, and chunk positions are kept grouped by section, so per-section
+    counts and positions are lookups instead of scans over every chunk.
+
+    Indexing and iteration build chunk dicts ('chunk_id', 'text',
+    'section', 'section_start', 'start', 'end', 'page') on access, so code
+    written against the old list of dicts keeps working; each dict is a
+    fresh copy.
+
+    Args:
+        buffer: Text the chunk offsets point into (a str, or an object
+            sliced and encoded like one, e.g. a streaming ingest's view of
+            the pages read)
+        chunk_ids: Content-hash id per chunk
+        section_ids: Index into section_names per chunk
+        section_names: Interned section names
+        section_starts: Line number of the chunk's section header, per chunk
+        starts, ends: Character span of each chunk in buffer
+        pages: 1-based source page of each chunk's first character (None
+            if unknown)
+    """
+
+    def __init__(self, buffer, chunk_ids, section_ids, section_names, section_starts, starts, ends, pages=None):
+        self.buffer = buffer
+        self.chunk_ids = np.asarray(chunk_ids, dtype='int64')
+        self.section_ids = np.asarray(section_ids, dtype='int32')
+        self.section_names = list(section_names)
+        self.section_starts = np.asarray(section_starts, dtype='int32')
+        self.starts = np.asarray(starts, dtype='int64')
+        self.ends = np.asarray(ends, dtype='int64')
+        # 0 marks an unknown page
+        self.pages = np.zeros(len(self.chunk_ids), dtype='int32') if pages is None else np.asarray(pages, dtype='int32')
+        self._section_lookup = {name: i for i, name in enumerate(self.section_names)}
+
+        # Chunk positions grouped by section: section s owns
+        # section_order[section_offsets[s]:section_offsets[s + 1]], in document order
+        self.section_order = np.argsort(self.section_ids, kind='stable')
+        self.section_sizes = np.bincount(self.section_ids, minlength=len(self.section_names))
+        self.section_offsets = np.concatenate(([0], np.cumsum(self.section_sizes))).astype('int64')
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Build a store from chunk dicts
+
+        When every chunk carries 'start'/'end' document offsets, the buffer
+        is rebuilt by laying each chunk's text at its offsets; characters no
+        chunk covers are left blank. Otherwise (e.g. plain
+        {'chunk_id', 'text', 'section', ...} lists) the texts are laid out
+        one after another, newline-separated, and the offsets synthesized;
+        those offsets then only point into this store's own buffer.
+        """
+        chunks = list(chunks)
+        if all('start' in item and 'end' in item for item in chunks):
+            starts = [item['start'] for item in chunks]
+            ends = [item['end'] for item in chunks]
+            buffer = [' '] * max(ends, default=0)
+            for item in chunks:
+                buffer[item['start']:item['end']] = item['text']
+            buffer = ''.join(buffer)
+        else:
+            starts = []
+            ends = []
+            offset = 0
+            for item in chunks:
+                starts.append(offset)
+                ends.append(offset + len(item['text']))
+                offset += len(item['text']) + 1
+            buffer = '\n'.join(item['text'] for item in chunks)
+
+        section_lookup = {}
+        section_ids = [section_lookup.setdefault(item['section'], len(section_lookup)) for item in chunks]
+        return cls(
+            buffer,
+            [item['chunk_id'] for item in chunks],
+            section_ids,
+            list(section_lookup),
+            [item.get('section_start', 0) for item in chunks],
+            starts,
+            ends,
+            [item.get('page') or 0 for item in chunks]
+        )
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return self.take(np.arange(len(self))[position])
+        position = operator.index(position)
+        if position < 0:
+            position += len(self)
+        start = int(self.starts[position])
+        end = int(self.ends[position])
+        page = int(self.pages[position])
+        return {
+            'chunk_id': int(self.chunk_ids[position]),
+            'text': self.buffer[start:end],
+            'section': self.section_names[self.section_ids[position]],
+            'section_start': int(self.section_starts[position]),
+            'start': start,
+            'end': end,
+            'page': page or None
+        }
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def text(self, position):
+        return self.buffer[self.starts[position]:self.ends[position]]
+
+    def texts(self):
+        """All chunk texts, in order"""
+        buffer = self.buffer
+        return [buffer[start:end] for start, end in zip(self.starts.tolist(), self.ends.tolist())]
+
+    def section_count(self, section):
+        """Number of chunks in a section (0 if it has none)"""
+        section_id = self._section_lookup.get(section)
+        return int(self.section_sizes[section_id]) if section_id is not None else 0
+
+    def section_counts(self):
+        """Number of chunks per section, ordered by section name"""
+        return {name: int(self.section_sizes[i])
+                for name, i in sorted(self._section_lookup.items()) if self.section_sizes[i]}
+
+    def section_positions(self, section):
+        """Positions of a section's chunks, in document order (empty if it has none)"""
+        section_id = self._section_lookup.get(section)
+        if section_id is None:
+            return np.empty(0, dtype='int64')
+        return self.section_order[self.section_offsets[section_id]:self.section_offsets[section_id + 1]]
+
+    def sections(self):
+        """Sorted names of the sections that have chunks"""
+        return list(self.section_counts())
+
+    def take(self, positions):
+        """New store holding the chunks at positions, in that order, sharing the text buffer"""
+        positions = np.asarray(positions, dtype='int64')
+        used, section_ids = np.unique(self.section_ids[positions], return_inverse=True)
+        return ChunkStore(
+            self.buffer,
+            self.chunk_ids[positions],
+            section_ids.reshape(-1),
+            [self.section_names[i] for i in used],
+            self.section_starts[positions],
+            self.starts[positions],
+            self.ends[positions],
+            self.pages[positions]
+        )
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the columns and the text buffer"""
+        columns = sum(getattr(self, name).nbytes for name in _COLUMNS)
+        return columns + self.section_order.nbytes + len(self.buffer.encode('utf-8'))
+
+    def save(self, file):
+        """Write the store to a path or binary file object as an .npz archive"""
+        np.savez(
+            file,
+            buffer=np.frombuffer(self.buffer.encode('utf-8'), dtype='uint8'),
+            section_names=np.array(self.section_names, dtype=str),
+            **{name: getattr(self, name) for name in _COLUMNS}
+        )
+
+    @classmethod
+    def load(cls, file):
+        """Read a store written by save()"""
+        with np.load(file, allow_pickle=False) as arrays:
+            return cls(
+                arrays['buffer'].tobytes().decode('utf-8'),
+                arrays['chunk_ids'],
+                arrays['section_ids'],
+                arrays['section_names'].tolist(),
+                arrays['section_starts'],
+                arrays['starts'],
+                arrays['ends'],
+                arrays['pages']
+            )
+
+
+def as_chunk_store(chunked_data):
+    """chunked_data as a ChunkStore, converting a list of chunk dicts if needed"""
+    if isinstance(chunked_data, ChunkStore):
+        return chunked_data
+    return ChunkStore.from_chunks(chunked_data)
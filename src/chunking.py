@@ -0,0 +1,141 @@
+"""
+Recursive character chunking over offsets into the extracted text
+
+SpanSplitter splits the way langchain's RecursiveCharacterTextSplitter did
+for this project: separators are tried in order and kept at the start of the
+piece they open, pieces shorter than chunk_size are merged up to chunk_size
+characters with up to chunk_overlap characters carried over, longer pieces
+are split again with the next separator, and merged chunks are stripped of
+surrounding whitespace.
+
+Because separators are kept, the pieces of a span are contiguous and a
+merged chunk is just the span from its first piece to its last. The splitter
+therefore works on (start, end) offsets into the original text: separators
+are located with str.find within the span, no piece or section body is
+copied, and chunk strings are only built when asked for.
+"""
+
+DEFAULT_SEPARATORS = ("\n\n", "\n", ". ", " ", "")
+
+
+def strip_span(text, start, end):
+    """Narrow text[start:end] to its str.strip() span"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def separator_spans(text, start, end, separator):
+    """
+    Pieces of text[start:end], each opened by an occurrence of separator
+
+    The first piece is whatever precedes the first occurrence; empty pieces
+    are dropped. An empty separator splits into single characters.
+    """
+    if not separator:
+        return [(i, i + 1) for i in range(start, end)]
+    spans = []
+    piece_start = start
+    position = text.find(separator, start, end)
+    while position != -1:
+        if position > piece_start:
+            spans.append((piece_start, position))
+        piece_start = position
+        position = text.find(separator, position + len(separator), end)
+    if end > piece_start:
+        spans.append((piece_start, end))
+    return spans
+
+
+class SpanSplitter:
+    """
+    Recursive character splitter that returns spans instead of strings
+
+    split_spans(text, start, end) gives the (start, end) offsets of the
+    chunks of text[start:end]; split_text(text) materializes them and
+    matches RecursiveCharacterTextSplitter(chunk_size, chunk_overlap,
+    separators).split_text(text). Lengths are measured in characters.
+
+    Args:
+        chunk_size: Maximum chunk length in characters
+        chunk_overlap: Maximum characters shared by consecutive chunks
+        separators: Separators to split on, coarsest first; "" splits
+            into characters
+    """
+
+    def __init__(self, chunk_size=500, chunk_overlap=100, separators=DEFAULT_SEPARATORS):
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), should be smaller."
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = tuple(separators)
+
+    def split_spans(self, text, start=0, end=None):
+        """Chunk spans of text[start:end], in order"""
+        if end is None:
+            end = len(text)
+        spans = []
+        self._split(text, start, end, self.separators, spans)
+        return spans
+
+    def split_text(self, text):
+        """Chunk strings of text"""
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def _split(self, text, start, end, separators, spans):
+        # Split on the first separator present in the span; pieces that are
+        # still too long are split again with the separators after it
+        separator = separators[-1]
+        remaining = ()
+        for i, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                remaining = separators[i + 1:]
+                break
+
+        pieces = separator_spans(text, start, end, separator)
+        first = 0
+        for i, (piece_start, piece_end) in enumerate(pieces):
+            if piece_end - piece_start < self.chunk_size:
+                continue
+            if first < i:
+                self._merge(text, pieces, first, i, spans)
+            if remaining:
+                self._split(text, piece_start, piece_end, remaining, spans)
+            else:
+                # Nothing left to split on: kept whole and unstripped
+                spans.append((piece_start, piece_end))
+            first = i + 1
+        if first < len(pieces):
+            self._merge(text, pieces, first, len(pieces), spans)
+
+    def _merge(self, text, pieces, first, last, spans):
+        # Merge the contiguous pieces[first:last] into chunks of at most
+        # chunk_size characters, starting each new chunk with the trailing
+        # pieces of the previous one that fit in chunk_overlap
+        head = first
+        total = 0
+        for i in range(first, last):
+            piece_start, piece_end = pieces[i]
+            length = piece_end - piece_start
+            if total + length > self.chunk_size and head < i:
+                self._emit(text, pieces[head][0], pieces[i - 1][1], spans)
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    total -= pieces[head][1] - pieces[head][0]
+                    head += 1
+            total += length
+        if head < last:
+            self._emit(text, pieces[head][0], pieces[last - 1][1], spans)
+
+    @staticmethod
+    def _emit(text, start, end, spans):
+        start, end = strip_span(text, start, end)
+        if start < end:
+            spans.append((start, end))
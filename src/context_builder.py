@@ -0,0 +1,184 @@
+import os
+import threading
+
+# Context tokens allowed per prompt (retrieved text plus block headers)
+DEFAULT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "3000"))
+
+# Chunks of one section this many characters apart or closer are merged;
+# the gap between consecutive chunks is only the whitespace the splitter stripped
+MAX_MERGE_GAP = 2
+
+# A block truncated to fit the budget must keep at least this many tokens
+MIN_PARTIAL_TOKENS = 64
+
+# Rough characters per token, used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+class _ApproximateTokenizer:
+    """Character-count estimate for when tiktoken or its encoding files are unavailable"""
+
+    name = 'approximate'
+
+    def count(self, text):
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+    def truncate(self, text, max_tokens):
+        return text[:max_tokens * CHARS_PER_TOKEN]
+
+
+class _TiktokenTokenizer:
+    def __init__(self, model):
+        import tiktoken
+        self.encoding = tiktoken.encoding_for_model(model)
+        self.name = self.encoding.name
+
+    def count(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def get_tokenizer(model="gpt-4o-mini"):
+    """Process-wide tokenizer for the generation model, loaded on first use"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                try:
+                    _tokenizer = _TiktokenTokenizer(model)
+                except Exception:
+                    # Not installed, or the encoding could not be downloaded
+                    _tokenizer = _ApproximateTokenizer()
+    return _tokenizer
+
+
+def importance_label(rank):
+    """Prompt label for a 0-based retrieval rank"""
+    return "PRIMARY" if rank == 0 else "SECONDARY" if rank < 3 else "SUPPORTING"
+
+
+def format_block(label, relevance, section, text):
+    return (
+        f"[{label} CONTEXT - Relevance: {relevance:.2%}]\n"
+        f"Section: {section}\n"
+        f"Content: {text}\n"
+    )
+
+
+def merge_chunks(retrieved_chunks, weights, max_gap=MAX_MERGE_GAP):
+    """
+    Merge overlapping or adjacent chunks of the same section
+
+    Chunks need 'start'/'end' character offsets; chunks without them are
+    kept as they are. A merged block takes the best rank and the summed
+    relevance weight of its members, and holds their text once, in
+    document order.
+
+    Returns:
+        List of block dicts ('rank', 'relevance', 'section', 'text',
+        'chunks'), ordered by rank
+    """
+    blocks = []
+    spans = []
+    for rank, (chunk, weight) in enumerate(zip(retrieved_chunks, weights)):
+        block = {
+            'rank': rank,
+            'relevance': float(weight),
+            'section': chunk['section'],
+            'text': chunk['text'],
+            'chunks': 1,
+        }
+        blocks.append(block)
+        if 'start' in chunk and 'end' in chunk:
+            spans.append((chunk['section'], chunk['start'], chunk['end'], block))
+
+    # Sweep each section's spans in document order, growing the current block
+    spans.sort(key=lambda span: (span[0], span[1]))
+    merged_into = {}
+    current = None
+    for section, start, end, block in spans:
+        if current is not None and current[0] == section and start <= current[2] + max_gap:
+            target = current[3]
+            if end > current[2]:
+                overlap = current[2] - start
+                tail = block['text'][overlap:] if overlap >= 0 else '\n' + block['text']
+                target['text'] += tail
+                current = (section, current[1], end, target)
+            target['rank'] = min(target['rank'], block['rank'])
+            target['relevance'] += block['relevance']
+            target['chunks'] += block['chunks']
+            merged_into[id(block)] = target
+        else:
+            current = (section, start, end, block)
+
+    kept = [block for block in blocks if id(block) not in merged_into]
+    return sorted(kept, key=lambda block: block['rank'])
+
+
+def build_context(retrieved_chunks, weights, token_budget=DEFAULT_TOKEN_BUDGET, merge=True):
+    """
+    Assemble the prompt context from rank-weighted chunks within a token budget
+
+    Overlapping and adjacent chunks of one section are merged (see
+    merge_chunks), then blocks are added best-ranked first, each labelled
+    PRIMARY/SECONDARY/SUPPORTING by its best member's rank. The block that
+    crosses the budget is truncated if enough room is left, and the rest
+    are dropped.
+
+    Returns:
+        (context, report) where report has 'tokens_verbatim' (pasting every
+        chunk as-is), 'tokens' (the built context), 'tokens_saved',
+        'chunks_merged', 'chunks_dropped' and 'tokenizer'
+    """
+    tokenizer = get_tokenizer()
+    verbatim = "\n".join(
+        format_block(importance_label(i), weight, chunk['section'], chunk['text'])
+        for i, (chunk, weight) in enumerate(zip(retrieved_chunks, weights))
+    )
+    tokens_verbatim = tokenizer.count(verbatim)
+
+    if merge:
+        blocks = merge_chunks(retrieved_chunks, weights)
+    else:
+        blocks = [
+            {'rank': i, 'relevance': float(weight), 'section': chunk['section'], 'text': chunk['text'], 'chunks': 1}
+            for i, (chunk, weight) in enumerate(zip(retrieved_chunks, weights))
+        ]
+
+    parts = []
+    used = 0
+    included_chunks = 0
+    for block in blocks:
+        part = format_block(importance_label(block['rank']), block['relevance'], block['section'], block['text'])
+        # Parts are joined by newlines, one token each at most
+        cost = tokenizer.count(part) + (1 if parts else 0)
+        if used + cost <= token_budget:
+            parts.append(part)
+            used += cost
+            included_chunks += block['chunks']
+            continue
+
+        header = format_block(importance_label(block['rank']), block['relevance'], block['section'], '')
+        room = token_budget - used - tokenizer.count(header) - 1
+        if room >= MIN_PARTIAL_TOKENS or not parts:
+            text = tokenizer.truncate(block['text'], max(room, 0))
+            parts.append(format_block(importance_label(block['rank']), block['relevance'], block['section'], text))
+            included_chunks += block['chunks']
+        break
+
+    context = "\n".join(parts)
+    tokens = tokenizer.count(context)
+    report = {
+        'tokens_verbatim': tokens_verbatim,
+        'tokens': tokens,
+        'tokens_saved': tokens_verbatim - tokens,
+        'chunks_merged': sum(block['chunks'] - 1 for block in blocks),
+        'chunks_dropped': len(retrieved_chunks) - included_chunks,
+        'tokenizer': tokenizer.name,
+    }
+    return context, report
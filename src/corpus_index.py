@@ -0,0 +1,245 @@
+import time
+from array import array
+import faiss
+import numpy as np
+
+from src.embedding_utils import embed_query, apply_rank_based_weighting
+
+BACKENDS = ('flat', 'ivf', 'hnsw')
+
+
+class CorpusIndex:
+    """
+    Corpus-level nearest-neighbour index across many papers
+
+    Papers are added incrementally; every vector carries a paper id and an
+    interned section id so searches can be restricted to one paper and/or
+    one section. Vector ids are assigned sequentially, so each paper owns a
+    contiguous id range.
+
+    Args:
+        dimension: Embedding dimension
+        backend: 'flat' (exact), 'ivf' (IVF-Flat) or 'hnsw' (HNSW-Flat)
+        nlist: Number of IVF lists
+        train_size: Vectors to collect before training IVF (default 39 * nlist).
+            Until then vectors are held in an exact staging index.
+        hnsw_m: HNSW graph degree
+        ef_construction: HNSW build-time search depth
+    """
+
+    def __init__(self, dimension, backend='hnsw', nlist=256, train_size=None, hnsw_m=32, ef_construction=200):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+
+        self.dimension = dimension
+        self.backend = backend
+        self.nlist = nlist
+        self.train_size = train_size or 39 * nlist
+
+        if backend == 'flat':
+            self.index = faiss.IndexFlatIP(dimension)
+        elif backend == 'hnsw':
+            self.index = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efConstruction = ef_construction
+        else:
+            self._quantizer = faiss.IndexFlatIP(dimension)
+            self.index = faiss.IndexIVFFlat(self._quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        # IVF needs training data; stage vectors exactly until there is enough
+        self._staging = faiss.IndexFlatIP(dimension) if backend == 'ivf' else None
+
+        # Per-vector metadata, aligned with vector ids
+        self._paper_ids = array('i')
+        self._section_ids = array('i')
+        self._local_ids = array('i')
+
+        # Paper and section interning
+        self.paper_keys = []
+        self.paper_chunks = []
+        self.paper_ranges = []
+        self._paper_lookup = {}
+        self.section_names = []
+        self._section_lookup = {}
+
+    @property
+    def ntotal(self):
+        return len(self._paper_ids)
+
+    @property
+    def is_trained(self):
+        return self._staging is None
+
+    def _intern_section(self, name):
+        section_id = self._section_lookup.get(name)
+        if section_id is None:
+            section_id = len(self.section_names)
+            self._section_lookup[name] = section_id
+            self.section_names.append(name)
+        return section_id
+
+    def add_paper(self, paper_key, chunked_data, embeddings):
+        """
+        Add one paper's normalized embeddings to the corpus
+
+        Args:
+            paper_key: Unique key for the paper (e.g. its content hash)
+            chunked_data: The paper's chunk dicts, aligned with embeddings
+            embeddings: Normalized float32 array of shape (len(chunked_data), dimension)
+        """
+        if paper_key in self._paper_lookup:
+            raise ValueError(f"Paper '{paper_key}' is already in the corpus")
+        if len(chunked_data) != len(embeddings):
+            raise ValueError("chunked_data and embeddings must have the same length")
+
+        paper_id = len(self.paper_keys)
+        start = self.ntotal
+        self._paper_lookup[paper_key] = paper_id
+        self.paper_keys.append(paper_key)
+        self.paper_chunks.append(chunked_data)
+        self.paper_ranges.append((start, start + len(chunked_data)))
+
+        for local_id, item in enumerate(chunked_data):
+            self._paper_ids.append(paper_id)
+            self._section_ids.append(self._intern_section(item['section']))
+            self._local_ids.append(local_id)
+
+        vectors = np.ascontiguousarray(embeddings, dtype='float32')
+        if self._staging is not None:
+            self._staging.add(vectors)
+            if self._staging.ntotal >= self.train_size:
+                self._train_from_staging()
+        else:
+            self.index.add(vectors)
+        return paper_id
+
+    def _train_from_staging(self):
+        """Train the IVF index on staged vectors and move them into it"""
+        staged = self._staging.reconstruct_n(0, self._staging.ntotal)
+        self.index.train(staged)
+        self.index.add(staged)
+        self._staging = None
+
+    def _selector(self, paper=None, section=None):
+        """Build an ID selector for an optional paper and/or section restriction"""
+        if paper is None and section is None:
+            return None, None
+
+        if paper is not None:
+            if paper not in self._paper_lookup:
+                return None, 0
+            start, end = self.paper_ranges[self._paper_lookup[paper]]
+        else:
+            start, end = 0, self.ntotal
+
+        if section is None:
+            return faiss.IDSelectorRange(start, end), end - start
+
+        section_id = self._section_lookup.get(section)
+        if section_id is None:
+            return None, 0
+        section_ids = np.frombuffer(self._section_ids, dtype='int32')[start:end]
+        ids = np.flatnonzero(section_ids == section_id).astype('int64') + start
+        return faiss.IDSelectorBatch(ids), len(ids)
+
+    def _search_params(self, selector, nprobe, ef_search):
+        kwargs = {}
+        if selector is not None:
+            kwargs['sel'] = selector
+        if self.backend == 'hnsw' and self.is_trained:
+            if ef_search is not None:
+                kwargs['efSearch'] = ef_search
+            return faiss.SearchParametersHNSW(**kwargs) if kwargs else None
+        if self.backend == 'ivf' and self.is_trained:
+            if nprobe is not None:
+                kwargs['nprobe'] = nprobe
+            return faiss.SearchParametersIVF(**kwargs) if kwargs else None
+        return faiss.SearchParameters(**kwargs) if kwargs else None
+
+    def search_embeddings(self, query_embeddings, k=5, paper=None, section=None, nprobe=None, ef_search=None):
+        """
+        Search with pre-computed normalized query embeddings
+
+        Returns:
+            (distances, ids) arrays of shape (n_queries, k); missing results
+            have id -1
+        """
+        selector, n_candidates = self._selector(paper, section)
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        if n_candidates == 0:
+            n = len(query_embeddings)
+            return np.zeros((n, 0), dtype='float32'), np.zeros((n, 0), dtype='int64')
+
+        params = self._search_params(selector, nprobe, ef_search)
+        index = self._staging if self._staging is not None else self.index
+        return index.search(query_embeddings, k, params=params)
+
+    def search(self, query, k=5, paper=None, section=None, nprobe=None, ef_search=None):
+        """
+        Retrieve top-k chunks across the corpus with rank-based weighting
+
+        Returns the same (retrieved_chunks, weights, distances) triple as
+        get_top_k_chunks; each chunk dict is a copy with a 'paper' key added.
+        """
+        distances, ids = self.search_embeddings(
+            embed_query(query), k, paper=paper, section=section, nprobe=nprobe, ef_search=ef_search
+        )
+        distances, ids = distances[0], ids[0]
+        found = ids >= 0
+        distances, ids = distances[found], ids[found]
+
+        retrieved_chunks = []
+        for vector_id in ids:
+            paper_id = self._paper_ids[vector_id]
+            chunk = dict(self.paper_chunks[paper_id][self._local_ids[vector_id]])
+            chunk['paper'] = self.paper_keys[paper_id]
+            retrieved_chunks.append(chunk)
+
+        weights = apply_rank_based_weighting(distances, k=len(retrieved_chunks))
+        return retrieved_chunks, weights, distances
+
+
+def recall_report(corpus_index, base_embeddings, query_embeddings, k=10, nprobe_values=None, ef_search_values=None):
+    """
+    Measure recall@k and latency of an approximate corpus index against exact search
+
+    Args:
+        corpus_index: A populated CorpusIndex
+        base_embeddings: The vectors added to the corpus, in insertion order
+        query_embeddings: Normalized query vectors
+        k: Number of neighbours compared
+        nprobe_values: IVF nprobe settings to sweep
+        ef_search_values: HNSW efSearch settings to sweep
+
+    Returns:
+        List of dicts with the setting, recall@k and mean per-query latency (ms)
+    """
+    query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+    exact = faiss.IndexFlatIP(corpus_index.dimension)
+    exact.add(np.ascontiguousarray(base_embeddings, dtype='float32'))
+    _, true_ids = exact.search(query_embeddings, k)
+
+    if corpus_index.backend == 'ivf':
+        settings = [('nprobe', value) for value in (nprobe_values or [1, 4, 16, 64])]
+    elif corpus_index.backend == 'hnsw':
+        settings = [('efSearch', value) for value in (ef_search_values or [16, 32, 64, 128, 256])]
+    else:
+        settings = [(None, None)]
+
+    report = []
+    for name, value in settings:
+        start = time.perf_counter()
+        _, ids = corpus_index.search_embeddings(
+            query_embeddings, k,
+            nprobe=value if name == 'nprobe' else None,
+            ef_search=value if name == 'efSearch' else None
+        )
+        elapsed = time.perf_counter() - start
+
+        hits = sum(len(set(found) & set(truth)) for found, truth in zip(ids, true_ids))
+        report.append({
+            'backend': corpus_index.backend,
+            'parameter': name,
+            'value': value,
+            'recall_at_k': hits / float(true_ids.size),
+            'latency_ms': 1000.0 * elapsed / len(query_embeddings),
+        })
+    return report
@@ -0,0 +1,191 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+
+# Memory budget for loaded documents across all sessions of a process
+DEFAULT_MAX_BYTES = int(os.getenv("RAG_DOCUMENT_MEMORY_BYTES", 1024 ** 3))
+
+
+def document_nbytes(document):
+    """
+    Approximate resident memory of a loaded document dict
+
+    Counts the chunk store, the FAISS index codes, the BM25 postings, the
+    section filter ids and any in-memory rerank vectors. Memory-mapped
+    vectors live in the page cache and are not counted.
+    """
+    total = 0
+    chunked_data = document.get('chunked_data')
+    if chunked_data is not None:
+        total += chunked_data.nbytes
+    index = document.get('index')
+    if index is not None:
+        total += index.sa_code_size() * index.ntotal
+    lexical_index = document.get('lexical_index')
+    if lexical_index is not None:
+        total += lexical_index.nbytes
+    for ids, _ in (document.get('section_filters') or {}).values():
+        total += ids.nbytes
+    rerank_vectors = document.get('rerank_vectors')
+    if isinstance(rerank_vectors, np.ndarray) and not isinstance(rerank_vectors, np.memmap):
+        total += rerank_vectors.nbytes
+    return total
+
+
+class _Entry:
+    __slots__ = ('document', 'nbytes', 'refcount')
+
+    def __init__(self, document, nbytes, refcount):
+        self.document = document
+        self.nbytes = nbytes
+        self.refcount = refcount
+
+
+class DocumentHandle:
+    """
+    One holder's reference to a shared document
+
+    The reference is dropped by release(), on leaving a with block, or when
+    the handle is garbage collected (e.g. with the session that held it).
+    """
+
+    def __init__(self, registry, document_hash, document):
+        self.document_hash = document_hash
+        self.document = document
+        self._finalizer = weakref.finalize(self, registry._release, document_hash)
+
+    @property
+    def released(self):
+        return not self._finalizer.alive
+
+    def release(self):
+        """Drop the reference; later calls do nothing"""
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class DocumentRegistry:
+    """
+    Process-wide store of loaded documents, shared read-only by all sessions
+
+    Documents are keyed by content hash. acquire() hands out a
+    DocumentHandle and counts a reference until the handle is released.
+    Unreferenced documents stay loaded for reuse and are evicted least
+    recently used first once the estimated total size exceeds max_bytes;
+    referenced documents are never evicted, so the budget can be exceeded
+    while every loaded document is in use.
+
+    Concurrent acquire() calls for a document that is not loaded run its
+    loader once; the other callers wait for that result. A failed load is
+    raised in every waiting caller and nothing is cached.
+
+    Args:
+        max_bytes: Memory budget (see RAG_DOCUMENT_MEMORY_BYTES)
+        sizeof: Function estimating a loaded document's size in bytes
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, sizeof=document_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._bytes = 0
+        self._hits = 0
+        self._loads = 0
+        self._evictions = 0
+
+    def acquire(self, document_hash, loader):
+        """
+        Reference a document, loading it with loader() if it is not loaded
+
+        Returns:
+            DocumentHandle whose .document is the shared document; treat it
+            as read-only
+        """
+        with self._lock:
+            entry = self._entries.get(document_hash)
+            if entry is not None:
+                entry.refcount += 1
+                self._entries.move_to_end(document_hash)
+                self._hits += 1
+                return DocumentHandle(self, document_hash, entry.document)
+
+            pending = self._pending.get(document_hash)
+            if pending is not None:
+                # The loading caller takes this reference on our behalf
+                pending[1] += 1
+                self._hits += 1
+                future = pending[0]
+            else:
+                future = None
+                self._pending[document_hash] = [Future(), 0]
+
+        if future is not None:
+            return DocumentHandle(self, document_hash, future.result())
+
+        try:
+            document = loader()
+            nbytes = self.sizeof(document)
+        except BaseException as e:
+            with self._lock:
+                future = self._pending.pop(document_hash)[0]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            future, waiters = self._pending.pop(document_hash)
+            self._entries[document_hash] = _Entry(document, nbytes, 1 + waiters)
+            self._bytes += nbytes
+            self._loads += 1
+            self._evict()
+        future.set_result(document)
+        return DocumentHandle(self, document_hash, document)
+
+    def _release(self, document_hash):
+        with self._lock:
+            entry = self._entries.get(document_hash)
+            if entry is None:
+                return
+            entry.refcount -= 1
+            if entry.refcount == 0:
+                self._evict()
+
+    def _evict(self):
+        # Called with the lock held
+        for document_hash in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            entry = self._entries[document_hash]
+            if entry.refcount > 0:
+                continue
+            del self._entries[document_hash]
+            self._bytes -= entry.nbytes
+            self._evictions += 1
+
+    def __contains__(self, document_hash):
+        with self._lock:
+            return document_hash in self._entries
+
+    def stats(self):
+        """Loaded and referenced document counts, memory use and hit/load/eviction counters"""
+        with self._lock:
+            return {
+                'documents': len(self._entries),
+                'referenced': sum(1 for entry in self._entries.values() if entry.refcount > 0),
+                'references': sum(entry.refcount for entry in self._entries.values()),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'loads': self._loads,
+                'evictions': self._evictions,
+            }
@@ -0,0 +1,167 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+
+# Sentinel used to stop the worker thread
+_STOP = object()
+
+
+class _EncodeRequest:
+    """A single caller's texts waiting to be encoded"""
+
+    __slots__ = ('texts', 'future', 'enqueued_at')
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    """
+    In-process dynamic micro-batching for embedding requests
+
+    Callers submit lists of texts and get a Future back. A single worker
+    thread collects pending requests and encodes them together in one call,
+    flushing when max_batch_size texts are queued or max_wait_ms has passed
+    since the oldest request in the batch arrived.
+
+    Requests submitted after close() raise RuntimeError instead of waiting
+    on a worker that has stopped.
+
+    Args:
+        encode_fn: Callable mapping a list of texts to a 2D numpy array
+        max_batch_size: Flush once this many texts are queued
+        max_wait_ms: Longest time a request waits for the batch to fill
+        stats_window: Number of recent batches kept for the wait statistics
+        dimension_fn: Callable returning the embedding size, used to shape
+            the (0, dimension) result of an empty request (default: the
+            width of encode_fn on one empty text)
+    """
+
+    def __init__(self, encode_fn, max_batch_size=64, max_wait_ms=5.0, stats_window=1000, dimension_fn=None):
+        self.encode_fn = encode_fn
+        self.dimension_fn = dimension_fn or (lambda: np.asarray(encode_fn([''])).shape[1])
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        # Guards _closed so no request is queued behind the stop sentinel
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._queue_waits = deque(maxlen=stats_window)
+        self._total_batches = 0
+        self._total_requests = 0
+        self._total_texts = 0
+
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts):
+        """Queue texts for encoding; returns a Future resolving to their embeddings"""
+        request = _EncodeRequest(list(texts))
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            if request.texts:
+                self._queue.put(request)
+                return request.future
+        request.future.set_result(np.zeros((0, self.dimension_fn()), dtype='float32'))
+        return request.future
+
+    def encode(self, texts):
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(texts).result()
+
+    def close(self):
+        """Stop the worker after draining already-queued requests"""
+        with self._submit_lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+        self._worker.join()
+
+    def _collect_batch(self, first):
+        """Gather requests following `first` until the batch is full or times out"""
+        batch = [first]
+        size = len(first.texts)
+        deadline = first.enqueued_at + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    request = self._queue.get(timeout=remaining)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is _STOP:
+                # Put it back so the run loop exits after this batch
+                self._queue.put(_STOP)
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            batch = self._collect_batch(first)
+            started_at = time.perf_counter()
+            texts = [text for request in batch for text in request.texts]
+
+            try:
+                embeddings = self.encode_fn(texts)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in batch:
+                n = len(request.texts)
+                request.future.set_result(embeddings[offset:offset + n])
+                offset += n
+
+            with self._stats_lock:
+                self._total_batches += 1
+                self._total_requests += len(batch)
+                self._total_texts += len(texts)
+                self._batch_sizes.append(len(texts))
+                self._queue_waits.extend(started_at - request.enqueued_at for request in batch)
+
+    def stats(self):
+        """
+        Report batching statistics
+
+        Batch sizes and queue waits (in milliseconds) cover the most recent
+        stats_window batches; totals cover the lifetime of the batcher.
+        """
+        with self._stats_lock:
+            batch_sizes = np.array(self._batch_sizes, dtype='float64')
+            waits_ms = np.array(self._queue_waits, dtype='float64') * 1000.0
+            stats = {
+                'total_batches': self._total_batches,
+                'total_requests': self._total_requests,
+                'total_texts': self._total_texts,
+                'queue_depth': self._queue.qsize(),
+            }
+
+        if len(batch_sizes):
+            stats.update({
+                'mean_batch_size': float(batch_sizes.mean()),
+                'max_batch_size': int(batch_sizes.max()),
+                'mean_queue_wait_ms': float(waits_ms.mean()),
+                'p95_queue_wait_ms': float(np.percentile(waits_ms, 95)),
+                'max_queue_wait_ms': float(waits_ms.max()),
+            })
+        return stats
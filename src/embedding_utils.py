@@ -1,12 +1,27 @@
 import faiss
+import hashlib
 import numpy as np
 import re
-from PyPDF2 import PdfReader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
+import time
+from src.encoders import get_encoder, DEFAULT_MODEL_NAME
+from src.pdf_extraction import extract_text_from_pdf, pages_at_offsets
+from src.lexical_index import BM25Index, HybridRetrievalStats
+from src.chunk_store import ChunkStore, as_chunk_store
+from src.chunking import SpanSplitter
+from src.telemetry import telemetry
 
-# Initialize semantic embedding model
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Semantic embedding model; loaded lazily on first encode (see src/encoders.py)
+EMBEDDING_MODEL_NAME = DEFAULT_MODEL_NAME
+
+# Optional shared EmbeddingBatcher (see src/embedding_service.py)
+_embedding_service = None
+
+# Process-wide hybrid retrieval statistics
+hybrid_stats = HybridRetrievalStats()
+
+# Default chunking parameters
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_CHUNK_OVERLAP = 100
 
 # Common scientific paper section headers
 SECTION_PATTERNS = [
@@ -32,91 +47,406 @@ SECTION_PATTERNS = [
     r'^\s*appendix\s*$',
 ]
 
-def extract_text_from_pdf(uploaded_file):
-    """Extract text from PDF with page information"""
-    reader = PdfReader(uploaded_file)
-    text = ""
-    for page_num, page in enumerate(reader.pages):
-        page_text = page.extract_text()
-        text += f"\n[PAGE {page_num + 1}]\n{page_text}"
-    return text
+# Whitespace that does not cross a line break, so header patterns only ever
+# match within a single line of the combined multi-line matcher
+_INLINE_SPACE = r'[^\S\n]'
+_NON_SPACE = re.compile(r'\S')
+_section_header_matcher = None
 
+def _header_body(pattern):
+    """Strip a header pattern's line anchors and confine its whitespace to one line"""
+    if pattern.startswith(r'^\s*'):
+        pattern = pattern[len(r'^\s*'):]
+    if pattern.endswith(r'\s*$'):
+        pattern = pattern[:-len(r'\s*$')]
+    return pattern.replace(r'\s', _INLINE_SPACE)
+
+def _compile_section_matcher():
+    """Compile every header pattern into one multi-line alternation"""
+    alternation = '|'.join(f'(?:{_header_body(pattern)})' for pattern in SECTION_PATTERNS)
+    return re.compile(
+        rf'^{_INLINE_SPACE}*(?:{alternation}){_INLINE_SPACE}*$',
+        re.IGNORECASE | re.MULTILINE
+    )
+
+def register_section_pattern(pattern):
+    """
+    Add a section header pattern (e.g. r'supplementary\s+materials')
+    
+    Patterns match a whole line, case-insensitively, with surrounding
+    whitespace ignored. All patterns share one compiled matcher, so adding
+    more does not add a per-pattern pass over the text.
+    """
+    global _section_header_matcher
+    SECTION_PATTERNS.append(pattern)
+    _section_header_matcher = _compile_section_matcher()
+
+def section_header_matcher():
+    """The compiled multi-line matcher for every registered header pattern"""
+    global _section_header_matcher
+    if _section_header_matcher is None:
+        _section_header_matcher = _compile_section_matcher()
+    return _section_header_matcher
+
+@telemetry.traced('detect_sections')
 def detect_sections(text):
-    """Detect scientific paper sections in the text"""
-    lines = text.split('\n')
+    """
+    Detect scientific paper sections in the text
+    
+    Makes a single pass over the text with one compiled matcher. Sections
+    are returned as character spans: text[section['start']:section['end']]
+    is the section body, excluding its header line.
+    """
     sections = []
-    current_section = {'name': 'Header', 'start_line': 0, 'content': ''}
+    current_section = {'name': 'Header', 'start_line': 0, 'start': 0}
+    line_number = 0
+    line_counted_to = 0
     
-    for i, line in enumerate(lines):
-        line_lower = line.lower().strip()
+    for match in section_header_matcher().finditer(text):
+        header_start, header_end = match.span()
+        
+        # Save previous section if it has any non-whitespace content
+        if _NON_SPACE.search(text, current_section['start'], header_start):
+            current_section['end'] = header_start
+            sections.append(current_section)
         
-        # Check if line matches any section pattern
-        is_section_header = False
-        for pattern in SECTION_PATTERNS:
-            if re.match(pattern, line_lower, re.IGNORECASE):
-                # Save previous section
-                if current_section['content'].strip():
-                    sections.append(current_section)
-                
-                # Start new section
-                current_section = {
-                    'name': line.strip().title(),
-                    'start_line': i,
-                    'content': ''
-                }
-                is_section_header = True
-                break
+        line_number += text.count('\n', line_counted_to, header_start)
+        line_counted_to = header_start
         
-        if not is_section_header:
-            current_section['content'] += line + '\n'
+        # Start new section after the header line's newline
+        current_section = {
+            'name': match.group().strip().title(),
+            'start_line': line_number,
+            'start': min(header_end + 1, len(text))
+        }
     
     # Add the last section
-    if current_section['content'].strip():
+    if _NON_SPACE.search(text, current_section['start']):
+        current_section['end'] = len(text)
         sections.append(current_section)
     
     return sections
 
-def chunk_text_with_sections(text, chunk_size=500, chunk_overlap=100):
-    """Chunk text while preserving section information"""
-    sections = detect_sections(text)
-    chunked_data = []
+def section_text(text, section):
+    """Materialize a section's body from its span"""
+    return text[section['start']:section['end']]
+
+def make_chunk_id(section, text, occurrence=0):
+    """
+    Content-derived chunk id, stable across revisions of a paper
     
-    splitter = RecursiveCharacterTextSplitter(
+    Hashes the section name and chunk text; occurrence numbers repeated
+    identical chunks within a section. The id is a positive int64, so it
+    can also serve as a FAISS id.
+    """
+    key = f"{section}\x00{occurrence}\x00{text}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big') & 0x7FFFFFFFFFFFFFFF
+
+def make_splitter(chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """The text splitter applied to each section body"""
+    return SpanSplitter(
         chunk_size=chunk_size, 
         chunk_overlap=chunk_overlap,
         separators=["\n\n", "\n", ". ", " ", ""]
     )
+
+def split_section(text, section, splitter, occurrences):
+    """
+    Split one detected section into chunks
+    
+    Returns (chunk_ids, starts, ends) for the section's non-empty chunks,
+    with starts/ends as character spans of text. The section is split in
+    place by offsets (see src/chunking.py); only each chunk's string is
+    built, to hash it. occurrences counts repeated (section, chunk) pairs
+    across calls, so identical chunks get distinct ids within a document
+    (see make_chunk_id).
+    """
+    chunk_ids = []
+    starts = []
+    ends = []
+    
+    for start, end in splitter.split_spans(text, section['start'], section['end']):
+        chunk = text[start:end]
+        if chunk.strip():  # Only add non-empty chunks
+            occurrence = occurrences.get((section['name'], chunk), 0)
+            occurrences[(section['name'], chunk)] = occurrence + 1
+            chunk_ids.append(make_chunk_id(section['name'], chunk, occurrence))
+            starts.append(start)
+            ends.append(end)
+    return chunk_ids, starts, ends
+
+@telemetry.traced('chunk_text')
+def chunk_text_with_sections(text, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP, page_offsets=None):
+    """
+    Chunk text while preserving section information
+    
+    Returns a ChunkStore whose chunk texts are spans of text. Each chunk's
+    'chunk_id' is a hash of its section and text (see make_chunk_id), so
+    unchanged chunks keep their id in a revised paper. With the
+    page_offsets from extract_text_from_pdf, each chunk also records the
+    page it starts on.
+    """
+    sections = detect_sections(text)
+    chunk_ids = []
+    section_ids = []
+    section_names = {}
+    section_starts = []
+    starts = []
+    ends = []
+    occurrences = {}
+    splitter = make_splitter(chunk_size, chunk_overlap)
     
     for section in sections:
-        section_chunks = splitter.split_text(section['content'])
-        for chunk in section_chunks:
-            if chunk.strip():  # Only add non-empty chunks
-                chunked_data.append({
-                    'text': chunk,
-                    'section': section['name'],
-                    'section_start': section['start_line']
-                })
+        section_chunk_ids, section_chunk_starts, section_chunk_ends = split_section(
+            text, section, splitter, occurrences)
+        if not section_chunk_ids:
+            continue
+        section_id = section_names.setdefault(section['name'], len(section_names))
+        chunk_ids.extend(section_chunk_ids)
+        section_ids.extend([section_id] * len(section_chunk_ids))
+        section_starts.extend([section['start_line']] * len(section_chunk_ids))
+        starts.extend(section_chunk_starts)
+        ends.extend(section_chunk_ends)
     
-    return chunked_data
+    pages = pages_at_offsets(page_offsets, starts) if page_offsets is not None else None
+    telemetry.increment('chunks_created_total', len(chunk_ids))
+    return ChunkStore(text, chunk_ids, section_ids, list(section_names), section_starts, starts, ends, pages)
+
+def set_embedding_service(service):
+    """Route all encode calls through a shared EmbeddingBatcher (None to disable)"""
+    global _embedding_service
+    _embedding_service = service
+
+def encode_texts(texts):
+    """Encode texts, micro-batched with concurrent callers if a service is configured"""
+    if _embedding_service is not None:
+        return _embedding_service.submit(texts).result()
+    return get_encoder().encode(texts)
+
+@telemetry.traced('embed_query')
+def embed_query(query):
+    """Encode a query into a normalized float32 row vector"""
+    query_embedding = np.array(encode_texts([query]), dtype='float32')
+    faiss.normalize_L2(query_embedding)
+    return query_embedding
 
-def embed_chunks(chunked_data):
-    """Create semantic embeddings using sentence-transformers"""
-    texts = [item['text'] for item in chunked_data]
+@telemetry.traced('embed_queries')
+def embed_queries(queries):
+    """Encode many queries in one call into normalized float32 rows"""
+    query_embeddings = np.array(encode_texts(list(queries)), dtype='float32')
+    faiss.normalize_L2(query_embeddings)
+    return query_embeddings
+
+def embed_chunks(chunked_data, storage='flat'):
+    """
+    Create semantic embeddings using sentence-transformers
     
-    # Generate embeddings
-    embeddings = embedding_model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
-    embeddings = embeddings.astype('float32')
+    Returns the index (see build_index for storage modes) and the normalized
+    float32 embeddings. Callers should not keep both alive: the embeddings
+    are returned so they can be written to the on-disk cache.
+    """
+    texts = as_chunk_store(chunked_data).texts()
     
-    # Create FAISS index
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
+    # Generate embeddings
+    with telemetry.span('encode_chunks', chunks=len(texts)):
+        embeddings = encode_texts(texts)
+        embeddings = np.array(embeddings, dtype='float32')
     
     # Normalize embeddings for cosine similarity
     faiss.normalize_L2(embeddings)
-    index.add(embeddings)
+    with telemetry.span('build_index', storage=storage):
+        index = build_index(embeddings, storage=storage)
     
+    telemetry.increment('chunks_indexed_total', len(texts), storage=storage)
     return index, embeddings
 
+def _diff_chunks(previous_chunked_data, chunked_data):
+    """Previous positions of surviving chunks, positions of new chunks, previous positions of removed ones"""
+    previous_ids = as_chunk_store(previous_chunked_data).chunk_ids.tolist()
+    current_ids = as_chunk_store(chunked_data).chunk_ids.tolist()
+    previous_positions = {chunk_id: i for i, chunk_id in enumerate(previous_ids)}
+    kept = {}
+    added = []
+    for i, chunk_id in enumerate(current_ids):
+        if chunk_id in previous_positions:
+            kept[i] = previous_positions[chunk_id]
+        else:
+            added.append(i)
+    current = set(current_ids)
+    removed = [i for i, chunk_id in enumerate(previous_ids) if chunk_id not in current]
+    return kept, added, removed
+
+def _encode_normalized(texts):
+    embeddings = np.array(encode_texts(texts), dtype='float32')
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+def _reindex_report(kept, added, removed):
+    telemetry.increment('chunks_reused_total', len(kept))
+    telemetry.increment('chunks_encoded_total', len(added))
+    return {'reused': len(kept), 'encoded': len(added), 'removed': len(removed)}
+
+@telemetry.traced('reuse_embeddings')
+def reuse_embeddings(chunked_data, previous_chunked_data, previous_embeddings):
+    """
+    Embeddings for a revised paper, reusing an earlier version's vectors
+    
+    Chunks whose chunk_id appears in previous_chunked_data are copied from
+    previous_embeddings (which may be a memory map from the index cache);
+    only new or changed chunks are encoded.
+    
+    Returns:
+        (embeddings, report) where embeddings are normalized float32 rows
+        aligned with chunked_data and report counts 'reused', 'encoded'
+        and 'removed' chunks
+    """
+    kept, added, removed = _diff_chunks(previous_chunked_data, chunked_data)
+    dimension = previous_embeddings.shape[1]
+    embeddings = np.empty((len(chunked_data), dimension), dtype='float32')
+    if kept:
+        new_rows = np.fromiter(kept.keys(), dtype='int64', count=len(kept))
+        old_rows = np.fromiter(kept.values(), dtype='int64', count=len(kept))
+        # Read the previous rows in file order
+        order = np.argsort(old_rows)
+        embeddings[new_rows[order]] = previous_embeddings[old_rows[order]]
+    if added:
+        embeddings[added] = _encode_normalized([chunked_data[i]['text'] for i in added])
+    return embeddings, _reindex_report(kept, added, removed)
+
+@telemetry.traced('update_index')
+def update_index(index, previous_chunked_data, chunked_data, previous_embeddings, storage='flat'):
+    """
+    Index for a revised paper, patched from the previous version's index
+    
+    The previous index may be shared with other sessions or requests, so it
+    is cloned and only the clone is changed. Removed chunks are deleted from
+    it with remove_ids and only new or changed chunks are encoded and
+    appended. Flat and scalar-quantized indexes compact on removal, so index
+    positions stay aligned with the returned chunk list: surviving chunks in
+    their previous order, then new ones. The single-list PQ index cannot be
+    compacted; its clone is emptied and refilled with the aligned vectors,
+    which keeps the trained codebooks instead of retraining them. When the
+    revision crosses a storage fallback of build_index (e.g. 'pq' paying
+    off, or no chunks), the index is built afresh.
+    
+    Args:
+        index: Index whose positions match previous_chunked_data; not modified
+        previous_chunked_data: Chunks of the indexed version
+        chunked_data: Chunks of the revised version
+        previous_embeddings: Normalized vectors of the indexed version (may
+            be a memory map from the index cache)
+        storage: Storage mode the index was built with
+    
+    Returns:
+        (index, chunked_data, embeddings, report). chunked_data is reordered
+        to match the index and embeddings are its aligned normalized rows;
+        report counts 'reused', 'encoded' and 'removed' chunks.
+    """
+    kept, added, removed = _diff_chunks(previous_chunked_data, chunked_data)
+    
+    # Surviving chunks keep their previous relative order, new chunks follow
+    chunked_data = as_chunk_store(chunked_data)
+    survivors = sorted(kept, key=kept.get)
+    reordered = chunked_data.take(survivors + added)
+    dimension = previous_embeddings.shape[1]
+    embeddings = np.empty((len(reordered), dimension), dtype='float32')
+    embeddings[:len(survivors)] = previous_embeddings[np.array([kept[i] for i in survivors], dtype='int64')]
+    if added:
+        embeddings[len(survivors):] = _encode_normalized([chunked_data.text(i) for i in added])
+    
+    same_storage = (effective_storage(len(previous_chunked_data), dimension, storage)
+                    == effective_storage(len(reordered), dimension, storage))
+    if index.ntotal != len(previous_chunked_data) or not same_storage:
+        index = build_index(embeddings, storage=storage)
+    else:
+        index = faiss.clone_index(index)
+        if isinstance(index, faiss.IndexIVF):
+            index.reset()
+            index.add(embeddings)
+        else:
+            if removed:
+                index.remove_ids(np.array(removed, dtype='int64'))
+            if added:
+                index.add(embeddings[len(survivors):])
+    
+    return index, reordered, embeddings, _reindex_report(kept, added, removed)
+
+# Index storage modes and their per-vector cost for 384-d MiniLM embeddings:
+#   flat - exact float32 vectors (1536 bytes)
+#   fp16 - float16 scalar quantization (768 bytes)
+#   int8 - 8-bit scalar quantization (384 bytes)
+#   pq   - product quantization, 8 dimensions per byte (48 bytes)
+STORAGE_MODES = ('flat', 'fp16', 'int8', 'pq')
+
+# PQ codes are 8 bits per subquantizer, so each codebook has 2^8 centroids
+PQ_CENTROIDS = 256
+
+def pq_subquantizers(dimension):
+    """Number of PQ subquantizers: about 8 dimensions each, dividing dimension"""
+    return max(m for m in range(1, dimension // 8 + 1) if dimension % m == 0)
+
+def pq_pays_off(n_vectors, dimension):
+    """
+    Whether a 'pq' index is smaller than an 'int8' one for n_vectors
+    
+    PQ stores float32 codebooks of PQ_CENTROIDS * dimension values (about
+    393 KB at 384-d) on top of its per-vector codes and 8-byte IVF ids, so
+    it only beats int8 once
+    codebook_bytes + n * (subquantizers + 8) < n * dimension: from about
+    1200 chunks for 384-d MiniLM embeddings. Below that, and below the
+    PQ_CENTROIDS training vectors the codebooks need, 'pq' falls back to
+    'int8', which is also the more accurate of the two.
+    """
+    codebook_bytes = PQ_CENTROIDS * dimension * 4
+    pq_bytes = codebook_bytes + n_vectors * (pq_subquantizers(dimension) + 8)
+    return n_vectors >= PQ_CENTROIDS and pq_bytes < n_vectors * dimension
+
+def create_index(dimension, storage='flat'):
+    """
+    Empty FAISS index for a storage mode
+    
+    'flat' and 'fp16' indexes accept vectors right away; 'int8' and 'pq'
+    must be trained first (see build_index).
+    """
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode '{storage}', expected one of {STORAGE_MODES}")
+    
+    if storage == 'flat':
+        index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
+    elif storage == 'fp16':
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    elif storage == 'int8':
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    else:
+        # A single-list IVF-PQ rather than IndexPQ: it accepts ID selectors, so
+        # section filters keep working
+        subquantizers = pq_subquantizers(dimension)
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, 1, subquantizers, 8, faiss.METRIC_INNER_PRODUCT)
+        # Papers are far smaller than faiss' recommended training set; don't warn
+        index.pq.cp.min_points_per_centroid = 1
+    return index
+
+def effective_storage(n_vectors, dimension, storage='flat'):
+    """The storage mode build_index uses for n_vectors when asked for storage"""
+    if not n_vectors:
+        # Nothing to train quantizers on (e.g. a PDF without a text layer)
+        return 'flat'
+    if storage == 'pq' and not pq_pays_off(n_vectors, dimension):
+        return 'int8'
+    return storage
+
+def build_index(embeddings, storage='flat'):
+    """Build a FAISS index over already-normalized embeddings"""
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    storage = effective_storage(len(embeddings), embeddings.shape[1], storage)
+    
+    index = create_index(embeddings.shape[1], storage)
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return index
+
 def apply_rank_based_weighting(distances, k=5):
     """
     Apply rank-based re-weighting to retrieved chunks
@@ -129,43 +459,276 @@ def apply_rank_based_weighting(distances, k=5):
     weights = weights / weights.sum()
     return weights
 
-def get_top_k_chunks(query, chunked_data, index, k=5, section_filter=None):
+@telemetry.traced('build_section_filters')
+def build_section_filters(chunked_data):
     """
-    Retrieve top-k chunks with rank-based weighting and optional section filtering
+    Precompute per-section search filters once at indexing time
+
+    Returns a dict mapping each section name to a (chunk_ids, search_params)
+    pair, where search_params restricts a FAISS search on the main index to
+    that section's vectors via an ID selector.
+    """
+    chunked_data = as_chunk_store(chunked_data)
+    section_filters = {}
+    for section in chunked_data.sections():
+        ids = np.ascontiguousarray(chunked_data.section_positions(section))
+        selector = faiss.IDSelectorBatch(ids)
+        # IVF-typed params are also accepted by the flat and scalar-quantized
+        # indexes, and the single-list PQ index needs them
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=1)
+        params.selector_ref = selector  # keep the selector alive with its params
+        section_filters[section] = (ids, params)
+    return section_filters
+
+@telemetry.traced('rerank_exact')
+def rerank_exact(query_embedding, candidate_ids, rerank_vectors, k):
+    """
+    Re-score candidates with exact inner products and keep the best k
+    
+    rerank_vectors can be a memory-mapped array (e.g. from the index cache),
+    so only the candidate rows are read.
     """
+    # Sorted ids read the rows in order and break score ties by position
+    candidate_ids = np.sort(candidate_ids[candidate_ids >= 0])
+    exact = np.asarray(rerank_vectors[candidate_ids], dtype='float32') @ query_embedding[0]
+    order = np.argsort(-exact, kind='stable')[:k]
+    return exact[order], candidate_ids[order]
+
+def search_chunk_ids_batch(query_embeddings, chunked_data, index, k=5, section_filter=None, section_filters=None,
+                           rerank_vectors=None, rerank_factor=4):
+    """
+    Dense search for query rows sharing one section filter and k
+    
+    All rows go to FAISS in a single search call.
+    
+    Returns:
+        (distances, chunk positions) lists with one array per query, best
+        first, or None if section_filter names a section with no chunks
+    """
+    search_k = k * rerank_factor if rerank_vectors is not None else k
+    
     # Filter by section if specified
     if section_filter and section_filter != "All Sections":
-        filtered_indices = [i for i, item in enumerate(chunked_data) if item['section'] == section_filter]
-        if not filtered_indices:
-            return [], [], []
-        
-        # Create temporary index for filtered chunks
-        filtered_embeddings = np.array([index.reconstruct(i) for i in filtered_indices])
-        temp_index = faiss.IndexFlatIP(filtered_embeddings.shape[1])
-        temp_index.add(filtered_embeddings)
-        
-        query_embedding = embedding_model.encode([query], convert_to_numpy=True).astype('float32')
-        faiss.normalize_L2(query_embedding)
+        if section_filters is None:
+            # Works for every storage mode; callers that search repeatedly
+            # should pass the filters built at indexing time
+            section_filters = build_section_filters(chunked_data)
+        if section_filter not in section_filters:
+            return None
         
-        distances, indices = temp_index.search(query_embedding, min(k, len(filtered_indices)))
+        section_ids, search_params = section_filters[section_filter]
         
-        # Map back to original indices
-        original_indices = [filtered_indices[idx] for idx in indices[0]]
-        retrieved_chunks = [chunked_data[i] for i in original_indices]
+        with telemetry.span('faiss_search', filter='selector', k=search_k, queries=len(query_embeddings)):
+            distances, indices = index.search(query_embeddings, min(search_k, len(section_ids)), params=search_params)
     else:
-        # Search all chunks
-        query_embedding = embedding_model.encode([query], convert_to_numpy=True).astype('float32')
-        faiss.normalize_L2(query_embedding)
+        # Search all chunks; asking for more than the index holds pads with -1
+        with telemetry.span('faiss_search', filter='none', k=search_k, queries=len(query_embeddings)):
+            distances, indices = index.search(query_embeddings, min(search_k, index.ntotal))
+    
+    if rerank_vectors is not None:
+        reranked = [
+            rerank_exact(query_embeddings[row:row + 1], indices[row], rerank_vectors, k)
+            for row in range(len(query_embeddings))
+        ]
+        return [row[0] for row in reranked], [row[1] for row in reranked]
+    return list(distances), list(indices)
+
+def search_chunk_ids(query_embedding, chunked_data, index, k=5, section_filter=None, section_filters=None,
+                     rerank_vectors=None, rerank_factor=4):
+    """
+    Dense search returning (distances, chunk positions), best first
+    
+    Returns None if section_filter names a section with no chunks.
+    """
+    result = search_chunk_ids_batch(
+        query_embedding, chunked_data, index, k=k, section_filter=section_filter,
+        section_filters=section_filters, rerank_vectors=rerank_vectors, rerank_factor=rerank_factor
+    )
+    if result is None:
+        return None
+    distances, indices = result
+    return distances[0], indices[0]
+
+def get_top_k_chunks(query, chunked_data, index, k=5, section_filter=None, section_filters=None,
+                     query_embedding=None, rerank_vectors=None, rerank_factor=4):
+    """
+    Retrieve top-k chunks with rank-based weighting and optional section filtering
+    
+    If section_filters (from build_section_filters) is given, section-restricted
+    queries search the main index directly instead of building a temporary one.
+    Pass query_embedding (from embed_query) to reuse an already computed one.
+    For compressed indexes, pass the full-precision rerank_vectors to fetch
+    k * rerank_factor candidates and rerank them exactly.
+    """
+    telemetry.increment('queries_total', mode='dense')
+    with telemetry.span('retrieve', k=k, section=section_filter or "All Sections"):
+        if query_embedding is None:
+            query_embedding = embed_query(query)
         
-        distances, indices = index.search(query_embedding, k)
-        retrieved_chunks = [chunked_data[i] for i in indices[0]]
+        result = search_chunk_ids(
+            query_embedding, chunked_data, index, k=k, section_filter=section_filter,
+            section_filters=section_filters, rerank_vectors=rerank_vectors, rerank_factor=rerank_factor
+        )
+    if result is None:
+        return [], [], []
+    distances, indices = result
+    retrieved_chunks = [chunked_data[i] for i in indices]
     
     # Apply rank-based weighting
-    weights = apply_rank_based_weighting(distances[0], k=len(retrieved_chunks))
+    weights = apply_rank_based_weighting(distances, k=len(retrieved_chunks))
+    
+    return retrieved_chunks, weights, distances
+
+@telemetry.traced('retrieve_batch')
+def get_top_k_chunks_batch(queries, chunked_data, index, k=5, section_filter=None, section_filters=None,
+                           query_embeddings=None, rerank_vectors=None, rerank_factor=4):
+    """
+    get_top_k_chunks for many queries at once
+    
+    k and section_filter are either shared by all queries or given as one
+    value per query. All queries are encoded in one call (pass
+    query_embeddings from embed_queries to skip that), and each group of
+    queries with the same section filter and k is answered by a single
+    FAISS search. Without precomputed section_filters, filters are built
+    once for the batch when any query needs one.
+    
+    Returns:
+        List of (retrieved_chunks, weights, distances), one per query, as
+        get_top_k_chunks would return them
+    """
+    n_queries = len(queries)
+    ks = list(k) if isinstance(k, (list, tuple, np.ndarray)) else [k] * n_queries
+    filters = list(section_filter) if isinstance(section_filter, (list, tuple)) else [section_filter] * n_queries
+    if len(ks) != n_queries or len(filters) != n_queries:
+        raise ValueError("Per-query k and section_filter lists must match the number of queries")
+    
+    telemetry.increment('queries_total', n_queries, mode='dense')
+    if query_embeddings is None:
+        query_embeddings = embed_queries(queries)
+    
+    groups = {}
+    for row, (query_k, query_filter) in enumerate(zip(ks, filters)):
+        if query_filter == "All Sections":
+            query_filter = None
+        groups.setdefault((query_filter or None, query_k), []).append(row)
+    if section_filters is None and any(query_filter for query_filter, _ in groups):
+        section_filters = build_section_filters(chunked_data)
+    
+    results = [([], [], [])] * n_queries
+    for (query_filter, query_k), rows in groups.items():
+        result = search_chunk_ids_batch(
+            query_embeddings[rows], chunked_data, index, k=query_k, section_filter=query_filter,
+            section_filters=section_filters, rerank_vectors=rerank_vectors, rerank_factor=rerank_factor
+        )
+        if result is None:
+            continue
+        for row, distances, indices in zip(rows, *result):
+            retrieved_chunks = [chunked_data[i] for i in indices]
+            weights = apply_rank_based_weighting(distances, k=len(retrieved_chunks))
+            results[row] = (retrieved_chunks, weights, distances)
+    return results
+
+@telemetry.traced('build_lexical_index')
+def build_lexical_index(chunked_data):
+    """Build a BM25 inverted index aligned with the dense index"""
+    return BM25Index(as_chunk_store(chunked_data).texts())
+
+# Lexical results short-circuit the dense path only for keyword-style
+# queries whose terms all appear in a clearly-best chunk
+LEXICAL_SKIP_MAX_TERMS = 3
+LEXICAL_SKIP_MIN_COVERAGE = 1.0
+LEXICAL_SKIP_MIN_MARGIN = 1.5
+
+# Reciprocal rank fusion constant
+RRF_K = 60
+
+@telemetry.traced('retrieve_hybrid')
+def get_top_k_chunks_hybrid(query, chunked_data, index, lexical_index, k=5, section_filter=None,
+                            section_filters=None, alpha=0.5, query_embedding=None, rerank_vectors=None, stats=None):
+    """
+    Lexical-first cascade retrieval over BM25 and the dense index
+    
+    BM25 runs first. If the query is a short keyword query fully matched by
+    a top chunk that clearly beats the runner-up, the lexical results are
+    returned without encoding the query. Otherwise dense results are fetched
+    and both rankings are combined with reciprocal rank fusion, weighted by
+    alpha (dense) and 1 - alpha (lexical).
+    
+    Returns the same (retrieved_chunks, weights, scores) triple as
+    get_top_k_chunks; scores are BM25 or fused scores. If stats is a dict,
+    it receives 'dense_skipped' and the 'query_embedding' used (None when
+    the query was never encoded), so callers need not encode it again.
+    """
+    start = time.perf_counter()
+    telemetry.increment('queries_total', mode='hybrid')
+    if stats is not None:
+        stats['dense_skipped'] = False
+        stats['query_embedding'] = query_embedding
+    
+    allowed_ids = None
+    if section_filter and section_filter != "All Sections":
+        if section_filters is not None:
+            if section_filter not in section_filters:
+                return [], [], []
+            allowed_ids = section_filters[section_filter][0]
+        else:
+            allowed_ids = as_chunk_store(chunked_data).section_positions(section_filter)
+            if not len(allowed_ids):
+                return [], [], []
+    
+    candidates_k = 2 * k
+    with telemetry.span('lexical_search', k=candidates_k):
+        lexical_scores, lexical_ids, query_terms = lexical_index.search(query, candidates_k, allowed_ids=allowed_ids)
+    lexical_ms = 1000.0 * (time.perf_counter() - start)
+    
+    confident = (
+        0 < len(set(query_terms)) <= LEXICAL_SKIP_MAX_TERMS
+        and len(lexical_ids) > 0
+        and lexical_index.coverage(query_terms, lexical_ids[0]) >= LEXICAL_SKIP_MIN_COVERAGE
+        and (len(lexical_scores) < 2 or lexical_scores[0] >= LEXICAL_SKIP_MIN_MARGIN * lexical_scores[1])
+    )
+    
+    dense_ms = None
+    if confident:
+        telemetry.increment('dense_search_skipped_total')
+        ids, scores = lexical_ids[:k], lexical_scores[:k]
+    else:
+        dense_start = time.perf_counter()
+        if query_embedding is None:
+            query_embedding = embed_query(query)
+        _, dense_ids = search_chunk_ids(
+            query_embedding, chunked_data, index, k=candidates_k, section_filter=section_filter,
+            section_filters=section_filters, rerank_vectors=rerank_vectors
+        )
+        dense_ms = 1000.0 * (time.perf_counter() - dense_start)
+        
+        fused = {}
+        for rank, i in enumerate(dense_ids):
+            if i >= 0:
+                fused[int(i)] = fused.get(int(i), 0.0) + alpha / (RRF_K + rank + 1)
+        for rank, i in enumerate(lexical_ids):
+            fused[int(i)] = fused.get(int(i), 0.0) + (1.0 - alpha) / (RRF_K + rank + 1)
+        
+        ranked = sorted(fused.items(), key=lambda pair: (-pair[1], pair[0]))[:k]
+        ids = np.array([i for i, _ in ranked], dtype='int64')
+        scores = np.array([score for _, score in ranked], dtype='float32')
+    
+    retrieved_chunks = [chunked_data[i] for i in ids]
+    weights = apply_rank_based_weighting(scores, k=len(retrieved_chunks))
     
-    return retrieved_chunks, weights, distances[0]
+    hybrid_stats.record(
+        lexical_ms, dense_ms, 1000.0 * (time.perf_counter() - start),
+        lexical_hit=len(lexical_ids) > 0, dense_skipped=confident
+    )
+    if stats is not None:
+        stats['dense_skipped'] = confident
+        stats['query_embedding'] = query_embedding
+    return retrieved_chunks, weights, scores
 
 def get_available_sections(chunked_data):
     """Get list of unique sections in the document"""
-    sections = list(set([item['section'] for item in chunked_data]))
-    return sorted(sections)
+    return as_chunk_store(chunked_data).sections()
+
+def get_section_counts(chunked_data):
+    """Number of chunks per section, ordered by section name"""
+    return as_chunk_store(chunked_data).section_counts()
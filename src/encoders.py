@@ -0,0 +1,143 @@
+import os
+import platform
+import threading
+import numpy as np
+
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+DEFAULT_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "torch")
+
+
+class Encoder:
+    """
+    Pluggable text encoder interface
+
+    Implementations map a list of texts to a float32 array of shape
+    (len(texts), dimension). Vectors are not normalized; callers do that.
+    """
+
+    backend = None
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME):
+        self.model_name = model_name
+
+    @property
+    def encoder_id(self):
+        """Identifies the model and backend, for cache keys"""
+        return encoder_id(self.backend, self.model_name)
+
+    @property
+    def dimension(self):
+        """Size of the embedding vectors"""
+        return self.encode(['']).shape[1]
+
+    def encode(self, texts, batch_size=32):
+        raise NotImplementedError
+
+
+class SentenceTransformerEncoder(Encoder):
+    """Full-precision sentence-transformers model on PyTorch"""
+
+    backend = 'torch'
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, device=None):
+        super().__init__(model_name)
+        # Imported here so that merely importing src modules does not pull in torch
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device=device)
+
+    @property
+    def dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=32):
+        embeddings = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        return np.asarray(embeddings, dtype='float32')
+
+
+class TorchInt8Encoder(SentenceTransformerEncoder):
+    """Same model with its Linear layers dynamically quantized to int8 for CPU inference"""
+
+    backend = 'torch-int8'
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME):
+        # Dynamic quantization only runs on CPU
+        super().__init__(model_name, device='cpu')
+        import torch
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxInt8Encoder(SentenceTransformerEncoder):
+    """
+    Pre-quantized int8 ONNX export of the model, run with ONNX Runtime
+
+    Requires sentence-transformers[onnx] (sentence-transformers>=3.2 and onnxruntime).
+    """
+
+    backend = 'onnx-int8'
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, file_name=None):
+        Encoder.__init__(self, model_name)
+        from sentence_transformers import SentenceTransformer
+        if file_name is None:
+            # Quantized exports shipped in the model repository
+            arm = platform.machine().lower() in ('arm64', 'aarch64')
+            file_name = 'onnx/model_qint8_arm64.onnx' if arm else 'onnx/model_quint8_avx2.onnx'
+        self.model = SentenceTransformer(
+            model_name, device='cpu', backend='onnx', model_kwargs={'file_name': file_name}
+        )
+
+
+ENCODER_BACKENDS = {
+    'torch': SentenceTransformerEncoder,
+    'torch-int8': TorchInt8Encoder,
+    'onnx-int8': OnnxInt8Encoder,
+}
+
+
+def encoder_id(backend, model_name=DEFAULT_MODEL_NAME):
+    """Model identifier; full-precision torch keeps the bare model name"""
+    return model_name if backend == 'torch' else f"{model_name}:{backend}"
+
+
+def create_encoder(backend=DEFAULT_BACKEND, model_name=DEFAULT_MODEL_NAME):
+    """Instantiate an encoder by backend name"""
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {sorted(ENCODER_BACKENDS)}")
+    return ENCODER_BACKENDS[backend](model_name)
+
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder():
+    """Process-wide encoder, created on first use from RAG_EMBEDDING_BACKEND"""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = create_encoder()
+    return _encoder
+
+
+def set_encoder(encoder):
+    """Replace the process-wide encoder (e.g. with a quantized backend)"""
+    global _encoder
+    with _encoder_lock:
+        _encoder = encoder
+
+
+def current_encoder_config():
+    """(backend, model_name) of the active (or configured) encoder, without loading it"""
+    encoder = _encoder
+    if encoder is not None:
+        return encoder.backend, encoder.model_name
+    return DEFAULT_BACKEND, DEFAULT_MODEL_NAME
+
+
+def current_encoder_id():
+    """Identifier of the active (or configured) encoder, without loading it"""
+    encoder = _encoder
+    if encoder is not None:
+        return encoder.encoder_id
+    return encoder_id(DEFAULT_BACKEND)
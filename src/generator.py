@@ -1,40 +1,42 @@
-import openai
-import os
+import time
 
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from src.telemetry import telemetry
+from src.context_builder import build_context, DEFAULT_TOKEN_BUDGET
+from src.llm_backends import get_llm_backend, DEFAULT_LLM_MODEL
 
-def generate_response(retrieved_chunks, weights, query, show_sources=True):
+MODEL = DEFAULT_LLM_MODEL  # Using GPT-4 for better scientific reasoning
+SYSTEM_PROMPT = "You are an expert research assistant helping analyze scientific papers with high factual accuracy."
+TEMPERATURE = 0.2  # Lower temperature for more factual responses
+MAX_TOKENS = 800
+
+def get_section_info(retrieved_chunks, weights):
+    """Section, relevance weight and rank of each chunk, for source attribution"""
+    return [
+        {'section': chunk['section'], 'relevance': weight, 'rank': i + 1}
+        for i, (chunk, weight) in enumerate(zip(retrieved_chunks, weights))
+    ]
+
+def build_messages(retrieved_chunks, weights, query, token_budget=DEFAULT_TOKEN_BUDGET, context_report=None):
     """
-    Generate response using rank-weighted chunks from scientific paper sections
+    Build the chat messages for a query from rank-weighted chunks
     
-    Args:
-        retrieved_chunks: List of dicts with 'text', 'section', 'section_start'
-        weights: Array of weights for each chunk (based on relevance rank)
-        query: User's question
-        show_sources: Whether to include source sections in response
-    """
+    The context is assembled by build_context: overlapping chunks are merged
+    and the result is fitted to token_budget. If a context_report dict is
+    passed it is filled with the token counts from build_context.
     
-    # Build weighted context with section information
-    context_parts = []
-    section_info = []
+    Returns:
+        (messages, section_info) where section_info lists each chunk's
+        section, relevance weight and rank for source attribution
+    """
+    # Build weighted context with section information; higher weight = more
+    # important, so the best-ranked blocks come first and are emphasized
+    context, report = build_context(retrieved_chunks, weights, token_budget=token_budget)
+    telemetry.increment('context_tokens_total', report['tokens'])
+    telemetry.increment('context_tokens_saved_total', report['tokens_saved'])
+    if context_report is not None:
+        context_report.update(report)
     
-    for i, (chunk, weight) in enumerate(zip(retrieved_chunks, weights)):
-        # Higher weight = more important, so we emphasize it
-        importance = "PRIMARY" if i == 0 else "SECONDARY" if i < 3 else "SUPPORTING"
-        
-        context_parts.append(
-            f"[{importance} CONTEXT - Relevance: {weight:.2%}]\n"
-            f"Section: {chunk['section']}\n"
-            f"Content: {chunk['text']}\n"
-        )
-        
-        section_info.append({
-            'section': chunk['section'],
-            'relevance': weight,
-            'rank': i + 1
-        })
-
-    context = "\n".join(context_parts)
+    section_info = get_section_info(retrieved_chunks, weights)
 
     prompt = f"""
 You are an expert research assistant analyzing a scientific paper. Use ONLY the provided context to answer the question.
@@ -56,26 +58,92 @@ QUESTION:
 Provide a clear, well-structured answer with proper citations to paper sections.
 """
 
-    response = openai.chat.completions.create(
-        model="gpt-4o-mini",  # Using GPT-4 for better scientific reasoning
-        messages=[
-            {"role": "system", "content": "You are an expert research assistant helping analyze scientific papers with high factual accuracy."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.2,  # Lower temperature for more factual responses
-        max_tokens=800
-    )
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+    return messages, section_info
+
+def format_sources(section_info):
+    """Format the "Sources Used" block for the top 3 distinct sections"""
+    sources = "\n\n---\n**Sources Used:**\n"
+    seen_sections = set()
+    for info in section_info[:3]:  # Show top 3 sources
+        if info['section'] not in seen_sections:
+            sources += f"- {info['section']} (Relevance: {info['relevance']:.1%})\n"
+            seen_sections.add(info['section'])
+    return sources
 
-    answer = response.choices[0].message.content
+def generate_response(retrieved_chunks, weights, query, show_sources=True):
+    """
+    Generate response using rank-weighted chunks from scientific paper sections
+    
+    Args:
+        retrieved_chunks: List of dicts with 'text', 'section', 'section_start'
+        weights: Array of weights for each chunk (based on relevance rank)
+        query: User's question
+        show_sources: Whether to include source sections in response
+    """
+    messages, section_info = build_messages(retrieved_chunks, weights, query)
+
+    telemetry.increment('llm_requests_total', model=MODEL, stream='false')
+    with telemetry.span('llm_completion', model=MODEL, stream=False):
+        answer = get_llm_backend().complete(messages, temperature=TEMPERATURE, max_tokens=MAX_TOKENS)
     
     # Optionally append source information
     if show_sources:
-        sources = "\n\n---\n**Sources Used:**\n"
-        seen_sections = set()
-        for info in section_info[:3]:  # Show top 3 sources
-            if info['section'] not in seen_sections:
-                sources += f"- {info['section']} (Relevance: {info['relevance']:.1%})\n"
-                seen_sections.add(info['section'])
-        answer += sources
+        answer += format_sources(section_info)
     
     return answer
+
+def generate_response_stream(retrieved_chunks, weights, query, show_sources=True, stats=None):
+    """
+    Streaming variant of generate_response that yields text as it arrives
+    
+    The "Sources Used" block is yielded last. If a stats dict is passed it is
+    filled with 'time_to_first_token' and 'total_time' (seconds),
+    'chunks_received', 'context' (the build_context token report) and
+    'llm' (the backend's request details, e.g. whether it was hedged).
+    """
+    context_report = {}
+    llm_report = {}
+    messages, section_info = build_messages(retrieved_chunks, weights, query, context_report=context_report)
+    if stats is not None:
+        stats['context'] = context_report
+        stats['llm'] = llm_report
+    
+    telemetry.increment('llm_requests_total', model=MODEL, stream='true')
+    # Detached: the span stays open across yields to the consumer
+    span = telemetry.span('llm_completion', attach=False, model=MODEL, stream=True)
+    span.__enter__()
+    
+    start = time.perf_counter()
+    chunks_received = 0
+    time_to_first_token = None
+    error = None
+    try:
+        stream = get_llm_backend().stream(messages, stats=llm_report, temperature=TEMPERATURE, max_tokens=MAX_TOKENS)
+        for token in stream:
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start
+            chunks_received += 1
+            yield token
+        
+        if show_sources:
+            yield format_sources(section_info)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if time_to_first_token is not None:
+            telemetry.observe('llm_time_to_first_token_seconds', time_to_first_token, model=MODEL)
+            span.set_attribute('time_to_first_token', time_to_first_token)
+        span.set_attribute('chunks_received', chunks_received)
+        if llm_report.get('hedged'):
+            span.set_attribute('hedged', True)
+        span.__exit__(type(error) if error is not None else None, error, None)
+        # Also recorded when the consumer stops early
+        if stats is not None:
+            stats['time_to_first_token'] = time_to_first_token
+            stats['total_time'] = time.perf_counter() - start
+            stats['chunks_received'] = chunks_received
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+import zipfile
+import numpy as np
+from src.chunk_store import ChunkStore, as_chunk_store
+
+# Bump when the on-disk layout or the chunk dict format changes
+CACHE_FORMAT_VERSION = 7
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "RAG_INDEX_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "rag_chatbot", "index")
+)
+DEFAULT_MAX_CACHE_BYTES = int(os.getenv("RAG_INDEX_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+CHUNKS_FILE = "chunks.npz"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+
+def compute_document_hash(data):
+    """Content hash of the raw PDF bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_cache_key(document_hash, chunk_size, chunk_overlap, model_name):
+    """
+    Build the cache key for a processed document
+
+    Any change to the chunking parameters or the embedding model produces
+    a different key, so stale entries are never served.
+    """
+    params = json.dumps({
+        'document': document_hash,
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'model': model_name,
+        'version': CACHE_FORMAT_VERSION
+    }, sort_keys=True)
+    return hashlib.sha256(params.encode('utf-8')).hexdigest()
+
+
+class IndexCache:
+    """
+    Content-addressed on-disk cache of chunk stores and normalized embeddings
+
+    Each entry is a directory holding the ChunkStore columns and the float32
+    embeddings as a .npy file, which is memory-mapped on load. Entries are
+    evicted least-recently-used first once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """
+        Load a cached entry
+
+        Returns:
+            (chunked_data, embeddings) on a hit, where chunked_data is a
+            ChunkStore and embeddings is a read-only memory map, or None on
+            a miss
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            chunked_data = ChunkStore.load(os.path.join(entry_dir, CHUNKS_FILE))
+            embeddings = np.load(os.path.join(entry_dir, EMBEDDINGS_FILE), mmap_mode='r')
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+        if embeddings.shape[0] != len(chunked_data):
+            # Partially written or corrupted entry
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+        return chunked_data, embeddings
+
+    def save(self, key, chunked_data, embeddings):
+        """Store an entry atomically, then evict old entries if over budget"""
+        entry_dir = self._entry_dir(key)
+        if os.path.isdir(entry_dir):
+            return
+
+        # Write into a private directory and rename it into place so that
+        # concurrent readers never see a half-written entry
+        tmp_dir = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            with open(os.path.join(tmp_dir, CHUNKS_FILE), 'wb') as f:
+                as_chunk_store(chunked_data).save(f)
+            np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), np.ascontiguousarray(embeddings, dtype='float32'))
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.evict(keep=key)
+
+    def _entries(self):
+        """List (last_used, size_bytes, path) for every complete entry"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(path, fname))
+                    for fname in os.listdir(path)
+                )
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue
+        return entries
+
+    def size_bytes(self):
+        """Total size of all cached entries"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep=None):
+        """Remove least-recently-used entries until the cache fits max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        keep_dir = self._entry_dir(keep) if keep else None
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep_dir:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
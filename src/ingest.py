@@ -0,0 +1,87 @@
+from src.embedding_utils import (
+    extract_text_from_pdf,
+    chunk_text_with_sections,
+    embed_chunks,
+    build_index,
+    build_section_filters,
+    build_lexical_index,
+    reuse_embeddings,
+    update_index,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP
+)
+from src.bulk_embedding import embed_chunks_bulk
+from src.index_cache import compute_document_hash, make_cache_key
+from src.pdf_extraction import read_pdf_bytes
+from src.encoders import current_encoder_id
+from src.telemetry import telemetry
+
+
+def make_document(document_hash, chunked_data, index, embeddings, cache_hit=False, reindex=None):
+    """The document dict ingest_pdf returns, with search filters and the BM25 index built over chunked_data"""
+    return {
+        'document_hash': document_hash,
+        'chunked_data': chunked_data,
+        'index': index,
+        'embeddings': embeddings,
+        'section_filters': build_section_filters(chunked_data),
+        'lexical_index': build_lexical_index(chunked_data),
+        'cache_hit': cache_hit,
+        'reindex': reindex
+    }
+
+
+@telemetry.traced('ingest')
+def ingest_pdf(source, index_cache=None, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP, storage='flat',
+               previous_document_hash=None, previous_index=None, bulk_encoder=None):
+    """
+    Extract, chunk and index a PDF, reusing the on-disk cache when available
+
+    Args:
+        source: PDF bytes, a file path or a file-like object
+        index_cache: Optional IndexCache to read from and populate
+        storage: Index storage mode (see build_index)
+        previous_document_hash: Hash of an earlier version of the paper; on a
+            cache miss its cached embeddings are reused for unchanged chunks
+        previous_index: Optional loaded index of that earlier version; it is
+            then updated on a copy (see update_index) instead of rebuilt
+        bulk_encoder: Optional BulkEncoder to embed new chunks on a process pool
+
+    Returns:
+        Dict with 'document_hash', 'chunked_data', 'index', 'embeddings',
+        'section_filters', 'lexical_index', 'cache_hit' and 'reindex' (the
+        reuse_embeddings/update_index report, or None if nothing was reused)
+    """
+    pdf_bytes = read_pdf_bytes(source)
+    document_hash = compute_document_hash(pdf_bytes)
+    cache_key = make_cache_key(document_hash, chunk_size, chunk_overlap, current_encoder_id())
+
+    cached = index_cache.load(cache_key) if index_cache is not None else None
+    reindex = None
+    if index_cache is not None:
+        telemetry.increment('index_cache_lookups_total', result='hit' if cached is not None else 'miss')
+    if cached is not None:
+        chunked_data, embeddings = cached
+        index = build_index(embeddings, storage=storage)
+    else:
+        text, page_offsets = extract_text_from_pdf(pdf_bytes)
+        chunked_data = chunk_text_with_sections(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                                page_offsets=page_offsets)
+        previous = None
+        if index_cache is not None and previous_document_hash is not None:
+            previous = index_cache.load(
+                make_cache_key(previous_document_hash, chunk_size, chunk_overlap, current_encoder_id()))
+        if previous is not None and previous_index is not None:
+            index, chunked_data, embeddings, reindex = update_index(
+                previous_index, previous[0], chunked_data, previous[1], storage=storage)
+        elif previous is not None:
+            embeddings, reindex = reuse_embeddings(chunked_data, *previous)
+            index = build_index(embeddings, storage=storage)
+        elif bulk_encoder is not None:
+            index, embeddings = embed_chunks_bulk(chunked_data, bulk_encoder, storage=storage)
+        else:
+            index, embeddings = embed_chunks(chunked_data, storage=storage)
+        if index_cache is not None:
+            index_cache.save(cache_key, chunked_data, embeddings)
+
+    return make_document(document_hash, chunked_data, index, embeddings, cache_hit=cached is not None, reindex=reindex)
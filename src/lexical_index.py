@@ -0,0 +1,156 @@
+import re
+import threading
+from collections import Counter, deque
+import numpy as np
+
+# Keeps identifiers such as "ResNet-50", "BRCA1", "F1" and "v2.1" whole
+TOKEN_PATTERN = re.compile(r"[a-z0-9](?:[a-z0-9\-_.]*[a-z0-9])?")
+
+STOPWORDS = frozenset("""
+a an and are as at be by did do does for from had has have how in is it its of on or
+that the their this to was were what when where which who why with used use using
+""".split())
+
+# Rough per-term cost of the dicts, tuple, term string and array headers
+POSTING_OVERHEAD_BYTES = 400
+
+
+def tokenize(text):
+    """Lowercase terms of a text, without stopwords"""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over chunk texts
+
+    Each posting stores its precomputed BM25 weight, so a query is scored by
+    summing the posting weights of its terms.
+
+    Args:
+        texts: Chunk texts, in the same order as the dense index
+        k1: Term-frequency saturation
+        b: Length normalization
+    """
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(texts)
+
+        term_counts = [Counter(tokenize(text)) for text in texts]
+        doc_lengths = np.array([sum(counts.values()) for counts in term_counts], dtype='float32')
+        avg_length = float(doc_lengths.mean()) if self.n_docs and doc_lengths.sum() else 1.0
+
+        postings = {}
+        for doc_id, counts in enumerate(term_counts):
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+
+        self.idf = {}
+        self.postings = {}
+        for term, (doc_ids, tfs) in postings.items():
+            doc_ids = np.array(doc_ids, dtype='int64')
+            tfs = np.array(tfs, dtype='float32')
+            df = len(doc_ids)
+            idf = float(np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5)))
+            norm = k1 * (1.0 - b + b * doc_lengths[doc_ids] / avg_length)
+            self.idf[term] = idf
+            self.postings[term] = (doc_ids, (idf * tfs * (k1 + 1.0) / (tfs + norm)).astype('float32'))
+
+    def score(self, query_terms):
+        """Dense array of BM25 scores for every document"""
+        scores = np.zeros(self.n_docs, dtype='float32')
+        for term in set(query_terms):
+            if term in self.postings:
+                doc_ids, weights = self.postings[term]
+                scores[doc_ids] += weights
+        return scores
+
+    def search(self, query, k=5, allowed_ids=None):
+        """
+        Top-k documents by BM25 score
+
+        Args:
+            query: Query string
+            k: Number of results
+            allowed_ids: Optional array of document ids to restrict the search to
+
+        Returns:
+            (scores, ids, query_terms), best first; documents with a zero
+            score are never returned
+        """
+        query_terms = tokenize(query)
+        scores = self.score(query_terms)
+        if allowed_ids is not None:
+            mask = np.zeros(self.n_docs, dtype=bool)
+            mask[allowed_ids] = True
+            scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        order = np.lexsort((candidates, -scores[candidates]))
+        ids = candidates[order]
+        return scores[ids], ids, query_terms
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the postings, including per-term overhead"""
+        arrays = sum(doc_ids.nbytes + weights.nbytes for doc_ids, weights in self.postings.values())
+        return arrays + POSTING_OVERHEAD_BYTES * len(self.postings)
+
+    def coverage(self, query_terms, doc_id):
+        """Fraction of the query's IDF mass that appears in a document"""
+        total = sum(self.idf.get(term, 0.0) for term in set(query_terms))
+        if total == 0:
+            return 0.0
+        matched = sum(
+            self.idf[term] for term in set(query_terms)
+            if term in self.postings and doc_id in self.postings[term][0]
+        )
+        return matched / total
+
+
+class HybridRetrievalStats:
+    """Thread-safe counters and latencies for hybrid retrieval"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.lexical_hits = 0
+        self.dense_skipped = 0
+        self._lexical_ms = deque(maxlen=window)
+        self._dense_ms = deque(maxlen=window)
+        self._total_ms = deque(maxlen=window)
+
+    def record(self, lexical_ms, dense_ms, total_ms, lexical_hit, dense_skipped):
+        with self._lock:
+            self.queries += 1
+            self.lexical_hits += int(lexical_hit)
+            self.dense_skipped += int(dense_skipped)
+            self._lexical_ms.append(lexical_ms)
+            if dense_ms is not None:
+                self._dense_ms.append(dense_ms)
+            self._total_ms.append(total_ms)
+
+    def snapshot(self):
+        """Hit rates and mean/p95 per-query latency in milliseconds"""
+        def summarize(values):
+            if not values:
+                return {'mean': 0.0, 'p95': 0.0}
+            values = np.array(values)
+            return {'mean': float(values.mean()), 'p95': float(np.percentile(values, 95))}
+
+        with self._lock:
+            queries = self.queries
+            return {
+                'queries': queries,
+                'lexical_hit_rate': self.lexical_hits / queries if queries else 0.0,
+                'dense_skip_rate': self.dense_skipped / queries if queries else 0.0,
+                'lexical_ms': summarize(self._lexical_ms),
+                'dense_ms': summarize(self._dense_ms),
+                'total_ms': summarize(self._total_ms),
+            }
@@ -0,0 +1,384 @@
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+import numpy as np
+import openai
+
+from src.telemetry import telemetry
+
+DEFAULT_LLM_MODEL = "gpt-4o-mini"
+
+# Seconds a generation request may take in total, retries and hedges included
+DEFAULT_DEADLINE = float(os.getenv("RAG_LLM_DEADLINE", "60"))
+
+# Seconds without any answer text before a duplicate request is sent;
+# unset disables hedging
+DEFAULT_HEDGE_DELAY = float(os.getenv("RAG_LLM_HEDGE_DELAY")) if os.getenv("RAG_LLM_HEDGE_DELAY") else None
+
+# Retries per request for rate limits and transient errors
+DEFAULT_MAX_RETRIES = int(os.getenv("RAG_LLM_MAX_RETRIES", "2"))
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and 5xx
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def retry_delay(error, attempt, base_delay=0.5, max_delay=30.0):
+    """
+    Seconds to wait before retrying a failed call
+
+    Honours the server's Retry-After header when present, otherwise uses
+    exponential backoff with full jitter.
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        retry_after = response.headers.get('retry-after')
+        if retry_after:
+            try:
+                return min(float(retry_after), max_delay)
+            except ValueError:
+                pass
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """A generation request ran past its deadline"""
+
+
+class LLMBackend:
+    """
+    Pluggable chat completion interface
+
+    complete() returns the answer text and stream() yields it in pieces as
+    they arrive. timeout bounds the call in seconds, params are generation
+    parameters such as temperature and max_tokens, and a stats dict, if
+    passed, receives per-request details from backends that record any.
+    """
+
+    name = None
+
+    def complete(self, messages, timeout=None, stats=None, **params):
+        raise NotImplementedError
+
+    def stream(self, messages, timeout=None, stats=None, **params):
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    OpenAI-compatible chat completions endpoint
+
+    base_url and api_key default to OPENAI_BASE_URL and OPENAI_API_KEY. The
+    client's own retries are disabled; ResilientBackend retries under the
+    request deadline instead.
+    """
+
+    def __init__(self, model=DEFAULT_LLM_MODEL, base_url=None, api_key=None, name=None):
+        self.model = model
+        self.name = name or base_url or 'openai'
+        self.client = openai.OpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+
+    def _record_usage(self, usage):
+        """Count prompt and completion tokens reported by the API"""
+        if usage is not None:
+            telemetry.increment('llm_tokens_sent_total', usage.prompt_tokens, model=self.model)
+            telemetry.increment('llm_tokens_received_total', usage.completion_tokens, model=self.model)
+
+    def complete(self, messages, timeout=None, stats=None, **params):
+        response = self.client.chat.completions.create(
+            model=self.model, messages=messages, timeout=timeout, **params)
+        self._record_usage(response.usage)
+        return response.choices[0].message.content or ''
+
+    def stream(self, messages, timeout=None, stats=None, **params):
+        # Token usage arrives in a final choice-less event when requested
+        extra = {'stream_options': {'include_usage': True}} if telemetry.enabled else {}
+        events = self.client.chat.completions.create(
+            model=self.model, messages=messages, stream=True, timeout=timeout, **extra, **params)
+        try:
+            for event in events:
+                if getattr(event, 'usage', None) is not None:
+                    self._record_usage(event.usage)
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+        finally:
+            events.close()
+
+
+class LLMRequestStats:
+    """Thread-safe counters and latencies for ResilientBackend requests"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.deadline_exceeded = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        self.wasted_calls = 0
+        self._first_text_ms = deque(maxlen=window)
+        self._total_ms = deque(maxlen=window)
+
+    def record(self, request):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(request['outcome'] == 'error')
+            self.deadline_exceeded += int(request['outcome'] == 'deadline_exceeded')
+            self.hedged += int(request['hedged'])
+            self.hedge_wins += int(request['hedge_won'])
+            self.retries += request['retries']
+            self.wasted_calls += request['wasted_calls']
+            if request['time_to_first_text'] is not None:
+                self._first_text_ms.append(request['time_to_first_text'] * 1000)
+            self._total_ms.append(request['total_time'] * 1000)
+
+    def snapshot(self):
+        """Request, hedge, retry and wasted-call counts and p50/p95/p99 latency in milliseconds"""
+        def summarize(values):
+            if not values:
+                return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+            p50, p95, p99 = np.percentile(np.array(values), [50, 95, 99])
+            return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+        with self._lock:
+            requests = self.requests
+            return {
+                'requests': requests,
+                'errors': self.errors,
+                'deadline_exceeded': self.deadline_exceeded,
+                'hedged': self.hedged,
+                'hedge_rate': self.hedged / requests if requests else 0.0,
+                'hedge_wins': self.hedge_wins,
+                'retries': self.retries,
+                'wasted_calls': self.wasted_calls,
+                'first_text_ms': summarize(self._first_text_ms),
+                'total_ms': summarize(self._total_ms),
+            }
+
+
+class _Attempt:
+    """One call to a backend on a daemon thread, reporting (number, kind, value) events to a shared queue"""
+
+    def __init__(self, number, backend, events, hedge=False):
+        self.number = number
+        self.backend = backend
+        self.hedge = hedge
+        self.failed = False
+        self._events = events
+        self._cancelled = threading.Event()
+
+    def start(self, messages, streaming, timeout, params):
+        threading.Thread(
+            target=self._run, args=(messages, streaming, timeout, params),
+            name=f'llm-attempt-{self.number}', daemon=True
+        ).start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _run(self, messages, streaming, timeout, params):
+        try:
+            if streaming:
+                pieces = self.backend.stream(messages, timeout=timeout, **params)
+                try:
+                    for piece in pieces:
+                        if self._cancelled.is_set():
+                            return
+                        self._events.put((self.number, 'text', piece))
+                finally:
+                    pieces.close()
+            else:
+                text = self.backend.complete(messages, timeout=timeout, **params)
+                self._events.put((self.number, 'text', text))
+            self._events.put((self.number, 'done', None))
+        except Exception as e:
+            self._events.put((self.number, 'error', e))
+
+
+class ResilientBackend(LLMBackend):
+    """
+    Deadlines, jittered retries and hedged requests around other backends
+
+    Every request has a deadline covering all of its attempts, past which
+    LLMDeadlineExceeded is raised. An attempt that fails with a retryable
+    error before producing any text is retried after retry_delay() while
+    the deadline allows. With hedge_delay set, a request that has produced
+    no text after hedge_delay seconds gets a duplicate sent to the hedge
+    backend (the primary by default); the attempt that produces text first
+    is used, and the other is cancelled and counted as a wasted call. A
+    stream that fails after its first text is not retried, as that text
+    has already been passed on.
+
+    Attempts run on daemon threads, so a hung call never holds the caller
+    past the deadline; it is given the remaining time as its own timeout.
+    Each request's hedging decision, retries, wasted calls and latencies go
+    to stats, to telemetry and to the caller's stats dict.
+
+    Args:
+        primary: Backend every request is sent to first
+        hedge: Backend for hedged duplicates (default: primary)
+        deadline: Seconds per request (see RAG_LLM_DEADLINE)
+        hedge_delay: Seconds before hedging, or None to never hedge
+            (see RAG_LLM_HEDGE_DELAY)
+        max_retries, base_delay, max_delay: Retry policy (see retry_delay)
+    """
+
+    def __init__(self, primary, hedge=None, deadline=DEFAULT_DEADLINE, hedge_delay=DEFAULT_HEDGE_DELAY,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=0.5, max_delay=30.0):
+        self.primary = primary
+        self.hedge = hedge or primary
+        self.name = primary.name
+        self.deadline = deadline
+        self.hedge_delay = hedge_delay
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = LLMRequestStats()
+
+    def complete(self, messages, timeout=None, stats=None, **params):
+        return ''.join(self._run(messages, False, timeout, stats, params))
+
+    def stream(self, messages, timeout=None, stats=None, **params):
+        return self._run(messages, True, timeout, stats, params)
+
+    def _run(self, messages, streaming, timeout, stats, params):
+        start = time.perf_counter()
+        deadline_at = start + (timeout if timeout is not None else self.deadline)
+        hedge_at = start + self.hedge_delay if self.hedge_delay is not None else None
+        events = queue.Queue()
+        attempts = []
+        request = {'hedged': False, 'hedge_won': False, 'retries': 0, 'wasted_calls': 0,
+                   'time_to_first_text': None, 'backend': None, 'outcome': 'error'}
+
+        def launch(backend, hedge=False):
+            attempt = _Attempt(len(attempts), backend, events, hedge=hedge)
+            attempts.append(attempt)
+            attempt.start(messages, streaming, deadline_at - time.perf_counter(), params)
+
+        def next_event(until):
+            try:
+                return events.get(timeout=max(until - time.perf_counter(), 0))
+            except queue.Empty:
+                return None
+
+        launch(self.primary)
+        try:
+            while True:
+                event = next_event(deadline_at if hedge_at is None else min(hedge_at, deadline_at))
+                if event is None:
+                    if time.perf_counter() >= deadline_at:
+                        raise LLMDeadlineExceeded(f"No answer within {deadline_at - start:.1f}s")
+                    # Nothing yet after hedge_delay: race a duplicate
+                    hedge_at = None
+                    request['hedged'] = True
+                    launch(self.hedge, hedge=True)
+                    continue
+
+                number, kind, value = event
+                attempt = attempts[number]
+                if kind != 'error':
+                    winner = attempt
+                    break
+                attempt.failed = True
+                if any(not other.failed for other in attempts):
+                    # The other attempt may still answer
+                    continue
+                if not isinstance(value, RETRYABLE_ERRORS) or request['retries'] >= self.max_retries:
+                    raise value
+                delay = retry_delay(value, request['retries'], self.base_delay, self.max_delay)
+                if time.perf_counter() + delay >= deadline_at:
+                    raise value
+                time.sleep(delay)
+                request['retries'] += 1
+                launch(attempt.backend, hedge=attempt.hedge)
+
+            request['time_to_first_text'] = time.perf_counter() - start
+            request['backend'] = winner.backend.name
+            request['hedge_won'] = winner.hedge
+            for other in attempts:
+                if other is not winner and not other.failed:
+                    other.cancel()
+                    request['wasted_calls'] += 1
+
+            while kind != 'done':
+                if kind == 'text' and value:
+                    yield value
+                event = next_event(deadline_at)
+                if event is None:
+                    raise LLMDeadlineExceeded(f"Answer not finished within {deadline_at - start:.1f}s")
+                number, kind, value = event
+                if number != winner.number:
+                    continue
+                if kind == 'error':
+                    raise value
+            request['outcome'] = 'ok'
+        except LLMDeadlineExceeded:
+            request['outcome'] = 'deadline_exceeded'
+            raise
+        except GeneratorExit:
+            # The consumer stopped reading
+            request['outcome'] = 'cancelled'
+            raise
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+            request['total_time'] = time.perf_counter() - start
+            self._record(request)
+            if stats is not None:
+                stats.update(request)
+
+    def _record(self, request):
+        self.stats.record(request)
+        telemetry.observe('llm_request_seconds', request['total_time'], outcome=request['outcome'])
+        if request['hedged']:
+            telemetry.increment('llm_hedges_total', outcome='won' if request['hedge_won'] else 'lost')
+        if request['retries']:
+            telemetry.increment('llm_retries_total', request['retries'])
+        if request['wasted_calls']:
+            telemetry.increment('llm_wasted_calls_total', request['wasted_calls'])
+        if request['outcome'] == 'deadline_exceeded':
+            telemetry.increment('llm_deadline_exceeded_total')
+
+
+def create_llm_backend(model=DEFAULT_LLM_MODEL, **policy):
+    """
+    Backend from the environment
+
+    Requests go to OPENAI_BASE_URL with the RAG_LLM_DEADLINE,
+    RAG_LLM_HEDGE_DELAY and RAG_LLM_MAX_RETRIES policy, overridden by any
+    ResilientBackend arguments in policy; hedged duplicates go to
+    RAG_LLM_HEDGE_BASE_URL if set, else to the same endpoint.
+    """
+    primary = OpenAIBackend(model)
+    hedge_base_url = os.getenv("RAG_LLM_HEDGE_BASE_URL")
+    hedge = OpenAIBackend(model, base_url=hedge_base_url) if hedge_base_url else None
+    return ResilientBackend(primary, hedge=hedge, **policy)
+
+
+_llm_backend = None
+_llm_backend_lock = threading.Lock()
+
+
+def get_llm_backend():
+    """Process-wide LLM backend, created on first use (see create_llm_backend)"""
+    global _llm_backend
+    if _llm_backend is None:
+        with _llm_backend_lock:
+            if _llm_backend is None:
+                _llm_backend = create_llm_backend()
+    return _llm_backend
+
+
+def set_llm_backend(backend):
+    """Replace the process-wide LLM backend (e.g. with stubs or another provider)"""
+    global _llm_backend
+    with _llm_backend_lock:
+        _llm_backend = backend
@@ -0,0 +1,504 @@
+"""
+Headless HTTP retrieval and question-answering service
+
+Serves the src pipeline over HTTP so that it runs once per process instead
+of inside every Streamlit script run:
+
+    POST /documents                    raw PDF body -> ingest, returns document info
+                                       (?previous=<hash> reuses an earlier version's embeddings)
+    GET  /documents/{document_hash}    chunk and section counts
+    POST /documents/{document_hash}/search
+    POST /documents/{document_hash}/answer   JSON, or NDJSON when "stream" is true
+    GET  /health, GET /metrics
+
+Each process holds one embedding model, shared by all requests through an
+EmbeddingBatcher. Ingest and retrieval run on a bounded worker pool; LLM
+calls run on I/O threads. Ingest and query requests are admitted
+separately: when a class already has its maximum of requests running and
+queued, further requests get 503 with a Retry-After header instead of
+piling up. Scale out by running more processes (uvicorn --workers).
+
+Usage:
+    python -m src.service --host 0.0.0.0 --port 8000
+    uvicorn src.service:create_app --factory --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from src.embedding_utils import (
+    embed_query,
+    get_top_k_chunks,
+    get_top_k_chunks_hybrid,
+    get_section_counts,
+    set_embedding_service
+)
+from src.generator import generate_response_stream, get_section_info, format_sources
+from src.ingest import ingest_pdf
+from src.index_cache import IndexCache, compute_document_hash
+from src.embedding_service import EmbeddingBatcher
+from src.encoders import get_encoder
+from src.answer_cache import SemanticAnswerCache, SqliteAnswerStore, make_answer_key
+from src.telemetry import telemetry
+
+MAX_UPLOAD_BYTES = int(os.getenv("RAG_SERVICE_MAX_UPLOAD_BYTES", 64 * 1024 ** 2))
+MAX_DOCUMENTS = int(os.getenv("RAG_SERVICE_MAX_DOCUMENTS", "32"))
+INDEX_STORAGE = os.getenv("RAG_INDEX_STORAGE", "flat")
+MAX_K = int(os.getenv("RAG_SERVICE_MAX_K", "50"))
+
+
+class Overloaded(Exception):
+    """Raised when a request class is at its running plus queued limit"""
+
+    def __init__(self, retry_after):
+        super().__init__("Service overloaded")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limit with a bounded wait queue
+
+    Up to max_concurrent holders run at once and up to max_queued wait;
+    beyond that acquire() raises Overloaded immediately.
+    """
+
+    def __init__(self, max_concurrent, max_queued, retry_after=1.0):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def acquire(self):
+        if self.active + self.waiting >= self.max_concurrent + self.max_queued:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def stats(self):
+        return {'active': self.active, 'waiting': self.waiting, 'rejected': self.rejected}
+
+
+class SearchRequest(BaseModel):
+    query: str
+    k: int = Field(5, gt=0, le=MAX_K)
+    section: Optional[str] = None
+    mode: Literal["dense", "hybrid"] = "dense"
+
+
+class AnswerRequest(SearchRequest):
+    show_sources: bool = False
+    stream: bool = False
+
+
+def _run_once(fn):
+    """Wrap fn so that only the first call, from any thread, runs it"""
+    lock = threading.Lock()
+    called = []
+
+    def wrapper():
+        with lock:
+            if called:
+                return
+            called.append(True)
+        fn()
+    return wrapper
+
+
+class _ReleasingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that calls release() once the response ends
+
+    Also covers a client that disconnects before the body is first read,
+    when neither the body generator's finally nor a background task runs.
+    """
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+
+def _chunk_payload(chunks, weights, scores):
+    return [
+        dict(chunk, weight=float(weight), score=float(score))
+        for chunk, weight, score in zip(chunks, weights, scores)
+    ]
+
+
+class RetrievalService:
+    """
+    Documents, worker pool and admission control behind the HTTP endpoints
+
+    Ingested documents are kept in memory, least-recently-used first out
+    beyond max_documents; evicted ones are reloaded from the index cache
+    when uploaded again.
+    """
+
+    def __init__(self, index_cache=None, answer_cache=None, max_workers=None, max_documents=MAX_DOCUMENTS,
+                 max_concurrent_ingests=2, max_queued_ingests=8, max_concurrent_queries=32,
+                 max_queued_queries=128, storage=INDEX_STORAGE):
+        self.index_cache = index_cache
+        self.answer_cache = answer_cache
+        self.max_documents = max_documents
+        self.storage = storage
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count(), thread_name_prefix='rag-worker')
+        self.ingest_admission = AdmissionController(max_concurrent_ingests, max_queued_ingests, retry_after=5.0)
+        self.query_admission = AdmissionController(max_concurrent_queries, max_queued_queries, retry_after=1.0)
+        self._documents = OrderedDict()
+        self._pending = {}
+
+    async def run(self, fn, *args, **kwargs):
+        """Run CPU-bound work on the worker pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, lambda: fn(*args, **kwargs))
+
+    def document(self, document_hash):
+        document = self._documents.get(document_hash)
+        if document is None:
+            raise HTTPException(status_code=404, detail="Unknown document; upload it first")
+        self._documents.move_to_end(document_hash)
+        return document
+
+    def _ingest(self, pdf_bytes, previous_document_hash=None):
+        # A still-loaded previous version has its index updated on a copy
+        previous = self._documents.get(previous_document_hash) if previous_document_hash else None
+        document = ingest_pdf(pdf_bytes, self.index_cache, storage=self.storage,
+                              previous_document_hash=previous_document_hash,
+                              previous_index=previous['index'] if previous is not None else None)
+        # Compressed indexes rerank against the full-precision vectors
+        embeddings = document.pop('embeddings')
+        document['rerank_vectors'] = embeddings if self.storage != 'flat' else None
+        document['section_counts'] = get_section_counts(document['chunked_data'])
+        return document
+
+    async def ingest(self, pdf_bytes, previous_document_hash=None):
+        """
+        Ingest a PDF once, even if several clients upload it concurrently
+
+        previous_document_hash names an earlier version of the paper whose
+        cached embeddings are reused for unchanged chunks; if that version is
+        still loaded, its index is updated on a copy rather than rebuilt.
+        """
+        document_hash = compute_document_hash(pdf_bytes)
+        if document_hash in self._documents:
+            return self.document(document_hash)
+        if document_hash in self._pending:
+            return await asyncio.shield(self._pending[document_hash])
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[document_hash] = future
+        try:
+            async with self.ingest_admission:
+                document = await self.run(self._ingest, pdf_bytes, previous_document_hash)
+            self._documents[document_hash] = document
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+            future.set_result(document)
+            return document
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._pending[document_hash]
+
+    def _retrieve(self, document, request):
+        if request.mode == "hybrid":
+            search_stats = {}
+            chunks, weights, scores = get_top_k_chunks_hybrid(
+                request.query, document['chunked_data'], document['index'], document['lexical_index'],
+                k=request.k, section_filter=request.section, section_filters=document['section_filters'],
+                rerank_vectors=document['rerank_vectors'], stats=search_stats
+            )
+            # None when dense search was skipped; the answer cache then
+            # matches the query text exactly
+            query_embedding = search_stats['query_embedding']
+        else:
+            query_embedding = embed_query(request.query)
+            chunks, weights, scores = get_top_k_chunks(
+                request.query, document['chunked_data'], document['index'], k=request.k,
+                section_filter=request.section, section_filters=document['section_filters'],
+                query_embedding=query_embedding, rerank_vectors=document['rerank_vectors']
+            )
+        return chunks, weights, scores, query_embedding
+
+    async def search(self, document_hash, request):
+        async with self.query_admission:
+            document = self.document(document_hash)
+            chunks, weights, scores, _ = await self.run(self._retrieve, document, request)
+        return _chunk_payload(chunks, weights, scores)
+
+    async def answer(self, document_hash, request):
+        """Retrieve, then answer from the answer cache or the LLM"""
+        async with self.query_admission:
+            document = self.document(document_hash)
+            chunks, weights, scores, query_embedding = await self.run(self._retrieve, document, request)
+            if not chunks:
+                return {'chunks': [], 'answer': None, 'cached': False}
+
+            answer, answer_key = self._cached_answer(document_hash, chunks, query_embedding, request.query)
+            cached = answer is not None
+            if not cached:
+                generation_stats = {}
+                answer = await asyncio.to_thread(
+                    lambda: ''.join(generate_response_stream(chunks, weights, request.query,
+                                                             show_sources=False, stats=generation_stats))
+                )
+                self._store_answer(answer_key, query_embedding, request.query, answer, generation_stats)
+            if request.show_sources:
+                answer += format_sources(get_section_info(chunks, weights))
+        return {'chunks': _chunk_payload(chunks, weights, scores), 'answer': answer, 'cached': cached}
+
+    async def answer_stream(self, document_hash, request):
+        """
+        NDJSON event stream: {"chunks": [...]}, then {"delta": text} lines,
+        then {"done": true, "cached": ..., "time_to_first_token": ..., "total_time": ...},
+        or {"error": message} if generation fails mid-stream
+
+        Returns:
+            (events, release): the event generator and the function that
+            frees the admission slot it holds. The generator calls release
+            when it finishes; the caller must call it too once the response
+            is over, as a generator that is never started never finishes.
+            Only the first call has an effect.
+        """
+        loop = asyncio.get_running_loop()
+        await self.query_admission.acquire()
+        release = _run_once(lambda: loop.call_soon_threadsafe(self.query_admission.release))
+        try:
+            document = self.document(document_hash)
+            chunks, weights, scores, query_embedding = await self.run(self._retrieve, document, request)
+        except BaseException:
+            release()
+            raise
+
+        def events():
+            # Runs on Starlette's I/O threads; holds the admission slot until done
+            try:
+                yield json.dumps({'chunks': _chunk_payload(chunks, weights, scores)}) + '\n'
+                if not chunks:
+                    yield json.dumps({'done': True, 'cached': False}) + '\n'
+                    return
+                answer, answer_key = self._cached_answer(document_hash, chunks, query_embedding, request.query)
+                stats = {}
+                if answer is not None:
+                    yield json.dumps({'delta': answer}) + '\n'
+                else:
+                    parts = []
+                    for token in generate_response_stream(chunks, weights, request.query,
+                                                          show_sources=False, stats=stats):
+                        parts.append(token)
+                        yield json.dumps({'delta': token}) + '\n'
+                    self._store_answer(answer_key, query_embedding, request.query, ''.join(parts), stats)
+                if request.show_sources:
+                    yield json.dumps({'delta': format_sources(get_section_info(chunks, weights))}) + '\n'
+                yield json.dumps({
+                    'done': True,
+                    'cached': answer is not None,
+                    'time_to_first_token': stats.get('time_to_first_token'),
+                    'total_time': stats.get('total_time'),
+                    'context': stats.get('context')
+                }) + '\n'
+            except Exception as e:
+                # The 200 status is already sent; report the failure in-band
+                yield json.dumps({'error': f"{type(e).__name__}: {e}"}) + '\n'
+            finally:
+                release()
+
+        return events(), release
+
+    def _cached_answer(self, document_hash, chunks, query_embedding, query):
+        if self.answer_cache is None:
+            return None, None
+        answer_key = make_answer_key(document_hash, chunks)
+        answer = self.answer_cache.lookup(answer_key, query_embedding, query=query)
+        telemetry.increment('answer_cache_lookups_total', result='hit' if answer is not None else 'miss')
+        return answer, answer_key
+
+    def _store_answer(self, answer_key, query_embedding, query, answer, generation_stats):
+        if self.answer_cache is not None:
+            self.answer_cache.put(answer_key, query_embedding, answer, generation_stats.get('total_time', 0.0),
+                                  query=query)
+
+    def stats(self):
+        return {
+            'documents': len(self._documents),
+            'ingest': self.ingest_admission.stats(),
+            'query': self.query_admission.stats(),
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+def _document_info(document_hash, document):
+    return {
+        'document_hash': document_hash,
+        'chunks': len(document['chunked_data']),
+        'sections': document['section_counts'],
+        'cache_hit': document['cache_hit'],
+        'reindex': document['reindex'],
+    }
+
+
+def _prometheus_gauges(stats):
+    lines = [
+        '# TYPE rag_service_documents gauge',
+        f"rag_service_documents {stats['documents']}",
+    ]
+    for name in ('active', 'waiting', 'rejected'):
+        kind = 'counter' if name == 'rejected' else 'gauge'
+        metric = f'rag_service_requests_{name}' + ('_total' if kind == 'counter' else '')
+        lines.append(f'# TYPE {metric} {kind}')
+        for request_class in ('ingest', 'query'):
+            lines.append(f'{metric}{{class="{request_class}"}} {stats[request_class][name]}')
+    return '\n'.join(lines) + '\n'
+
+
+async def _read_upload(request):
+    """The request body, rejected with 413 as soon as it exceeds MAX_UPLOAD_BYTES"""
+    content_length = request.headers.get('content-length', '')
+    if content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="PDF too large")
+    parts = []
+    size = 0
+    async for part in request.stream():
+        size += len(part)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="PDF too large")
+        parts.append(part)
+    return b''.join(parts)
+
+
+def create_app(service=None, warm_model=True):
+    """
+    Build the FastAPI application
+
+    Args:
+        service: Optional RetrievalService; by default one is created with the
+            on-disk index cache and the RAG_ANSWER_CACHE_* answer cache
+        warm_model: Load the embedding model at startup rather than on the
+            first request
+    """
+    if service is None:
+        db_path = os.getenv("RAG_ANSWER_CACHE_DB")
+        service = RetrievalService(
+            index_cache=IndexCache(),
+            answer_cache=SemanticAnswerCache(
+                similarity_threshold=float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95")),
+                store=SqliteAnswerStore(db_path) if db_path else None
+            ),
+            max_workers=int(os.getenv("RAG_SERVICE_WORKERS", "0")) or None
+        )
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # One model per process, shared by all requests through the batcher
+        batcher = EmbeddingBatcher(lambda texts: get_encoder().encode(texts),
+                                   dimension_fn=lambda: get_encoder().dimension)
+        set_embedding_service(batcher)
+        if warm_model:
+            await service.run(get_encoder)
+        yield
+        set_embedding_service(None)
+        batcher.close()
+        service.close()
+
+    app = FastAPI(title="Scientific Paper RAG Service", lifespan=lifespan)
+    app.state.service = service
+
+    @app.exception_handler(Overloaded)
+    async def overloaded_handler(request, exc):
+        return JSONResponse(
+            status_code=503,
+            content={'detail': "Service overloaded, retry later"},
+            headers={'Retry-After': str(int(exc.retry_after + 0.999))}
+        )
+
+    @app.get("/health")
+    async def health():
+        return {'status': 'ok', **service.stats()}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return telemetry.prometheus_text() + _prometheus_gauges(service.stats())
+
+    @app.post("/documents")
+    async def ingest(request: Request, previous: Optional[str] = None):
+        pdf_bytes = await _read_upload(request)
+        if not pdf_bytes:
+            raise HTTPException(status_code=400, detail="Request body must be the PDF file")
+        document = await service.ingest(pdf_bytes, previous_document_hash=previous)
+        return _document_info(document['document_hash'], document)
+
+    @app.get("/documents/{document_hash}")
+    async def document_info(document_hash: str):
+        return _document_info(document_hash, service.document(document_hash))
+
+    @app.post("/documents/{document_hash}/search")
+    async def search(document_hash: str, request: SearchRequest):
+        return {'chunks': await service.search(document_hash, request)}
+
+    @app.post("/documents/{document_hash}/answer")
+    async def answer(document_hash: str, request: AnswerRequest):
+        if request.stream:
+            events, release = await service.answer_stream(document_hash, request)
+            return _ReleasingStreamingResponse(events, release, media_type="application/x-ndjson")
+        return await service.answer(document_hash, request)
+
+    return app
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1, help="Server processes, each with its own model")
+    args = parser.parse_args()
+    uvicorn.run("src.service:create_app", factory=True, host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
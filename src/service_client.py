@@ -0,0 +1,115 @@
+import json
+import time
+import requests
+
+
+class ServiceError(Exception):
+    """The retrieval service rejected or failed a request"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+
+
+class ServiceClient:
+    """
+    Thin client for the HTTP service in src/service.py
+
+    Requests rejected with 503 are retried after the server's Retry-After,
+    up to max_retries times.
+
+    Args:
+        base_url: Service root, e.g. http://127.0.0.1:8000
+        timeout: Per-request timeout in seconds (ingest gets 10x)
+        max_retries: Retries for overloaded (503) responses
+    """
+
+    def __init__(self, base_url, timeout=60.0, max_retries=3):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+
+    def _request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            response = self.session.request(method, self.base_url + path, **kwargs)
+            if response.status_code != 503 or attempt == self.max_retries:
+                break
+            response.close()
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get('detail', response.text)
+            except ValueError:
+                detail = response.text
+            raise ServiceError(response.status_code, detail)
+        return response
+
+    def ingest(self, pdf_bytes, previous_document_hash=None):
+        """
+        Upload a PDF for processing
+
+        previous_document_hash names an earlier version of the paper whose
+        embeddings the service may reuse for unchanged chunks.
+
+        Returns:
+            Dict with 'document_hash', 'chunks', 'sections' (chunk count per
+            section), 'cache_hit' and 'reindex' (reused/encoded counts, or None)
+        """
+        params = {'previous': previous_document_hash} if previous_document_hash else None
+        return self._request(
+            'POST', '/documents', data=pdf_bytes, params=params,
+            headers={'Content-Type': 'application/pdf'}, timeout=10 * self.timeout
+        ).json()
+
+    def document(self, document_hash):
+        """Document info, or None if the service does not hold the document"""
+        try:
+            return self._request('GET', f'/documents/{document_hash}').json()
+        except ServiceError as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    def search(self, document_hash, query, k=5, section=None, mode='dense'):
+        """Retrieved chunk dicts, each with 'weight' and 'score'"""
+        payload = {'query': query, 'k': k, 'section': section, 'mode': mode}
+        return self._request('POST', f'/documents/{document_hash}/search', json=payload).json()['chunks']
+
+    def answer(self, document_hash, query, k=5, section=None, mode='dense', show_sources=False):
+        """Dict with 'chunks', 'answer' and 'cached'"""
+        payload = {'query': query, 'k': k, 'section': section, 'mode': mode, 'show_sources': show_sources}
+        return self._request('POST', f'/documents/{document_hash}/answer', json=payload).json()
+
+    def answer_stream(self, document_hash, query, k=5, section=None, mode='dense', show_sources=False, stats=None):
+        """
+        Streamed answer
+
+        Returns:
+            (chunks, text_iterator). Once the iterator is exhausted, a stats
+            dict if passed holds 'cached', 'time_to_first_token', 'total_time'
+            and 'context' (the prompt token report, None for cached answers).
+        """
+        payload = {'query': query, 'k': k, 'section': section, 'mode': mode,
+                   'show_sources': show_sources, 'stream': True}
+        response = self._request('POST', f'/documents/{document_hash}/answer', json=payload, stream=True)
+        lines = response.iter_lines(decode_unicode=True)
+        chunks = json.loads(next(lines))['chunks']
+
+        def deltas():
+            try:
+                for line in lines:
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if 'delta' in event:
+                        yield event['delta']
+                    elif 'error' in event:
+                        raise ServiceError(502, event['error'])
+                    elif event.get('done') and stats is not None:
+                        stats.update({key: value for key, value in event.items() if key != 'done'})
+            finally:
+                response.close()
+
+        return chunks, deltas()
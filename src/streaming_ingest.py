@@ -0,0 +1,549 @@
+import bisect
+import io
+import os
+import re
+import threading
+import time
+import tracemalloc
+import faiss
+import numpy as np
+from PyPDF2 import PdfReader
+
+from src.chunk_store import ChunkStore
+from src.embedding_utils import (
+    section_header_matcher,
+    make_splitter,
+    split_section,
+    encode_texts,
+    embed_chunks,
+    build_index,
+    effective_storage,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP
+)
+from src.index_cache import compute_document_hash, make_cache_key
+from src.ingest import make_document
+from src.pdf_extraction import read_pdf_bytes, pages_at_offsets
+from src.encoders import current_encoder_id
+from src.telemetry import telemetry
+
+# Chunks per encode call; each batch becomes searchable once it is embedded
+STREAM_EMBED_BATCH_SIZE = int(os.getenv("RAG_STREAM_BATCH_SIZE", "64"))
+
+# Minimum seconds between published snapshots (the first batch is published
+# right away)
+PUBLISH_INTERVAL_SECONDS = float(os.getenv("RAG_STREAM_PUBLISH_INTERVAL", "0.5"))
+
+_NON_SPACE = re.compile(r'\S')
+
+
+def iter_pages(pdf_bytes):
+    """Yield the text of each page, extracting one page at a time"""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    for page in reader.pages:
+        yield page.extract_text() or ''
+        telemetry.increment('pages_extracted_total')
+
+
+class _TextView:
+    """
+    Read-only view of the first pieces of a PageBuffer
+
+    Sliced like the joined text (text[start:end]) and encoded like it,
+    which is all a ChunkStore needs of its buffer, so snapshots and the
+    final document share the pages read instead of copying them into one
+    string.
+    """
+
+    __slots__ = ('_pieces', '_piece_offsets', '_count')
+
+    def __init__(self, pieces, piece_offsets, count):
+        self._pieces = pieces
+        self._piece_offsets = piece_offsets
+        self._count = count
+
+    def __len__(self):
+        return self._piece_offsets[self._count]
+
+    def __getitem__(self, span):
+        if not isinstance(span, slice) or span.step not in (None, 1):
+            raise TypeError("Text views only support contiguous slices")
+        start, end, _ = span.indices(len(self))
+        return self.text(start, end)
+
+    def encode(self, encoding='utf-8', errors='strict'):
+        """The text encoded as str.encode would, without joining it first"""
+        return b''.join(piece.encode(encoding, errors) for piece in self._pieces[:self._count])
+
+    def text(self, start, end):
+        """The document text in [start, end)"""
+        first = max(bisect.bisect_right(self._piece_offsets, start, 0, self._count + 1) - 1, 0)
+        parts = []
+        for i in range(first, self._count):
+            piece_start = self._piece_offsets[i]
+            if piece_start >= end:
+                break
+            parts.append(self._pieces[i][max(start - piece_start, 0):end - piece_start])
+        return ''.join(parts)
+
+
+class PageBuffer:
+    """
+    Document text that grows one page at a time without being re-copied
+
+    Pages are appended as separate pieces, each followed by a newline as
+    in extract_text_from_pdf. text() joins only the pieces a span touches
+    and view() shares the pages so far without joining them, so the text
+    is never held twice. Pieces are only ever appended in place, so
+    earlier views stay valid.
+    """
+
+    def __init__(self):
+        self.page_offsets = [0]
+        self._pieces = []
+        self._piece_offsets = [0]
+
+    def __len__(self):
+        return self.page_offsets[-1]
+
+    @property
+    def last_page(self):
+        """Text of the last appended page, with its separator"""
+        return self.text(self.page_offsets[-2], self.page_offsets[-1])
+
+    def append(self, page):
+        self._pieces.append(page + '\n')
+        self._piece_offsets.append(self._piece_offsets[-1] + len(page) + 1)
+        self.page_offsets.append(self._piece_offsets[-1])
+
+    def finish(self):
+        """Drop the separator after the last page, as extract_text_from_pdf does"""
+        if self._pieces:
+            # New lists, so views taken before keep their last piece
+            self._pieces = self._pieces[:-1] + [self._pieces[-1][:-1]]
+            self._piece_offsets = self._piece_offsets[:-1] + [self._piece_offsets[-1] - 1]
+            self.page_offsets[-1] -= 1
+
+    def view(self):
+        """Read-only view of the document so far"""
+        return _TextView(self._pieces, self._piece_offsets, len(self._pieces))
+
+    def text(self, start, end):
+        """The document text in [start, end)"""
+        return self.view().text(start, end)
+
+
+class _GrowingArray:
+    """
+    Append-only numpy array with amortized O(1) appends
+
+    view() returns the filled prefix without copying; capacity grows by
+    doubling into a new array, so earlier views are never overwritten.
+    """
+
+    def __init__(self, dtype, width=None):
+        self._shape = () if width is None else (width,)
+        self._data = np.empty((64,) + self._shape, dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        size = self._size + len(values)
+        if size > len(self._data):
+            grown = np.empty((max(size, 2 * len(self._data)),) + self._shape, dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:size] = values
+        self._size = size
+
+    def view(self):
+        return self._data[:self._size]
+
+
+class _IndexPrefix:
+    """
+    The first ntotal vectors of a flat index that is still being appended to
+
+    FAISS may reallocate an index's vectors while adding to it, so searches
+    and adds share lock. Unfiltered searches are limited to ids below
+    ntotal; section filters of a snapshot only hold ids below it already.
+    """
+
+    def __init__(self, index, ntotal, lock):
+        self.index = index
+        self.ntotal = ntotal
+        self.lock = lock
+
+    def search(self, x, k, params=None):
+        if params is None:
+            selector = faiss.IDSelectorRange(0, self.ntotal)
+            params = faiss.SearchParameters(sel=selector)
+        with self.lock:
+            return self.index.search(x, k, params=params)
+
+
+def _section_filter(ids):
+    """
+    Section filter (ids, search_params) as build_section_filters makes them
+
+    A section read in one run has contiguous ids and gets a range selector,
+    which costs nothing to build however large the section grows.
+    """
+    if ids[-1] - ids[0] + 1 == len(ids):
+        selector = faiss.IDSelectorRange(int(ids[0]), int(ids[-1]) + 1)
+    else:
+        selector = faiss.IDSelectorBatch(np.ascontiguousarray(ids))
+    params = faiss.SearchParametersIVF(sel=selector, nprobe=1)
+    params.selector_ref = selector  # keep the selector alive with its params
+    return ids, params
+
+
+def iter_sections(pages):
+    """
+    detect_sections over text that arrives one page at a time
+
+    The text is the pages joined by newlines, as extract_text_from_pdf
+    builds it, so the sections are the ones detect_sections finds in the
+    whole document. A section is yielded as soon as the next header (or
+    the end of the document) closes it.
+
+    Yields:
+        (buffer, section, body) where buffer is the PageBuffer of the
+        document so far, section a detect_sections span of the document
+        and body its text
+    """
+    matcher = section_header_matcher()
+    buffer = PageBuffer()
+    current_section = {'name': 'Header', 'start_line': 0, 'start': 0}
+    line_number = 0
+
+    for page in pages:
+        page_start = len(buffer)
+        # Lines never cross pages, so each page is scanned on its own; its
+        # separator is appended first so a header on its last line gets
+        # the same span as in the joined text
+        buffer.append(page)
+        page_text = buffer.last_page
+        line_counted_to = 0
+        for match in matcher.finditer(page_text):
+            header_start, header_end = match.span()
+            body = buffer.text(current_section['start'], page_start + header_start)
+            if _NON_SPACE.search(body):
+                yield buffer, dict(current_section, end=page_start + header_start), body
+
+            line_number += page_text.count('\n', line_counted_to, header_start)
+            line_counted_to = header_start
+            current_section = {
+                'name': match.group().strip().title(),
+                'start_line': line_number,
+                'start': page_start + header_end + 1
+            }
+        line_number += page_text.count('\n', line_counted_to)
+
+    buffer.finish()
+    current_section['start'] = min(current_section['start'], len(buffer))
+    body = buffer.text(current_section['start'], len(buffer))
+    if _NON_SPACE.search(body):
+        yield buffer, dict(current_section, end=len(buffer)), body
+
+
+def iter_chunks(sections, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    Chunk each section from iter_sections as it closes
+
+    Uses the splitter and chunk ids of chunk_text_with_sections, so the
+    chunks match a batch ingest of the same document.
+
+    Yields:
+        (buffer, section, body, chunk_ids, starts, ends, pages) for every
+        section with at least one chunk; starts/ends are document offsets
+        and pages the 1-based source pages
+    """
+    splitter = make_splitter(chunk_size, chunk_overlap)
+    occurrences = {}
+    for buffer, section, body in sections:
+        chunk_ids, starts, ends = split_section(body, dict(section, start=0, end=len(body)), splitter, occurrences)
+        if chunk_ids:
+            offset = section['start']
+            starts = [start + offset for start in starts]
+            ends = [end + offset for end in ends]
+            telemetry.increment('chunks_created_total', len(chunk_ids))
+            yield buffer, section, body, chunk_ids, starts, ends, pages_at_offsets(buffer.page_offsets, starts)
+
+
+class StreamingIngest:
+    """
+    Ingest a PDF on a background thread, searchable while it runs
+
+    Pages are extracted one at a time and flow through section detection,
+    chunking and embedding as generator stages, so the whole page list is
+    never held next to the joined text. A section is chunked as soon as
+    the next header closes it, and its chunks are embedded in batches of
+    STREAM_EMBED_BATCH_SIZE and appended to one exact flat index.
+    Embedded chunks are published as a snapshot document (see snapshot())
+    that searches the index up to its chunk count, shares the pages read so
+    far and reuses the section filters of sections that did not grow, so a
+    snapshot costs the same early or late in a long paper. Its
+    'lexical_index' is None, as rebuilding BM25 postings for every
+    snapshot would cost more than the dense search it complements. Once
+    the last page is in, the flat index is kept, or replaced by one in the
+    requested storage mode, the BM25 index is built and the result is
+    written to the index cache; chunk ids match ingest_pdf, so both share
+    cache entries.
+
+    stats records 'time_to_first_chunk_seconds' (until the first chunk
+    could be searched), 'total_seconds' and, with trace_memory, the
+    'peak_memory_bytes' of the Python heap while the ingest ran
+    (tracemalloc; FAISS and torch native allocations are not counted).
+
+    Args:
+        source: PDF bytes, a file path or a file-like object
+        index_cache: Optional IndexCache to read from and populate
+        storage: Storage mode of the final index (see build_index)
+        previous_document_hash: Hash of an earlier version of the paper;
+            its cached embeddings are reused for unchanged chunks
+        trace_memory: Measure peak memory with tracemalloc, for benchmarks.
+            Tracing is process-wide: it slows down every thread in the
+            process and counts their allocations too, and an ingest started
+            while another one traces records no peak
+    """
+
+    def __init__(self, source, index_cache=None, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+                 storage='flat', previous_document_hash=None, trace_memory=False):
+        self.pdf_bytes = read_pdf_bytes(source)
+        self.document_hash = compute_document_hash(self.pdf_bytes)
+        self.page_count = len(PdfReader(io.BytesIO(self.pdf_bytes)).pages)
+        self.index_cache = index_cache
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.storage = storage
+        self.previous_document_hash = previous_document_hash
+        self.trace_memory = trace_memory
+        self.stats = {'time_to_first_chunk_seconds': None, 'total_seconds': None, 'peak_memory_bytes': None}
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._thread = None
+        self._done = threading.Event()
+        self._snapshot = None
+        self._document = None
+        self._error = None
+        self._pages_read = 0
+        self._started = None
+
+    def start(self):
+        """Start the background worker; later calls do nothing"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'ingest-{self.document_hash[:12]}', daemon=True)
+                self._thread.start()
+        return self
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def snapshot(self):
+        """The document as searchable so far (the final document once done), or None before the first chunk"""
+        with self._lock:
+            return self._snapshot
+
+    def progress(self):
+        """Pages read, page count and chunks searchable so far"""
+        snapshot = self.snapshot()
+        return {
+            'pages': self._pages_read,
+            'page_count': self.page_count,
+            'chunks': len(snapshot['chunked_data']) if snapshot is not None else 0
+        }
+
+    def wait(self, timeout=None):
+        """
+        Block until the ingest finishes
+
+        Returns:
+            The document dict, as ingest_pdf returns it; a failed ingest
+            raises its error here
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Ingest of {self.document_hash} still running")
+        if self._error is not None:
+            raise self._error
+        return self._document
+
+    def _run(self):
+        self._started = time.perf_counter()
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        try:
+            with telemetry.span('streaming_ingest', storage=self.storage, pages=self.page_count) as span:
+                document = self._ingest()
+                span.set_attribute('chunks', len(document['chunked_data']))
+                span.set_attribute('cache_hit', document['cache_hit'])
+            with self._lock:
+                self._document = document
+                self._snapshot = document
+            if self.stats['time_to_first_chunk_seconds'] is None:
+                self._first_chunk()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.stats['total_seconds'] = time.perf_counter() - self._started
+            if tracing:
+                self.stats['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                telemetry.observe('ingest_peak_memory_bytes', self.stats['peak_memory_bytes'])
+            self._done.set()
+
+    def _first_chunk(self):
+        self.stats['time_to_first_chunk_seconds'] = time.perf_counter() - self._started
+        telemetry.observe('ingest_time_to_first_chunk_seconds', self.stats['time_to_first_chunk_seconds'])
+
+    def _count_pages(self, pages):
+        for page in pages:
+            yield page
+            self._pages_read += 1
+
+    def _ingest(self):
+        cache_key = make_cache_key(self.document_hash, self.chunk_size, self.chunk_overlap, current_encoder_id())
+        cached = self.index_cache.load(cache_key) if self.index_cache is not None else None
+        if self.index_cache is not None:
+            telemetry.increment('index_cache_lookups_total', result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            chunked_data, embeddings = cached
+            self._pages_read = self.page_count
+            return make_document(self.document_hash, chunked_data, build_index(embeddings, storage=self.storage),
+                                 embeddings, cache_hit=True)
+
+        previous = None
+        if self.index_cache is not None and self.previous_document_hash is not None:
+            previous = self.index_cache.load(
+                make_cache_key(self.previous_document_hash, self.chunk_size, self.chunk_overlap, current_encoder_id()))
+        previous_rows = {}
+        if previous is not None:
+            previous_rows = {chunk_id: row for row, chunk_id in enumerate(previous[0].chunk_ids.tolist())}
+
+        # Everything below only grows, so a snapshot costs the same however
+        # much of the document has been read
+        columns = {name: _GrowingArray(dtype) for name, dtype in (
+            ('chunk_ids', 'int64'), ('section_ids', 'int32'), ('section_starts', 'int32'),
+            ('starts', 'int64'), ('ends', 'int64'), ('pages', 'int32'))}
+        section_names = {}
+        section_ids = {}
+        changed_sections = set()
+        blocks = []
+        index = None
+        reused = 0
+        published = None
+        buffer = PageBuffer()
+
+        chunks = iter_chunks(
+            iter_sections(self._count_pages(iter_pages(self.pdf_bytes))),
+            chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
+        )
+        for buffer, section, body, chunk_ids, starts, ends, pages in chunks:
+            section_id = section_names.setdefault(section['name'], len(section_names))
+            for batch_start in range(0, len(chunk_ids), STREAM_EMBED_BATCH_SIZE):
+                batch = slice(batch_start, batch_start + STREAM_EMBED_BATCH_SIZE)
+                block, block_reused = self._embed(
+                    body, section['start'], chunk_ids[batch], starts[batch], ends[batch], previous, previous_rows)
+                if index is None:
+                    index = faiss.IndexFlatIP(block.shape[1])
+                with self._index_lock:
+                    index.add(block)
+                blocks.append(block)
+                reused += block_reused
+                positions = np.arange(len(columns['chunk_ids']), len(columns['chunk_ids']) + len(block))
+                section_ids.setdefault(section['name'], _GrowingArray('int64')).extend(positions)
+                changed_sections.add(section['name'])
+                columns['chunk_ids'].extend(chunk_ids[batch])
+                columns['section_ids'].extend([section_id] * len(block))
+                columns['section_starts'].extend([section['start_line']] * len(block))
+                columns['starts'].extend(starts[batch])
+                columns['ends'].extend(ends[batch])
+                columns['pages'].extend(pages[batch])
+
+                if published is None or time.perf_counter() - published >= PUBLISH_INTERVAL_SECONDS:
+                    chunked_data = ChunkStore(buffer.view(), section_names=list(section_names),
+                                              **{name: column.view() for name, column in columns.items()})
+                    self._publish(chunked_data, index, section_ids, changed_sections)
+                    changed_sections = set()
+                    published = time.perf_counter()
+
+        chunked_data = ChunkStore(buffer.view(), section_names=list(section_names),
+                                  **{name: column.view() for name, column in columns.items()})
+        if not blocks:
+            # Nothing to stream; match ingest_pdf on an empty document
+            index, embeddings = embed_chunks(chunked_data, storage=self.storage)
+        else:
+            embeddings = np.concatenate(blocks)
+            # Don't hold the batches next to the final index and BM25 build
+            del blocks[:]
+            # A flat index is the one the snapshots searched, complete now
+            if effective_storage(len(embeddings), embeddings.shape[1], self.storage) != 'flat':
+                with telemetry.span('build_index', storage=self.storage):
+                    index = build_index(embeddings, storage=self.storage)
+            telemetry.increment('chunks_indexed_total', len(embeddings), storage=self.storage)
+        if self.index_cache is not None:
+            self.index_cache.save(cache_key, chunked_data, embeddings)
+
+        reindex = None
+        if previous is not None:
+            telemetry.increment('chunks_reused_total', reused)
+            telemetry.increment('chunks_encoded_total', len(chunked_data) - reused)
+            reindex = {'reused': reused, 'encoded': len(chunked_data) - reused, 'removed': len(previous_rows) - reused}
+        return make_document(self.document_hash, chunked_data, index, embeddings, reindex=reindex)
+
+    def _embed(self, body, offset, chunk_ids, starts, ends, previous, previous_rows):
+        """
+        Normalized embeddings of one batch of a section's chunks, copied
+        from the previous version where unchanged; body is the section text,
+        starting at document offset
+        """
+        rows = [previous_rows.get(chunk_id) for chunk_id in chunk_ids]
+        new = [i for i, row in enumerate(rows) if row is None]
+        embeddings = None
+        if new:
+            with telemetry.span('encode_chunks', chunks=len(new)):
+                encoded = np.array(encode_texts([body[starts[i] - offset:ends[i] - offset] for i in new]), dtype='float32')
+            faiss.normalize_L2(encoded)
+            embeddings = np.empty((len(chunk_ids), encoded.shape[1]), dtype='float32')
+            embeddings[new] = encoded
+        if len(new) < len(rows):
+            kept = [i for i, row in enumerate(rows) if row is not None]
+            if embeddings is None:
+                embeddings = np.empty((len(chunk_ids), previous[1].shape[1]), dtype='float32')
+            embeddings[kept] = previous[1][[rows[i] for i in kept]]
+        return embeddings, len(rows) - len(new)
+
+    def _publish(self, chunked_data, index, section_ids, changed_sections):
+        """
+        Make the chunks embedded so far searchable through snapshot()
+
+        The snapshot searches the first len(chunked_data) vectors of the
+        growing flat index and rebuilds the filters of changed_sections
+        only; the other sections keep the previous snapshot's filters.
+        """
+        with telemetry.span('publish_snapshot', chunks=len(chunked_data)):
+            previous = self._snapshot
+            section_filters = dict(previous['section_filters']) if previous is not None else {}
+            for name in changed_sections:
+                section_filters[name] = _section_filter(section_ids[name].view())
+            snapshot = {
+                'document_hash': self.document_hash,
+                'chunked_data': chunked_data,
+                'index': _IndexPrefix(index, len(chunked_data), self._index_lock),
+                'embeddings': None,
+                'section_filters': section_filters,
+                'lexical_index': None,
+                'cache_hit': False,
+                'reindex': None
+            }
+        with self._lock:
+            first = self._snapshot is None
+            self._snapshot = snapshot
+        if first:
+            self._first_chunk()
@@ -0,0 +1,231 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Off by default; every instrumentation call is a single flag check when disabled
+ENABLED = os.getenv("RAG_TELEMETRY", "").lower() in ("1", "true", "yes", "on")
+# Optional JSONL file that finished spans are appended to
+SPANS_FILE = os.getenv("RAG_TELEMETRY_SPANS_FILE")
+
+METRIC_PREFIX = "rag_"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_span = contextvars.ContextVar('rag_current_span', default=None)
+
+
+class _NoopSpan:
+    """Shared stand-in returned by span() while telemetry is disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    Timed stage, nested under the span that was current when it started
+
+    Use as a context manager. Attached spans become the current span for
+    their body; detached spans (e.g. around a generator that yields to its
+    consumer) are timed but never become a parent.
+    """
+
+    __slots__ = ('name', 'attributes', 'trace_id', 'span_id', 'parent_id', 'start_ns', 'end_ns',
+                 'status', '_telemetry', '_attach', '_token', '_start')
+
+    def __init__(self, telemetry, name, attributes, attach=True):
+        self.name = name
+        self.attributes = attributes
+        self._telemetry = telemetry
+        self._attach = attach
+        self._token = None
+        self.end_ns = None
+        self.status = 'OK'
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        if self._attach:
+            self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(duration * 1e9)
+        if self._token is not None:
+            _current_span.reset(self._token)
+        # GeneratorExit and KeyboardInterrupt are not failures of the stage
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.status = 'ERROR'
+            self.attributes['exception.type'] = exc_type.__name__
+        self._telemetry._finish(self, duration)
+        return False
+
+    def to_dict(self):
+        """OpenTelemetry-style span record"""
+        return {
+            'name': self.name,
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id,
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': self.end_ns,
+            'attributes': dict(self.attributes),
+            'status': {'code': self.status},
+        }
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{key}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Telemetry:
+    """
+    In-process spans, counters and histograms
+
+    Every span's duration is also observed in the stage_duration_seconds
+    histogram, labelled by stage. Metrics are exported in the Prometheus
+    text format, spans as OpenTelemetry-style dicts; the most recent
+    max_spans finished spans are kept in memory.
+
+    Args:
+        enabled: Record anything at all (see RAG_TELEMETRY)
+        max_spans: Finished spans kept for export_spans()
+        spans_file: Optional JSONL file each finished span is appended to
+        buckets: Histogram bucket upper bounds, in the observed unit
+    """
+
+    def __init__(self, enabled=ENABLED, max_spans=10000, spans_file=SPANS_FILE, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.spans_file = spans_file
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._spans = deque(maxlen=max_spans)
+
+    def span(self, name, attach=True, **attributes):
+        """Context manager timing one stage"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes, attach)
+
+    def traced(self, name):
+        """Decorator running the whole function inside a span"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with Span(self, name, {}):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def increment(self, name, value=1, **labels):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record one histogram observation"""
+        if not self.enabled:
+            return
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def _finish(self, span, duration):
+        self.observe('stage_duration_seconds', duration, stage=span.name)
+        with self._lock:
+            self._spans.append(span)
+            if self.spans_file:
+                with open(self.spans_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(span.to_dict()) + '\n')
+
+    def prometheus_text(self):
+        """All counters and histograms in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in self._histograms.items())
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            metric = METRIC_PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+        for (name, labels), (bucket_counts, total, count) in histograms:
+            metric = METRIC_PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} histogram')
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f'{metric}_bucket{_format_labels(labels, [("le", repr(float(bound)))])} {bucket_count}')
+            lines.append(f'{metric}_bucket{_format_labels(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def export_spans(self, clear=False):
+        """Finished spans as OpenTelemetry-style dicts, oldest first"""
+        with self._lock:
+            spans = [span.to_dict() for span in self._spans]
+            if clear:
+                self._spans.clear()
+        return spans
+
+    def reset(self):
+        """Drop all recorded metrics and spans"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._spans.clear()
+
+
+# Process-wide instance used by the instrumented modules
+telemetry = Telemetry()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Run from any directory with the repository root importable, as the benchmarks do
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,121 @@
+import sqlite3
+import types
+
+import numpy as np
+import pytest
+
+from src import answer_cache
+from src.answer_cache import SemanticAnswerCache, SqliteAnswerStore, make_answer_key, normalize_query
+
+KEY = make_answer_key('doc', [{'chunk_id': 3}, {'chunk_id': 1}])
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype='float32')
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable replacement for the cache's time.time()"""
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_answer_key_keeps_document_and_chunk_order():
+    assert KEY == ('doc', (3, 1))
+    assert KEY != make_answer_key('doc', [{'chunk_id': 1}, {'chunk_id': 3}])
+    assert KEY != make_answer_key('other', [{'chunk_id': 3}, {'chunk_id': 1}])
+
+
+def test_similar_queries_hit_and_dissimilar_miss():
+    cache = SemanticAnswerCache(similarity_threshold=0.95)
+    cache.put(KEY, unit(1, 0, 0), "answer", generation_seconds=2.0)
+    assert cache.lookup(KEY, unit(1, 0.1, 0)) == "answer"
+    assert cache.lookup(KEY, unit(1, 1, 0)) is None
+    assert cache.lookup(('doc', (1, 3)), unit(1, 0, 0)) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['latency_saved_seconds']) == (1, 2, 2.0)
+
+
+def test_queries_without_embeddings_match_exact_text():
+    cache = SemanticAnswerCache()
+    cache.put(KEY, None, "answer", query="What is  the Method?")
+    assert normalize_query("What is  the Method?") == "what is the method?"
+    assert cache.lookup(KEY, None, query="what is the method?") == "answer"
+    assert cache.lookup(KEY, None, query="what is the result?") is None
+    # Entries without an embedding never match by similarity
+    assert cache.lookup(KEY, unit(1, 0, 0)) is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    cache.put(KEY, unit(1, 0), "answer")
+    clock[0] += 59
+    assert cache.lookup(KEY, unit(1, 0)) == "answer"
+    clock[0] += 2
+    assert cache.lookup(KEY, unit(1, 0)) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_purge_expired(clock, tmp_path):
+    store = SqliteAnswerStore(str(tmp_path / 'answers.db'))
+    cache = SemanticAnswerCache(ttl_seconds=60, store=store)
+    cache.put(KEY, unit(1, 0), "old")
+    clock[0] += 30
+    cache.put(('doc', (2,)), unit(1, 0), "new")
+    clock[0] += 40
+    cache.purge_expired()
+    assert cache.stats()['entries'] == 1
+    assert store.get_bucket(KEY, float('-inf')) == []
+    assert len(store.get_bucket(('doc', (2,)), float('-inf'))) == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.put(('doc', (1,)), unit(1, 0), "one")
+    cache.put(('doc', (2,)), unit(1, 0), "two")
+    assert cache.lookup(('doc', (1,)), unit(1, 0)) == "one"
+    cache.put(('doc', (3,)), unit(1, 0), "three")
+    assert cache.lookup(('doc', (2,)), unit(1, 0)) is None
+    assert cache.lookup(('doc', (1,)), unit(1, 0)) == "one"
+    assert cache.stats()['entries'] == 2
+
+
+def test_answers_persist_across_instances(tmp_path):
+    path = str(tmp_path / 'answers.db')
+    SemanticAnswerCache(store=SqliteAnswerStore(path)).put(KEY, unit(1, 0), "answer", query="q")
+    SemanticAnswerCache(store=SqliteAnswerStore(path)).put(KEY, None, "exact", query="other q")
+
+    cache = SemanticAnswerCache(store=SqliteAnswerStore(path))
+    assert cache.lookup(KEY, unit(1, 0.05)) == "answer"
+    assert cache.lookup(KEY, None, query="Other Q") == "exact"
+    assert cache.stats()['entries'] == 2
+
+
+def test_sqlite_store_migrates_old_schema(tmp_path):
+    path = str(tmp_path / 'answers.db')
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE answers (entry_id TEXT PRIMARY KEY, bucket TEXT NOT NULL, embedding BLOB NOT NULL,"
+            " answer TEXT NOT NULL, created_at REAL NOT NULL, generation_seconds REAL NOT NULL)"
+        )
+        conn.execute(
+            "INSERT INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+            ('old', SqliteAnswerStore._bucket(KEY), unit(1, 0).tobytes(), "kept", 0.0, 1.5)
+        )
+    conn.close()
+
+    store = SqliteAnswerStore(path)
+    columns = [row[1] for row in store._conn.execute("PRAGMA table_info(answers)")]
+    assert 'query' in columns
+    (entry,) = store.get_bucket(KEY, float('-inf'))
+    assert (entry.answer, entry.query, entry.generation_seconds) == ("kept", None, 1.5)
+    np.testing.assert_array_equal(entry.embedding, unit(1, 0))
+
+    # Reopening a migrated store leaves it alone
+    SqliteAnswerStore(path)
+    cache = SemanticAnswerCache(ttl_seconds=None, store=store)
+    assert cache.lookup(KEY, unit(1, 0)) == "kept"
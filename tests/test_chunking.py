@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from src.chunking import DEFAULT_SEPARATORS, SpanSplitter, strip_span
+from src.embedding_utils import chunk_text_with_sections
+
+text_splitter = pytest.importorskip("langchain.text_splitter")
+
+ALPHABET = ['a', 'b', 'x', ' ', '  ', '\t', '.', '. ', '\n', '\n\n']
+
+
+def random_texts(n, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        text = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 400)))
+        chunk_size = rng.randint(5, 60)
+        yield text, chunk_size, rng.randint(0, chunk_size)
+
+
+@pytest.mark.parametrize("text, chunk_size, chunk_overlap", list(random_texts(500)))
+def test_split_text_matches_langchain(text, chunk_size, chunk_overlap):
+    reference = text_splitter.RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=list(DEFAULT_SEPARATORS))
+    assert SpanSplitter(chunk_size, chunk_overlap).split_text(text) == reference.split_text(text)
+
+
+def test_split_spans_point_into_the_text():
+    text = "Intro line.\n\nFirst paragraph. It has two sentences.\nSecond line here.\n\nLast paragraph."
+    splitter = SpanSplitter(chunk_size=30, chunk_overlap=10)
+    spans = splitter.split_spans(text)
+    assert [text[start:end] for start, end in spans] == splitter.split_text(text)
+    offset = text.index("First")
+    assert splitter.split_spans(text, offset, len(text)) == [
+        (start, end) for start, end in splitter.split_spans(text[offset:], 0)
+        for start, end in [(start + offset, end + offset)]
+    ]
+
+
+def test_overlap_larger_than_chunk_size_is_rejected():
+    with pytest.raises(ValueError):
+        SpanSplitter(chunk_size=10, chunk_overlap=20)
+
+
+def test_strip_span():
+    assert strip_span("  ab c \n", 0, 8) == (2, 6)
+    assert strip_span("   ", 0, 3) == (3, 3)
+
+
+def test_chunk_offsets_and_ids_are_stable():
+    text = "Abstract\nWe study things. " * 3 + "\nMethods\n" + "We measure stuff carefully. " * 40
+    chunks = chunk_text_with_sections(text, chunk_size=120, chunk_overlap=20)
+    assert {chunk['section'] for chunk in chunks} == {'Abstract', 'Methods'}
+    for chunk in chunks:
+        assert text[chunk['start']:chunk['end']] == chunk['text']
+    again = chunk_text_with_sections(text, chunk_size=120, chunk_overlap=20)
+    assert list(again.chunk_ids) == list(chunks.chunk_ids)
+    assert len(set(chunks.chunk_ids.tolist())) == len(chunks)
@@ -0,0 +1,95 @@
+import gc
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.document_registry import DocumentRegistry
+
+
+def registry(max_bytes=100):
+    return DocumentRegistry(max_bytes=max_bytes, sizeof=lambda document: document['size'])
+
+
+def loader(name, size=10):
+    return lambda: {'name': name, 'size': size}
+
+
+def test_acquire_shares_one_loaded_document():
+    docs = registry()
+    first = docs.acquire('a', loader('a'))
+    second = docs.acquire('a', lambda: pytest.fail("loaded twice"))
+    assert second.document is first.document
+    stats = docs.stats()
+    assert (stats['loads'], stats['hits'], stats['references']) == (1, 1, 2)
+
+    first.release()
+    first.release()
+    assert first.released
+    assert docs.stats()['references'] == 1
+    with second:
+        pass
+    assert docs.stats()['references'] == 0
+    assert 'a' in docs
+
+
+def test_concurrent_acquires_run_the_loader_once():
+    docs = registry()
+    calls = []
+
+    def slow_loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return {'size': 10}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        handles = list(pool.map(lambda _: docs.acquire('a', slow_loader), range(8)))
+    assert calls == [1]
+    assert len({id(handle.document) for handle in handles}) == 1
+    assert docs.stats()['references'] == 8
+
+
+def test_referenced_documents_are_never_evicted():
+    docs = registry(max_bytes=15)
+    a = docs.acquire('a', loader('a'))
+    b = docs.acquire('b', loader('b'))
+    assert 'a' in docs and 'b' in docs
+    assert docs.stats()['bytes'] == 20
+
+    # Releasing one brings the registry back under budget
+    a.release()
+    assert 'a' not in docs and 'b' in docs
+    assert docs.stats()['evictions'] == 1
+    b.release()
+
+
+def test_unreferenced_documents_are_evicted_least_recently_used():
+    docs = registry(max_bytes=30)
+    for name in 'abc':
+        docs.acquire(name, loader(name)).release()
+    # Reusing 'a' makes 'b' the least recently used
+    docs.acquire('a', loader('a')).release()
+    docs.acquire('d', loader('d')).release()
+    assert [name for name in 'abcd' if name in docs] == ['a', 'c', 'd']
+    assert docs.stats()['bytes'] == 30
+
+
+def test_failed_load_is_raised_and_not_cached():
+    docs = registry()
+
+    def failing_loader():
+        raise RuntimeError("bad pdf")
+
+    with pytest.raises(RuntimeError):
+        docs.acquire('a', failing_loader)
+    assert 'a' not in docs
+    assert docs.acquire('a', loader('a')).document['name'] == 'a'
+
+
+def test_garbage_collected_handles_release_their_reference():
+    docs = registry()
+    handle = docs.acquire('a', loader('a'))
+    assert docs.stats()['referenced'] == 1
+    del handle
+    gc.collect()
+    assert docs.stats()['referenced'] == 0
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+
+from src import index_cache
+from src.chunk_store import ChunkStore
+from src.index_cache import CHUNKS_FILE, EMBEDDINGS_FILE, IndexCache, make_cache_key
+
+
+def make_entry(n=4, dimension=8, seed=0):
+    chunks = ChunkStore.from_chunks([
+        {'chunk_id': i + 1, 'text': f"chunk {i}", 'section': 'Methods' if i % 2 else 'Abstract'}
+        for i in range(n)
+    ])
+    embeddings = np.random.default_rng(seed).random((n, dimension), dtype='float32')
+    return chunks, embeddings
+
+
+def test_cache_key_covers_every_parameter(monkeypatch):
+    key = make_cache_key('doc', 500, 100, 'model-a')
+    assert key == make_cache_key('doc', 500, 100, 'model-a')
+    assert key != make_cache_key('other', 500, 100, 'model-a')
+    assert key != make_cache_key('doc', 400, 100, 'model-a')
+    assert key != make_cache_key('doc', 500, 50, 'model-a')
+    assert key != make_cache_key('doc', 500, 100, 'model-b')
+    monkeypatch.setattr(index_cache, 'CACHE_FORMAT_VERSION', index_cache.CACHE_FORMAT_VERSION + 1)
+    assert key != make_cache_key('doc', 500, 100, 'model-a')
+
+
+def test_save_and_load_round_trip(tmp_path):
+    cache = IndexCache(str(tmp_path))
+    chunks, embeddings = make_entry()
+    cache.save('key', chunks, embeddings)
+
+    loaded_chunks, loaded_embeddings = cache.load('key')
+    assert list(loaded_chunks) == list(chunks)
+    assert isinstance(loaded_embeddings, np.memmap)
+    np.testing.assert_array_equal(loaded_embeddings, embeddings)
+
+
+def test_missing_entry_is_a_miss(tmp_path):
+    assert IndexCache(str(tmp_path)).load('absent') is None
+
+
+def test_corrupt_entries_are_misses(tmp_path):
+    cache = IndexCache(str(tmp_path))
+    chunks, embeddings = make_entry()
+    cache.save('truncated', chunks, embeddings)
+    cache.save('garbled', chunks, embeddings)
+
+    # Embeddings for fewer rows than there are chunks
+    np.save(os.path.join(tmp_path, 'truncated', EMBEDDINGS_FILE), embeddings[:2])
+    assert cache.load('truncated') is None
+    assert not os.path.exists(os.path.join(tmp_path, 'truncated'))
+
+    with open(os.path.join(tmp_path, 'garbled', CHUNKS_FILE), 'wb') as f:
+        f.write(b'not a zip file')
+    assert cache.load('garbled') is None
+
+
+def test_evicts_least_recently_used_first(tmp_path):
+    chunks, embeddings = make_entry()
+    cache = IndexCache(str(tmp_path), max_bytes=float('inf'))
+    for i, key in enumerate(['old', 'used', 'new']):
+        cache.save(key, chunks, embeddings)
+        os.utime(os.path.join(tmp_path, key), (1000 + i, 1000 + i))
+    entry_size = cache.size_bytes() // 3
+
+    # Loading marks 'old' as the most recently used entry
+    cache.load('old')
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+    assert sorted(os.listdir(tmp_path)) == ['new', 'old']
+
+
+def test_evict_never_removes_the_kept_entry(tmp_path):
+    chunks, embeddings = make_entry()
+    cache = IndexCache(str(tmp_path), max_bytes=0)
+    cache.save('a', chunks, embeddings)
+    cache.save('b', chunks, embeddings)
+    assert os.listdir(tmp_path) == ['b']
+    assert cache.load('b') is not None
+    assert cache.load('a') is None
+
+
+@pytest.mark.parametrize("max_bytes", [0, 10 ** 9])
+def test_saving_an_existing_entry_is_a_no_op(tmp_path, max_bytes):
+    chunks, embeddings = make_entry()
+    cache = IndexCache(str(tmp_path), max_bytes=max_bytes)
+    cache.save('key', chunks, embeddings)
+    cache.save('key', chunks, embeddings * 2)
+    np.testing.assert_array_equal(cache.load('key')[1], embeddings)
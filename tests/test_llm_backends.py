@@ -0,0 +1,140 @@
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+
+from src.llm_backends import LLMBackend, LLMDeadlineExceeded, ResilientBackend, retry_delay
+
+MESSAGES = [{'role': 'user', 'content': "question"}]
+
+
+def timeout_error():
+    return openai.APITimeoutError(request=httpx.Request('POST', 'http://test'))
+
+
+class StubBackend(LLMBackend):
+    """Plays back one step per call: an exception, or (delay seconds, text or exception)"""
+
+    def __init__(self, steps, name='stub'):
+        self.steps = list(steps)
+        self.name = name
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            step = self.steps[min(self.calls, len(self.steps) - 1)]
+            self.calls += 1
+        if isinstance(step, Exception):
+            raise step
+        delay, text = step
+        time.sleep(delay)
+        if isinstance(text, Exception):
+            raise text
+        return text
+
+    def complete(self, messages, timeout=None, stats=None, **params):
+        return self._next()
+
+    def stream(self, messages, timeout=None, stats=None, **params):
+        text = self._next()
+        for word in text.split(' '):
+            yield word + ' '
+
+
+def test_retryable_errors_are_retried():
+    stub = StubBackend([timeout_error(), timeout_error(), (0, "answer")])
+    backend = ResilientBackend(stub, deadline=5, max_retries=2, base_delay=0.001)
+    request = {}
+    assert backend.complete(MESSAGES, stats=request) == "answer"
+    assert stub.calls == 3
+    assert request['retries'] == 2
+    assert request['outcome'] == 'ok'
+    assert backend.stats.snapshot()['retries'] == 2
+
+
+def test_retries_stop_at_max_retries():
+    stub = StubBackend([timeout_error()])
+    backend = ResilientBackend(stub, deadline=5, max_retries=2, base_delay=0.001)
+    with pytest.raises(openai.APITimeoutError):
+        backend.complete(MESSAGES)
+    assert stub.calls == 3
+    assert backend.stats.snapshot()['errors'] == 1
+
+
+def test_other_errors_are_not_retried():
+    stub = StubBackend([ValueError("bad request"), (0, "answer")])
+    backend = ResilientBackend(stub, deadline=5, max_retries=2, base_delay=0.001)
+    with pytest.raises(ValueError):
+        backend.complete(MESSAGES)
+    assert stub.calls == 1
+
+
+def test_retry_delay_honours_retry_after():
+    response = httpx.Response(429, headers={'retry-after': '3'}, request=httpx.Request('POST', 'http://test'))
+    error = openai.RateLimitError("slow down", response=response, body=None)
+    assert retry_delay(error, 0) == 3.0
+    assert retry_delay(error, 0, max_delay=1.0) == 1.0
+    assert 0 <= retry_delay(timeout_error(), 2, base_delay=0.5) <= 2.0
+
+
+def test_deadline_bounds_a_hung_call():
+    backend = ResilientBackend(StubBackend([(2, "late")]), deadline=0.1)
+    request = {}
+    start = time.perf_counter()
+    with pytest.raises(LLMDeadlineExceeded):
+        backend.complete(MESSAGES, stats=request)
+    assert time.perf_counter() - start < 1
+    assert request['outcome'] == 'deadline_exceeded'
+    assert backend.stats.snapshot()['deadline_exceeded'] == 1
+
+
+def test_no_retry_past_the_deadline():
+    stub = StubBackend([timeout_error()])
+    backend = ResilientBackend(stub, deadline=0.05, max_retries=5, base_delay=10, max_delay=10)
+    with pytest.raises(openai.APITimeoutError):
+        backend.complete(MESSAGES)
+    assert stub.calls == 1
+
+
+def test_slow_primary_is_hedged():
+    primary = StubBackend([(1, "primary")], name='primary')
+    hedge = StubBackend([(0, "hedge")], name='hedge')
+    backend = ResilientBackend(primary, hedge=hedge, deadline=5, hedge_delay=0.01)
+    request = {}
+    assert backend.complete(MESSAGES, stats=request) == "hedge"
+    assert request['hedged'] and request['hedge_won']
+    assert request['backend'] == 'hedge'
+    assert request['wasted_calls'] == 1
+    snapshot = backend.stats.snapshot()
+    assert (snapshot['hedged'], snapshot['hedge_wins'], snapshot['wasted_calls']) == (1, 1, 1)
+
+
+def test_fast_primary_is_not_hedged():
+    hedge = StubBackend([(0, "hedge")], name='hedge')
+    backend = ResilientBackend(StubBackend([(0, "primary")]), hedge=hedge, deadline=5, hedge_delay=0.5)
+    request = {}
+    assert backend.complete(MESSAGES, stats=request) == "primary"
+    assert not request['hedged']
+    assert hedge.calls == 0
+
+
+def test_hedge_covers_a_failed_primary():
+    # The primary fails while the hedge is still running, which then answers
+    primary = StubBackend([(0.05, ValueError("primary failed"))], name='primary')
+    hedge = StubBackend([(0.1, "hedge")], name='hedge')
+    backend = ResilientBackend(primary, hedge=hedge, deadline=5, hedge_delay=0.01)
+    request = {}
+    assert backend.complete(MESSAGES, stats=request) == "hedge"
+    assert request['hedge_won']
+    assert request['wasted_calls'] == 0
+
+
+def test_stream_yields_pieces():
+    backend = ResilientBackend(StubBackend([(0, "one two three")]), deadline=5)
+    request = {}
+    assert list(backend.stream(MESSAGES, stats=request)) == ["one ", "two ", "three "]
+    assert request['outcome'] == 'ok'
+    assert request['time_to_first_text'] is not None
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from benchmarks.section_detection_benchmark import legacy_detect_sections, synthetic_paper
+from src import embedding_utils
+from src.embedding_utils import detect_sections, register_section_pattern, section_text
+
+LINES = ['Abstract', 'introduction', '  Methods ', 'Results and Discussion', 'foo bar', '\t',
+         'Related  Work', 'Related\tWork', 'x', '', 'Appendix\r', 'REFERENCES', 'Acknowledgment',
+         'conclusion.', '\x0c']
+
+
+def as_legacy(text, sections):
+    return [(section['name'], section['start_line'], section_text(text, section).rstrip('\n'))
+            for section in sections]
+
+
+def legacy(text):
+    return [(section['name'], section['start_line'], section['content'].rstrip('\n'))
+            for section in legacy_detect_sections(text)]
+
+
+@pytest.fixture
+def restore_patterns():
+    # Other modules hold a reference to the list, so restore it in place
+    saved = list(embedding_utils.SECTION_PATTERNS)
+    yield
+    embedding_utils.SECTION_PATTERNS[:] = saved
+    embedding_utils._section_header_matcher = None
+
+
+def test_matches_legacy_on_synthetic_paper():
+    text = synthetic_paper(3000)
+    assert as_legacy(text, detect_sections(text)) == legacy(text)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_legacy_on_random_lines(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        text = '\n'.join(rng.choice(LINES) for _ in range(rng.randint(0, 15)))
+        assert as_legacy(text, detect_sections(text)) == legacy(text)
+
+
+def test_sections_are_spans_excluding_the_header():
+    text = "Title\nAbstract\nWe study X.\n\n  METHODS  \nWe do Y.\n"
+    sections = detect_sections(text)
+    assert [(s['name'], s['start_line']) for s in sections] == [
+        ('Header', 0), ('Abstract', 1), ('Methods', 4)
+    ]
+    assert section_text(text, sections[1]) == "We study X.\n\n"
+    assert section_text(text, sections[2]) == "We do Y.\n"
+
+
+def test_headers_do_not_match_across_lines():
+    text = "related\nwork\nbody"
+    assert [s['name'] for s in detect_sections(text)] == ['Header']
+
+
+def test_empty_sections_are_dropped():
+    text = "Abstract\n\nIntroduction\nBody"
+    assert [s['name'] for s in detect_sections(text)] == ['Introduction']
+
+
+def test_register_section_pattern(restore_patterns):
+    text = "Supplementary Materials\nExtra tables."
+    assert [s['name'] for s in detect_sections(text)] == ['Header']
+    register_section_pattern(r'^\s*supplementary\s+materials\s*$')
+    assert [s['name'] for s in detect_sections(text)] == ['Supplementary Materials']
+    assert as_legacy(text, detect_sections(text)) == legacy(text)
@@ -1,17 +1,30 @@
 import streamlit as st
 import sys
 import os
+import json
 import numpy as np
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.embedding_utils import (
-    extract_text_from_pdf, 
-    chunk_text_with_sections, 
-    embed_chunks, 
     get_top_k_chunks,
-    get_available_sections
+    get_top_k_chunks_hybrid,
+    hybrid_stats,
+    get_section_counts,
+    embed_query,
+    set_embedding_service,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CHUNK_OVERLAP
 )
-from src.generator import generate_response
+from src.generator import generate_response_stream, get_section_info, format_sources
+from src.llm_backends import get_llm_backend
+from src.index_cache import IndexCache, compute_document_hash, make_cache_key
+from src.streaming_ingest import StreamingIngest
+from src.document_registry import DocumentRegistry
+from src.embedding_service import EmbeddingBatcher
+from src.encoders import get_encoder, current_encoder_id
+from src.answer_cache import SemanticAnswerCache, SqliteAnswerStore, make_answer_key
+from src.telemetry import telemetry
+from src.service_client import ServiceClient, ServiceError
 
 # Page configuration
 st.set_page_config(
@@ -20,6 +33,142 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def get_index_cache():
+    """Process-wide on-disk cache of processed papers"""
+    return IndexCache()
+
+@st.cache_resource
+def get_embedding_service():
+    """Process-wide micro-batching encoder shared by all sessions"""
+    service = EmbeddingBatcher(lambda texts: get_encoder().encode(texts), dimension_fn=lambda: get_encoder().dimension)
+    set_embedding_service(service)
+    return service
+
+@st.cache_resource
+def get_answer_cache():
+    """Process-wide semantic answer cache, persisted if RAG_ANSWER_CACHE_DB is set"""
+    db_path = os.getenv("RAG_ANSWER_CACHE_DB")
+    return SemanticAnswerCache(
+        similarity_threshold=float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95")),
+        store=SqliteAnswerStore(db_path) if db_path else None
+    )
+
+@st.cache_resource
+def get_document_registry():
+    """Process-wide loaded papers shared by all sessions, bounded by RAG_DOCUMENT_MEMORY_BYTES"""
+    return DocumentRegistry()
+
+@st.cache_resource
+def get_active_ingests():
+    """Background ingests by document hash, so sessions opening the same paper join one run"""
+    return {}
+
+@st.cache_resource
+def get_service_client():
+    """Client for the headless service (src/service.py) if RAG_SERVICE_URL is set"""
+    service_url = os.getenv("RAG_SERVICE_URL")
+    return ServiceClient(service_url) if service_url else None
+
+# Index storage mode: flat, fp16, int8 or pq (see build_index)
+INDEX_STORAGE = os.getenv("RAG_INDEX_STORAGE", "flat")
+
+# Seconds between progress updates while a paper is ingested in the background
+INGEST_POLL_SECONDS = 1.0
+
+# With a service URL the app is a thin client: ingest, retrieval, the
+# answer cache and generation all run on the service
+service_client = get_service_client()
+
+embedding_service = get_embedding_service()
+answer_cache = get_answer_cache()
+
+def start_ingest(pdf_bytes, document_hash, previous_document_hash=None):
+    """
+    Start the background ingest of a paper, or join the one already running
+    """
+    active_ingests = get_active_ingests()
+    for other_hash, other in list(active_ingests.items()):
+        if other.done and other_hash != document_hash:
+            active_ingests.pop(other_hash, None)
+    ingest = active_ingests.get(document_hash)
+    if ingest is None:
+        ingest = active_ingests.setdefault(document_hash, StreamingIngest(
+            pdf_bytes,
+            get_index_cache(),
+            storage=INDEX_STORAGE,
+            previous_document_hash=previous_document_hash
+        ))
+    return ingest.start()
+
+def prepare_document(document):
+    """
+    Copy an ingested paper into the dict kept in the shared document registry
+    
+    Only the index is held in memory. Compressed indexes rerank against the
+    memory-mapped full-precision vectors in the index cache.
+    """
+    index_cache = get_index_cache()
+    document = dict(document)
+    embeddings = document.pop('embeddings')
+    if INDEX_STORAGE != 'flat' and not isinstance(embeddings, np.memmap):
+        cache_key = make_cache_key(document['document_hash'], DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, current_encoder_id())
+        cached = index_cache.load(cache_key)
+        if cached is not None:
+            embeddings = cached[1]
+    document['rerank_vectors'] = embeddings if INDEX_STORAGE != 'flat' else None
+    document['section_counts'] = get_section_counts(document['chunked_data'])
+    return document
+
+def current_document():
+    """
+    The session's paper, or the part of it searchable so far while it is
+    still being ingested (None before its first chunks are indexed)
+    """
+    ingest = st.session_state.get('ingest')
+    if ingest is None:
+        return st.session_state.document.document
+    snapshot = ingest.snapshot()
+    # Snapshots carry an exact flat index, so there is nothing to rerank
+    return dict(snapshot, rerank_vectors=None) if snapshot is not None else None
+
+def llm_backend_stats():
+    """Latency and hedging counters of the LLM backend, if it keeps them"""
+    stats = getattr(get_llm_backend(), 'stats', None)
+    return stats.snapshot() if stats is not None else None
+
+@st.fragment(run_every=INGEST_POLL_SECONDS)
+def ingest_progress(ingest):
+    """
+    Progress of a background ingest
+    
+    Reruns the whole app once the ingest finishes, and whenever new chunks
+    became searchable unless a question is open (its answer would be
+    regenerated on every update).
+    """
+    progress = ingest.progress()
+    searchable = sum(st.session_state.get('section_counts', {}).values())
+    if ingest.done or (progress['chunks'] != searchable and not st.session_state.get('query_input')):
+        snapshot = ingest.snapshot()
+        if snapshot is not None:
+            st.session_state.section_counts = get_section_counts(snapshot['chunked_data'])
+        st.rerun()
+    st.progress(
+        progress['pages'] / max(progress['page_count'], 1),
+        text=f"🔄 Processing paper in the background: {progress['pages']} of {progress['page_count']} pages read, "
+             f"{progress['chunks']} chunks searchable"
+    )
+
+def service_answer_stream(uploaded_file, query, **kwargs):
+    """Answer via the service, re-uploading the paper if the service no longer holds it"""
+    try:
+        return service_client.answer_stream(st.session_state.processed_file, query, **kwargs)
+    except ServiceError as e:
+        if e.status_code != 404:
+            raise
+        service_client.ingest(uploaded_file.getvalue())
+        return service_client.answer_stream(st.session_state.processed_file, query, **kwargs)
+
 # Custom CSS for better styling
 st.markdown("""
 <style>
@@ -67,14 +216,17 @@ with st.sidebar:
         help="Upload a research paper to analyze"
     )
     
-    if 'chunked_data' in st.session_state and st.session_state.chunked_data:
-        st.success(f"✅ Paper loaded!")
-        st.metric("Total Chunks", len(st.session_state.chunked_data))
+    if 'section_counts' in st.session_state and st.session_state.section_counts:
+        if st.session_state.get('ingest') is not None:
+            st.info("⏳ Paper is being indexed, searchable so far:")
+        else:
+            st.success(f"✅ Paper loaded!")
+        st.metric("Total Chunks", sum(st.session_state.section_counts.values()))
         
         st.subheader("🔍 Query Settings")
         
         # Section filter
-        available_sections = get_available_sections(st.session_state.chunked_data)
+        available_sections = list(st.session_state.section_counts)
         section_filter = st.selectbox(
             "Filter by Section",
             ["All Sections"] + available_sections,
@@ -92,6 +244,15 @@ with st.sidebar:
         )
         st.session_state.num_chunks = num_chunks
         
+        # Retrieval mode
+        retrieval_mode = st.radio(
+            "Retrieval mode",
+            ["Dense", "Hybrid"],
+            horizontal=True,
+            help="Hybrid answers keyword queries (method names, datasets, identifiers) from a BM25 index and only runs the dense search when the keyword match is weak"
+        )
+        st.session_state.retrieval_mode = retrieval_mode
+        
         # Show sources
         show_sources = st.checkbox(
             "Show source sections",
@@ -101,14 +262,66 @@ with st.sidebar:
         st.session_state.show_sources = show_sources
         
         st.subheader("📊 Document Sections")
-        for section in available_sections:
-            section_count = sum(1 for item in st.session_state.chunked_data if item['section'] == section)
+        for section, section_count in st.session_state.section_counts.items():
             st.markdown(f"""
             <div class="section-badge">
                 {section} ({section_count})
             </div>
             """, unsafe_allow_html=True)
     
+    cache_stats = answer_cache.stats()
+    if cache_stats['lookups']:
+        with st.expander("💾 Answer Cache"):
+            st.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+            st.metric("Generation Time Saved", f"{cache_stats['latency_saved_seconds']:.1f}s")
+    
+    retrieval_stats = hybrid_stats.snapshot()
+    if retrieval_stats['queries']:
+        with st.expander("🔤 Hybrid Retrieval"):
+            st.metric("Lexical Hit Rate", f"{retrieval_stats['lexical_hit_rate']:.0%}")
+            st.metric("Dense Search Skipped", f"{retrieval_stats['dense_skip_rate']:.0%}")
+            st.caption(
+                f"mean {retrieval_stats['total_ms']['mean']:.1f} ms · "
+                f"p95 {retrieval_stats['total_ms']['p95']:.1f} ms per query"
+            )
+    
+    registry_stats = get_document_registry().stats()
+    if registry_stats['documents']:
+        with st.expander("🗂️ Shared Documents"):
+            st.metric("Loaded Papers", registry_stats['documents'])
+            st.metric("Memory", f"{registry_stats['bytes'] / 1024 ** 2:.1f} / {registry_stats['max_bytes'] / 1024 ** 2:.0f} MB")
+            st.caption(
+                f"{registry_stats['references']} session references · "
+                f"{registry_stats['hits']} shared opens · {registry_stats['evictions']} evictions"
+            )
+    
+    service_stats = embedding_service.stats()
+    if service_stats['total_batches']:
+        with st.expander("⏱️ Embedding Service"):
+            st.metric("Mean Batch Size", f"{service_stats['mean_batch_size']:.1f}")
+            st.metric("p95 Queue Wait", f"{service_stats['p95_queue_wait_ms']:.1f} ms")
+            st.caption(f"{service_stats['total_requests']} requests in {service_stats['total_batches']} batches")
+    
+    llm_stats = llm_backend_stats()
+    if llm_stats and llm_stats['requests']:
+        with st.expander("🛰️ LLM Backend"):
+            st.metric("p99 First Text", f"{llm_stats['first_text_ms']['p99']:.0f} ms")
+            st.metric("Hedged", f"{llm_stats['hedge_rate']:.0%}")
+            st.caption(
+                f"{llm_stats['requests']} requests · {llm_stats['hedge_wins']} won by the hedge · "
+                f"{llm_stats['wasted_calls']} wasted calls · {llm_stats['retries']} retries · "
+                f"{llm_stats['deadline_exceeded']} past deadline"
+            )
+    
+    if telemetry.enabled:
+        with st.expander("📈 Telemetry"):
+            st.code(telemetry.prometheus_text(), language="text")
+            st.download_button(
+                "Download spans (JSONL)",
+                "".join(json.dumps(span) + "\n" for span in telemetry.export_spans()),
+                file_name="spans.jsonl"
+            )
+    
     st.markdown("---")
     st.markdown("""
     ### 🎯 Features
@@ -121,29 +334,74 @@ with st.sidebar:
 # Main content area
 if uploaded_file:
     # Process document if not already processed or if new file
-    if 'processed_file' not in st.session_state or st.session_state.processed_file != uploaded_file.name:
-        with st.spinner("🔄 Extracting text and detecting sections..."):
-            text = extract_text_from_pdf(uploaded_file)
-        
-        with st.spinner("📚 Chunking text with section information..."):
-            chunked_data = chunk_text_with_sections(text)
-            st.session_state.chunked_data = chunked_data
-        
-        with st.spinner("🧮 Creating semantic embeddings and building index..."):
-            index, embeddings = embed_chunks(chunked_data)
-            st.session_state.index = index
-            st.session_state.embeddings = embeddings
-        
-        st.session_state.processed_file = uploaded_file.name
-        st.session_state.section_filter = "All Sections"
-        st.session_state.num_chunks = 5
-        st.session_state.show_sources = True
-        
-        st.success("✅ Paper successfully processed and indexed!")
-        st.rerun()
+    document_hash = compute_document_hash(uploaded_file.getvalue())
+    if 'processed_file' not in st.session_state or st.session_state.processed_file != document_hash:
+        if service_client is not None:
+            with st.spinner("🔄 Processing paper on the retrieval service..."):
+                document_info = service_client.ingest(
+                    uploaded_file.getvalue(), previous_document_hash=st.session_state.get('processed_file'))
+            st.session_state.section_counts = document_info['sections']
+            st.session_state.reindex = document_info.get('reindex')
+            st.session_state.processed_file = document_info['document_hash']
+            st.session_state.section_filter = "All Sections"
+            st.session_state.num_chunks = 5
+            st.session_state.show_sources = True
+            st.session_state.retrieval_mode = "Dense"
+            
+            st.success("✅ Paper successfully processed and indexed!")
+            st.rerun()
+        else:
+            registry = get_document_registry()
+            previous = st.session_state.get('document')
+            previous_hash = previous.document_hash if previous else None
+            ingest = st.session_state.get('ingest')
+            if ingest is None or ingest.document_hash != document_hash:
+                # Sessions opening the same paper share one loaded copy;
+                # papers not loaded yet are ingested in the background and
+                # can be queried while they are processed
+                ingest = None
+                if document_hash not in registry:
+                    ingest = start_ingest(uploaded_file.getvalue(), document_hash, previous_hash)
+                st.session_state.ingest = ingest
+                st.session_state.section_counts = {}
+                st.session_state.reindex = None
+                st.session_state.ingest_stats = None
+                st.session_state.section_filter = "All Sections"
+                st.session_state.num_chunks = 5
+                st.session_state.show_sources = True
+                st.session_state.retrieval_mode = "Dense"
+            
+            if ingest is None or ingest.done:
+                try:
+                    handle = registry.acquire(
+                        document_hash,
+                        lambda: prepare_document(
+                            (ingest or start_ingest(uploaded_file.getvalue(), document_hash, previous_hash)).wait())
+                    )
+                finally:
+                    get_active_ingests().pop(document_hash, None)
+                if previous is not None:
+                    previous.release()
+                st.session_state.document = handle
+                st.session_state.ingest = None
+                st.session_state.ingest_stats = ingest.stats if ingest is not None else None
+                st.session_state.section_counts = handle.document['section_counts']
+                st.session_state.reindex = handle.document['reindex'] if previous is not None else None
+                st.session_state.processed_file = document_hash
+                st.rerun()
+            
+            ingest_progress(ingest)
     
     # Query interface
     st.markdown("### 💬 Ask Questions About the Paper")
+    if st.session_state.get('reindex'):
+        reindex = st.session_state.reindex
+        st.caption(f"♻️ Updated from the previous version: reused {reindex['reused']} chunk embeddings, "
+                   f"encoded {reindex['encoded']}, removed {reindex['removed']}")
+    if st.session_state.get('ingest_stats'):
+        ingest_stats = st.session_state.ingest_stats
+        st.caption(f"⚡ Searchable after {ingest_stats['time_to_first_chunk_seconds']:.2f}s · "
+                   f"fully indexed in {ingest_stats['total_seconds']:.2f}s")
     
     # Example questions
     with st.expander("💡 Example Questions"):
@@ -162,31 +420,94 @@ if uploaded_file:
         key="query_input"
     )
     
-    if query:
+    if query and service_client is None and current_document() is None:
+        st.info("⏳ The first chunks are still being indexed, ask again in a moment")
+    elif query:
         with st.spinner("🔍 Searching relevant sections and generating answer..."):
             # Retrieve chunks with rank-based weighting
-            retrieved_chunks, weights, distances = get_top_k_chunks(
-                query,
-                st.session_state.chunked_data,
-                st.session_state.index,
-                k=st.session_state.num_chunks,
-                section_filter=st.session_state.section_filter
-            )
+            generation_stats = {}
+            document = current_document() if service_client is None else None
+            if service_client is not None:
+                retrieved_chunks, answer_stream = service_answer_stream(
+                    uploaded_file,
+                    query,
+                    k=st.session_state.num_chunks,
+                    section=st.session_state.section_filter,
+                    mode=st.session_state.retrieval_mode.lower(),
+                    stats=generation_stats
+                )
+                weights = [chunk['weight'] for chunk in retrieved_chunks]
+                distances = [chunk['score'] for chunk in retrieved_chunks]
+            elif st.session_state.retrieval_mode == "Hybrid" and document['lexical_index'] is not None:
+                # Papers still being ingested have no BM25 index yet and are searched dense only
+                search_stats = {}
+                retrieved_chunks, weights, distances = get_top_k_chunks_hybrid(
+                    query,
+                    document['chunked_data'],
+                    document['index'],
+                    document['lexical_index'],
+                    k=st.session_state.num_chunks,
+                    section_filter=st.session_state.section_filter,
+                    section_filters=document['section_filters'],
+                    rerank_vectors=document['rerank_vectors'],
+                    stats=search_stats
+                )
+                # None when dense search was skipped: the answer cache then
+                # matches the query text exactly instead of encoding it
+                query_embedding = search_stats['query_embedding']
+            else:
+                query_embedding = embed_query(query)
+                retrieved_chunks, weights, distances = get_top_k_chunks(
+                    query,
+                    document['chunked_data'],
+                    document['index'],
+                    k=st.session_state.num_chunks,
+                    section_filter=st.session_state.section_filter,
+                    section_filters=document['section_filters'],
+                    query_embedding=query_embedding,
+                    rerank_vectors=document['rerank_vectors']
+                )
             
             if not retrieved_chunks:
                 st.warning(f"⚠️ No relevant content found in section: {st.session_state.section_filter}")
             else:
-                # Generate response
-                answer = generate_response(
-                    retrieved_chunks,
-                    weights,
-                    query,
-                    show_sources=st.session_state.show_sources
-                )
-                
-                # Display answer
                 st.markdown("### ✅ Answer")
-                st.markdown(answer)
+                if service_client is not None:
+                    # The service answers from its cache or streams from the LLM
+                    st.write_stream(answer_stream)
+                else:
+                    answer_key = make_answer_key(document['document_hash'], retrieved_chunks)
+                    answer = answer_cache.lookup(answer_key, query_embedding, query=query)
+                    telemetry.increment('answer_cache_lookups_total', result='hit' if answer is not None else 'miss')
+                    
+                    if answer is not None:
+                        st.markdown(answer)
+                        generation_stats['cached'] = True
+                    else:
+                        # Generate and display the response as it streams in
+                        answer = st.write_stream(generate_response_stream(
+                            retrieved_chunks,
+                            weights,
+                            query,
+                            show_sources=False,
+                            stats=generation_stats
+                        ))
+                        answer_cache.put(answer_key, query_embedding, answer, generation_stats['total_time'], query=query)
+                
+                if generation_stats.get('cached'):
+                    st.caption("⚡ Answered from cache")
+                elif generation_stats.get('time_to_first_token') is not None:
+                    context_report = generation_stats.get('context') or {}
+                    st.caption(
+                        f"⏱️ First token in {generation_stats['time_to_first_token']:.2f}s · "
+                        f"completed in {generation_stats['total_time']:.2f}s · "
+                        f"{context_report.get('tokens', 0)} context tokens "
+                        f"({context_report.get('tokens_saved', 0)} saved by merging overlaps)"
+                        + (" · hedged" if generation_stats.get('llm', {}).get('hedged') else "")
+                    )
+                
+                if st.session_state.show_sources:
+                    st.markdown(format_sources(get_section_info(retrieved_chunks, weights)))
                 
                 # Display retrieval details
                 with st.expander("🔎 Retrieved Chunks Details"):
@@ -196,6 +517,7 @@ if uploaded_file:
                         st.markdown(f"""
                         **{importance} - Chunk #{i+1}**
                         - **Section**: {chunk['section']}
+                        - **Page**: {chunk.get('page') or 'unknown'}
                         - **Relevance Weight**: {weight:.2%}
                         - **Similarity Score**: {dist:.4f}
                         """)